@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks of the hot paths of envoi_transcribe_translate.
+
+No network access or AWS credentials are needed: the AWS clients are Boto3 clients whose responses are stubbed with
+botocore's Stubber, and Iconik is replaced by a local HTTP server. The benchmarks are:
+
+- build_run_input: run inputs built per second.
+- lambda_handler: S3 events handled per second, including the config read from S3 and start_execution.
+- iconik_add_subtitle_file: latency of IconikHelper.add_subtitle_file_to_asset and add_subtitle_files_to_asset.
+- transcript_parse: time and peak memory of reading a large Transcribe output file with StorageHelper.read_file_json,
+  which streams it, next to json.load of the same file.
+
+The results are printed as JSON, and can be written to a file with --output. Pass the file of an earlier run, e.g. of
+the previous commit, with --baseline to add the change of every metric and exit with 1 when one regresses by more
+than --max-regression.
+"""
+
+import argparse
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+import uuid
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import boto3.session  # noqa: E402
+from botocore.stub import Stubber  # noqa: E402
+
+import envoi_transcribe_translate  # noqa: E402
+from iconik_helper import IconikHelper  # noqa: E402
+
+DEFAULT_RUN_INPUT_COUNT = 2000
+DEFAULT_LAMBDA_EVENT_COUNT = 200
+DEFAULT_LAMBDA_RECORDS_PER_EVENT = 10
+DEFAULT_ICONIK_CALL_COUNT = 100
+DEFAULT_ICONIK_LATENCY_MS = 0
+DEFAULT_ICONIK_BATCH_SIZE = 20
+DEFAULT_TRANSCRIPT_ITEM_COUNT = 200000
+DEFAULT_MAX_REGRESSION = 0.2
+
+STATE_MACHINE_ARN = 'arn:aws:states:us-east-1:123456789012:stateMachine:envoi-transcribe-translate'
+TRANSLATION_LANGUAGE_CODES = ['de', 'es', 'fr', 'it', 'ja', 'ko', 'pt', 'zh']
+BENCHMARK_CONFIG = {
+    "input": {
+        "output_s3_uri": "s3://benchmark-bucket/output/",
+        "translation_language_codes": TRANSLATION_LANGUAGE_CODES,
+        "state_machine_arn": STATE_MACHINE_ARN
+    }
+}
+
+# Metrics named with one of these suffixes are better when they are higher, all the others when they are lower
+HIGHER_IS_BETTER_SUFFIXES = ('_per_second',)
+
+
+def build_stubbed_client(service_name):
+    """
+    Create a Boto3 client that never reaches AWS and register it as the module's shared client for the service.
+
+    :return: The activated Stubber of the client, responses must be added to it before they are needed.
+    """
+    session = boto3.session.Session(aws_access_key_id='benchmark', aws_secret_access_key='benchmark',
+                                    region_name='us-east-1')
+    client = session.client(service_name)
+    stubber = Stubber(client)
+    stubber.activate()
+    envoi_transcribe_translate.aws_client_registry.clients[(service_name, None, None)] = client
+    return stubber
+
+
+def summarize_latencies(latencies):
+    latencies = sorted(latencies)
+    return {
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+    }
+
+
+def benchmark_build_run_input(opts):
+    media_file_uris = [f"s3://benchmark-bucket/media/benchmark-{index}.mp4" for index in range(opts.run_input_count)]
+    run_opts = [SimpleNamespace(**BENCHMARK_CONFIG['input'], media_file_uri=media_file_uri,
+                                media_file_etag=uuid.uuid4().hex, media_file_size=1024)
+                for media_file_uri in media_file_uris]
+
+    # Load the translation language catalog before timing
+    envoi_transcribe_translate.build_run_input(run_opts[0])
+
+    started_at = time.perf_counter()
+    for run_opt in run_opts:
+        envoi_transcribe_translate.build_run_input(run_opt)
+    duration = time.perf_counter() - started_at
+
+    return {
+        "run_inputs": len(run_opts),
+        "translation_languages": len(TRANSLATION_LANGUAGE_CODES),
+        "duration_seconds": round(duration, 4),
+        "run_inputs_per_second": round(len(run_opts) / duration, 1),
+    }
+
+
+def build_s3_event(event_index, record_count):
+    return {"Records": [{"eventSource": "aws:s3", "eventName": "ObjectCreated:Put",
+                         "s3": {"bucket": {"name": "benchmark-bucket"},
+                                "object": {"key": f"media/benchmark-{event_index}-{record_index}.mp4",
+                                           "eTag": uuid.uuid4().hex, "size": 1024}}}
+                        for record_index in range(record_count)]}
+
+
+def benchmark_lambda_handler(opts):
+    events = [build_s3_event(event_index, opts.lambda_records_per_event)
+              for event_index in range(opts.lambda_event_count)]
+    record_count = opts.lambda_event_count * opts.lambda_records_per_event
+
+    s3_stubber = build_stubbed_client('s3')
+    config_contents = json.dumps(BENCHMARK_CONFIG).encode('utf-8')
+    # The config is read once, warm invocations use the cached copy
+    s3_stubber.add_response('get_object', {"Body": build_streaming_body(config_contents),
+                                           "ETag": '"config"'})
+
+    stepfunctions_stubber = build_stubbed_client('stepfunctions')
+    for index in range(record_count):
+        stepfunctions_stubber.add_response('start_execution', {
+            "executionArn": f"arn:aws:states:us-east-1:123456789012:execution:envoi-transcribe-translate:{index}",
+            "startDate": 0
+        })
+
+    env = {"CONFIG_FILE_URI": "s3://benchmark-bucket/config.json", "CONFIG_CACHE_TTL": "3600"}
+    with patch_environ(env), contextlib.redirect_stdout(io.StringIO()):
+        envoi_transcribe_translate.config_cache.clear()
+        latencies = []
+        failures = 0
+        started_at = time.perf_counter()
+        for event in events:
+            event_started_at = time.perf_counter()
+            try:
+                envoi_transcribe_translate.lambda_handler(event, None)
+            except envoi_transcribe_translate.EventRecordsError:
+                failures += 1
+            latencies.append(time.perf_counter() - event_started_at)
+        duration = time.perf_counter() - started_at
+
+    s3_stubber.assert_no_pending_responses()
+    stepfunctions_stubber.assert_no_pending_responses()
+    return {
+        "events": len(events),
+        "records_per_event": opts.lambda_records_per_event,
+        "failures": failures,
+        "duration_seconds": round(duration, 4),
+        "events_per_second": round(len(events) / duration, 1),
+        "records_per_second": round(record_count / duration, 1),
+        **summarize_latencies(latencies),
+    }
+
+
+def build_streaming_body(contents):
+    from botocore.response import StreamingBody
+
+    return StreamingBody(io.BytesIO(contents), len(contents))
+
+
+@contextlib.contextmanager
+def patch_environ(env):
+    previous_env = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for key, value in previous_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+class FakeIconikRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers the Iconik endpoints used to register files: lists are empty and created objects get a new id.
+    """
+    protocol_version = 'HTTP/1.1'
+    # The headers and the body are written separately, so Nagle's algorithm would delay every response
+    disable_nagle_algorithm = True
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def simulate_latency(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+    def do_GET(self):
+        self.simulate_latency()
+        self.send_json(200, {"objects": [], "page": 1, "pages": 1})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.simulate_latency()
+        self.send_json(201, {"id": str(uuid.uuid4())})
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def run_fake_iconik_server(latency=0):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeIconikRequestHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/API"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def benchmark_iconik_add_subtitle_file(opts):
+    with run_fake_iconik_server(latency=opts.iconik_latency_ms / 1000) as base_url:
+        # The shared rate limiter would measure the rate limit instead of the client
+        iconik = IconikHelper('benchmark-app-id', 'benchmark-auth-token', base_url=base_url, rate_limiter=None)
+        storage_id = str(uuid.uuid4())
+
+        latencies = []
+        for index in range(opts.iconik_call_count):
+            started_at = time.perf_counter()
+            iconik.add_subtitle_file_to_asset(str(uuid.uuid4()), f"subtitles/benchmark-{index}.vtt", storage_id, 'en')
+            latencies.append(time.perf_counter() - started_at)
+
+        languages = (TRANSLATION_LANGUAGE_CODES * opts.iconik_batch_size)[:opts.iconik_batch_size]
+        subtitle_files = [{"path_on_storage": f"subtitles/{language}.benchmark.vtt", "language": language}
+                          for language in languages]
+        batch_latencies = []
+        for _ in range(max(1, opts.iconik_call_count // 10)):
+            started_at = time.perf_counter()
+            iconik.add_subtitle_files_to_asset(str(uuid.uuid4()), subtitle_files, storage_id)
+            batch_latencies.append(time.perf_counter() - started_at)
+        iconik.pool.close()
+
+    return {
+        "calls": len(latencies),
+        "server_latency_ms": opts.iconik_latency_ms,
+        "calls_per_second": round(len(latencies) / sum(latencies), 1),
+        **summarize_latencies(latencies),
+        "batch_size": opts.iconik_batch_size,
+        **{f"batch_{key}": value for key, value in summarize_latencies(batch_latencies).items()},
+    }
+
+
+def write_transcript_file(file_path, item_count):
+    """
+    Write a Transcribe output file with the given number of items, one in nine of them punctuation.
+    """
+    random_generator = random.Random(item_count)
+    words = ['hello', 'world', 'transcribe', 'translate', 'subtitle', 'media', 'a', 'the']
+    start_time = 0.0
+    with open(file_path, 'w') as f:
+        f.write('{"jobName": "benchmark", "accountId": "123456789012", "results": {"transcripts": [{"transcript": ')
+        f.write(json.dumps(' '.join(random_generator.choice(words) for _ in range(item_count))))
+        f.write('}], "items": [')
+        for index in range(item_count):
+            if index:
+                f.write(', ')
+            if index % 9 == 8:
+                item = {"type": "punctuation", "alternatives": [{"confidence": "0.0", "content": "."}]}
+            else:
+                item = {"start_time": f"{start_time:.3f}", "end_time": f"{start_time + 0.3:.3f}",
+                        "type": "pronunciation", "speaker_label": f"spk_{index // 500 % 3}",
+                        "alternatives": [{"confidence": "0.98", "content": random_generator.choice(words)}]}
+                start_time += 0.35
+            f.write(json.dumps(item))
+        f.write(']}, "status": "COMPLETED"}')
+
+
+def measure_peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_transcript_parse(opts):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_path = os.path.join(temp_dir, 'transcript.json')
+        write_transcript_file(file_path, opts.transcript_item_count)
+
+        def load_json():
+            with open(file_path, 'rb') as f:
+                return json.load(f)
+
+        def read_file_json():
+            return envoi_transcribe_translate.StorageHelper.read_file_json(file_path)
+
+        started_at = time.perf_counter()
+        transcript = read_file_json()
+        parse_duration = time.perf_counter() - started_at
+        started_at = time.perf_counter()
+        load_json()
+        json_load_duration = time.perf_counter() - started_at
+
+        result = {
+            "items": len(transcript['results']['items']),
+            "file_size_mib": round(os.path.getsize(file_path) / 2 ** 20, 2),
+            "parse_seconds": round(parse_duration, 4),
+            "parse_peak_mib": round(measure_peak_memory(read_file_json) / 2 ** 20, 2),
+            "json_load_seconds": round(json_load_duration, 4),
+            "json_load_peak_mib": round(measure_peak_memory(load_json) / 2 ** 20, 2),
+        }
+    return result
+
+
+BENCHMARKS = {
+    "build_run_input": benchmark_build_run_input,
+    "lambda_handler": benchmark_lambda_handler,
+    "iconik_add_subtitle_file": benchmark_iconik_add_subtitle_file,
+    "transcript_parse": benchmark_transcript_parse,
+}
+
+
+def compare_results(results, baseline, max_regression):
+    """
+    Add the relative change of every numeric metric compared with a baseline run.
+
+    :return: The descriptions of the metrics that regressed by more than max_regression.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        baseline_metrics = baseline.get('results', {}).get(name)
+        if not baseline_metrics:
+            continue
+        changes = {}
+        for metric_name, value in metrics.items():
+            baseline_value = baseline_metrics.get(metric_name)
+            if not metric_name.endswith(('_per_second', '_seconds', '_ms', '_mib')) or not baseline_value:
+                continue
+            change = (value - baseline_value) / baseline_value
+            changes[metric_name] = round(change, 4)
+            regression = -change if metric_name.endswith(HIGHER_IS_BETTER_SUFFIXES) else change
+            if regression > max_regression:
+                regressions.append(f"{name}.{metric_name}: {baseline_value} -> {value} ({change:+.1%})")
+        metrics['change'] = changes
+    return regressions
+
+
+def get_git_commit():
+    try:
+        completed = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                                   text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return completed.stdout.strip()
+
+
+def parse_command_line(cli_args):
+    parser = argparse.ArgumentParser(
+        description='Runs the offline benchmarks of Envoi Transcribe Translate',
+    )
+    parser.add_argument('benchmarks', nargs='*',
+                        help=f"The benchmarks to run: {', '.join(BENCHMARKS)}. All of them are run by default.")
+    parser.add_argument('--output', dest='output_file_path',
+                        help='The path of a file to write the results to.')
+    parser.add_argument('--baseline', dest='baseline_file_path',
+                        help='The path of the results of an earlier run to compare with.')
+    parser.add_argument('--max-regression', dest='max_regression',
+                        type=float,
+                        default=DEFAULT_MAX_REGRESSION,
+                        help='The largest relative regression of a metric compared with the baseline that is '
+                             'accepted, e.g. 0.2 for 20%%.')
+    parser.add_argument('--run-input-count', dest='run_input_count',
+                        type=int,
+                        default=DEFAULT_RUN_INPUT_COUNT,
+                        help='The number of run inputs to build.')
+    parser.add_argument('--lambda-event-count', dest='lambda_event_count',
+                        type=int,
+                        default=DEFAULT_LAMBDA_EVENT_COUNT,
+                        help='The number of events to handle.')
+    parser.add_argument('--lambda-records-per-event', dest='lambda_records_per_event',
+                        type=int,
+                        default=DEFAULT_LAMBDA_RECORDS_PER_EVENT,
+                        help='The number of S3 records in each event.')
+    parser.add_argument('--iconik-call-count', dest='iconik_call_count',
+                        type=int,
+                        default=DEFAULT_ICONIK_CALL_COUNT,
+                        help='The number of subtitle files to add.')
+    parser.add_argument('--iconik-latency-ms', dest='iconik_latency_ms',
+                        type=float,
+                        default=DEFAULT_ICONIK_LATENCY_MS,
+                        help='The time the fake Iconik server waits before answering each request, to simulate the '
+                             'network.')
+    parser.add_argument('--iconik-batch-size', dest='iconik_batch_size',
+                        type=int,
+                        default=DEFAULT_ICONIK_BATCH_SIZE,
+                        help='The number of subtitle files added to an asset at once.')
+    parser.add_argument('--transcript-item-count', dest='transcript_item_count',
+                        type=int,
+                        default=DEFAULT_TRANSCRIPT_ITEM_COUNT,
+                        help='The number of items of the transcript to parse.')
+    opts = parser.parse_args(cli_args)
+
+    unknown_benchmarks = [name for name in opts.benchmarks if name not in BENCHMARKS]
+    if unknown_benchmarks:
+        parser.error(f"unknown benchmarks: {', '.join(unknown_benchmarks)}")
+    return opts
+
+
+def main(cli_args):
+    opts = parse_command_line(cli_args)
+
+    results = {}
+    for name in opts.benchmarks or BENCHMARKS:
+        envoi_transcribe_translate.aws_client_registry.clear()
+        results[name] = BENCHMARKS[name](opts)
+
+    regressions = []
+    if opts.baseline_file_path:
+        with open(opts.baseline_file_path) as f:
+            regressions = compare_results(results, json.load(f), opts.max_regression)
+
+    report = {
+        "commit": get_git_commit(),
+        "python": sys.version.split()[0],
+        "results": results,
+    }
+    report_json = json.dumps(report, indent=2)
+    if opts.output_file_path:
+        with open(opts.output_file_path, 'w') as f:
+            f.write(report_json + '\n')
+    print(report_json)
+
+    for regression in regressions:
+        print(f"Regression: {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Measures how long envoi_transcribe_translate takes to start, and fails when it is over budget.
+
+Every sample runs in a new interpreter, like a CLI call or a Lambda cold start:
+
+- import: importing the module.
+- lambda: importing the module and handling a first S3 event, with a local dry run config so no AWS call is made.
+- cli: running `create --dry-run` from the command line, from process start to exit.
+
+The median of each measurement is compared with its budget. The modules that must only be imported when they are first
+used are also checked, since a new module level import of one of them is the most likely regression.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_RUNS = 7
+DEFAULT_IMPORT_BUDGET_MS = 150
+DEFAULT_LAMBDA_BUDGET_MS = 250
+DEFAULT_CLI_BUDGET_MS = 500
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULE_NAME = 'envoi_transcribe_translate'
+LAZY_MODULES = ['boto3', 'botocore.config', 'iconik_helper', 'iconik_api_client', 'sqlite3', 'urllib.request']
+
+IMPORT_SCRIPT = f"""
+import json, sys, time
+started_at = time.perf_counter()
+import {MODULE_NAME}
+import_ms = (time.perf_counter() - started_at) * 1000
+print(json.dumps({{"import_ms": import_ms,
+                  "loaded_lazy_modules": [name for name in {LAZY_MODULES!r} if name in sys.modules]}}))
+"""
+
+LAMBDA_SCRIPT = f"""
+import contextlib, io, json, sys, time
+started_at = time.perf_counter()
+import {MODULE_NAME}
+event = {{"Records": [{{"eventSource": "aws:s3", "eventName": "ObjectCreated:Put",
+                        "s3": {{"bucket": {{"name": "benchmark-bucket"}},
+                               "object": {{"key": "media/benchmark.mp4", "eTag": "0123456789abcdef",
+                                          "size": 1024}}}}}}]}}
+with contextlib.redirect_stdout(io.StringIO()):
+    response = {MODULE_NAME}.lambda_handler(event, None)
+lambda_ms = (time.perf_counter() - started_at) * 1000
+print(json.dumps({{"lambda_ms": lambda_ms, "success": response["success"]}}))
+"""
+
+BENCHMARK_CONFIG = {
+    "input": {
+        "dry_run": True,
+        "output_s3_uri": "s3://benchmark-bucket/output/",
+        "translation_language_codes": ["de", "es", "fr"],
+        "state_machine_arn": "arn:aws:states:us-east-1:123456789012:stateMachine:benchmark"
+    }
+}
+
+
+def run_python(args, env):
+    completed = subprocess.run([sys.executable, *args], cwd=REPO_DIR, env=env, capture_output=True, text=True,
+                               check=True)
+    return completed.stdout.strip().splitlines()[-1] if completed.stdout.strip() else ''
+
+
+def measure(runs, env):
+    samples = {"import_ms": [], "lambda_ms": [], "cli_ms": []}
+    loaded_lazy_modules = set()
+    lambda_failures = 0
+    cli_args = [os.path.join(REPO_DIR, f"{MODULE_NAME}.py"), 'create', '--dry-run',
+                '--media-file-uri', 's3://benchmark-bucket/media/benchmark.mp4',
+                '--output-s3-uri', 's3://benchmark-bucket/output/',
+                '-l', 'de', 'es', 'fr', '--skip-content-identity']
+
+    for _ in range(runs):
+        result = json.loads(run_python(['-c', IMPORT_SCRIPT], env))
+        samples['import_ms'].append(result['import_ms'])
+        loaded_lazy_modules.update(result['loaded_lazy_modules'])
+
+        result = json.loads(run_python(['-c', LAMBDA_SCRIPT], env))
+        samples['lambda_ms'].append(result['lambda_ms'])
+        lambda_failures += 0 if result['success'] else 1
+
+        started_at = time.perf_counter()
+        run_python(cli_args, env)
+        samples['cli_ms'].append((time.perf_counter() - started_at) * 1000)
+
+    return samples, sorted(loaded_lazy_modules), lambda_failures
+
+
+def parse_command_line(cli_args):
+    parser = argparse.ArgumentParser(
+        description='Measures the start time of the Envoi Transcribe Translate CLI and Lambda function',
+    )
+    parser.add_argument('--runs', dest='runs',
+                        type=int,
+                        default=DEFAULT_RUNS,
+                        help='The number of samples of each measurement.')
+    parser.add_argument('--import-budget-ms', dest='import_budget_ms',
+                        type=float,
+                        default=DEFAULT_IMPORT_BUDGET_MS,
+                        help='The maximum median time to import the module, in milliseconds.')
+    parser.add_argument('--lambda-budget-ms', dest='lambda_budget_ms',
+                        type=float,
+                        default=DEFAULT_LAMBDA_BUDGET_MS,
+                        help='The maximum median time to import the module and handle the first event, in '
+                             'milliseconds.')
+    parser.add_argument('--cli-budget-ms', dest='cli_budget_ms',
+                        type=float,
+                        default=DEFAULT_CLI_BUDGET_MS,
+                        help='The maximum median time of a dry run of the create command, in milliseconds, including '
+                             'the start of the interpreter.')
+    return parser.parse_args(cli_args)
+
+
+def main(cli_args):
+    opts = parse_command_line(cli_args)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config_file_path = os.path.join(temp_dir, 'config.json')
+        with open(config_file_path, 'w') as f:
+            json.dump(BENCHMARK_CONFIG, f)
+        env = {**os.environ, "CONFIG_FILE_URI": config_file_path, "AWS_DEFAULT_REGION": "us-east-1",
+               "PYTHONDONTWRITEBYTECODE": "1"}
+        # Compile the module once, so every sample measures a start with up to date bytecode
+        subprocess.run([sys.executable, '-m', 'py_compile', f"{MODULE_NAME}.py"], cwd=REPO_DIR, check=True)
+        samples, loaded_lazy_modules, lambda_failures = measure(max(1, opts.runs), env)
+
+    budgets = {"import_ms": opts.import_budget_ms, "lambda_ms": opts.lambda_budget_ms, "cli_ms": opts.cli_budget_ms}
+    results = {}
+    errors = []
+    for name, values in samples.items():
+        median = statistics.median(values)
+        results[name] = {"median": round(median, 2), "min": round(min(values), 2), "max": round(max(values), 2),
+                         "budget": budgets[name]}
+        if median > budgets[name]:
+            errors.append(f"{name}: the median of {median:.1f} ms is over the budget of {budgets[name]:.0f} ms")
+    if loaded_lazy_modules:
+        errors.append(f"modules that should be imported lazily are imported with the module: "
+                      f"{', '.join(loaded_lazy_modules)}")
+    if lambda_failures:
+        errors.append(f"the Lambda handler failed {lambda_failures} times")
+
+    print(json.dumps({"python": sys.version.split()[0], "runs": opts.runs, "results": results,
+                      "loaded_lazy_modules": loaded_lazy_modules, "passed": not errors}, indent=2))
+    for error in errors:
+        print(error, file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,531 @@
+#!/usr/bin/env python3
+"""
+Generates the Envoi Transcribe Translate state machine definitions.
+
+Jobs are polled with exponential backoff. The wait durations are precomputed into a schedule that is stored in the
+state, together with a counter of the number of checks that were made, and each Wait state reads its duration from it.
+This keeps the number of state transitions low for long media without delaying the detection of short jobs.
+"""
+
+import argparse
+import json
+import math
+import sys
+
+DEFAULT_INITIAL_WAIT_SECONDS = 5
+DEFAULT_MAX_WAIT_SECONDS = 120
+DEFAULT_BACKOFF_RATE = 2.0
+DEFAULT_MAX_CONCURRENCY = 40
+DEFAULT_RETRY_INTERVAL_SECONDS = 2
+DEFAULT_RETRY_MAX_ATTEMPTS = 6
+DEFAULT_RETRY_BACKOFF_RATE = 2.0
+DEFAULT_RETRY_MAX_DELAY_SECONDS = 60
+
+PIPELINES = ['transcribe', 'transcribe-translate']
+
+STATE_TYPES = frozenset(['Task', 'Pass', 'Choice', 'Wait', 'Succeed', 'Fail', 'Parallel', 'Map'])
+
+TRANSCRIBE_THROTTLING_ERRORS = ['Transcribe.LimitExceededException', 'Transcribe.InternalFailureException']
+TRANSLATE_THROTTLING_ERRORS = ['Translate.TooManyRequestsException', 'Translate.LimitExceededException',
+                               'Translate.InternalServerException', 'Translate.ServiceUnavailableException']
+
+
+def build_wait_schedule(initial_wait_seconds=DEFAULT_INITIAL_WAIT_SECONDS,
+                        max_wait_seconds=DEFAULT_MAX_WAIT_SECONDS,
+                        backoff_rate=DEFAULT_BACKOFF_RATE):
+    """
+    Build the list of wait durations, in seconds, of successive checks of a job.
+
+    :param initial_wait_seconds: The wait before the first check.
+    :param max_wait_seconds: The longest wait, it is the last item of the schedule.
+    :param backoff_rate: The factor by which each wait is longer than the previous one.
+    :return: A list of integers.
+    """
+    if initial_wait_seconds < 1:
+        raise ValueError("The initial wait must be at least 1 second.")
+    if max_wait_seconds < initial_wait_seconds:
+        raise ValueError("The maximum wait must be greater than or equal to the initial wait.")
+    if backoff_rate < 1:
+        raise ValueError("The backoff rate must be greater than or equal to 1.")
+
+    schedule = [int(initial_wait_seconds)]
+    while backoff_rate > 1 and schedule[-1] < max_wait_seconds:
+        schedule.append(int(min(max_wait_seconds, math.ceil(schedule[-1] * backoff_rate))))
+    return schedule
+
+
+def build_retry(errors, interval_seconds=DEFAULT_RETRY_INTERVAL_SECONDS, max_attempts=DEFAULT_RETRY_MAX_ATTEMPTS,
+                backoff_rate=DEFAULT_RETRY_BACKOFF_RATE, max_delay_seconds=DEFAULT_RETRY_MAX_DELAY_SECONDS):
+    return [
+        {
+            "ErrorEquals": errors,
+            "IntervalSeconds": interval_seconds,
+            "MaxAttempts": max_attempts,
+            "BackoffRate": backoff_rate,
+            "MaxDelaySeconds": max_delay_seconds,
+            "JitterStrategy": "FULL"
+        }
+    ]
+
+
+def build_polling_states(prefix, wait_schedule, check_state_name):
+    """
+    Build the states that initialize, increase and wait for the polling interval.
+
+    The polling state is kept in $.Polling: Attempt is the index of the current wait in Schedule.
+    """
+    return {
+        f"Initialize {prefix} Polling": {
+            "Type": "Pass",
+            "Result": {
+                "Attempt": 0,
+                "WaitSeconds": wait_schedule[0],
+                "Schedule": wait_schedule
+            },
+            "ResultPath": "$.Polling",
+            "Next": f"Wait for {prefix} Job to Progress"
+        },
+        f"Increase {prefix} Wait": {
+            "Type": "Pass",
+            "Parameters": {
+                "Attempt.$": "States.MathAdd($.Polling.Attempt, 1)",
+                "WaitSeconds.$": "States.ArrayGetItem($.Polling.Schedule, States.MathAdd($.Polling.Attempt, 1))",
+                "Schedule.$": "$.Polling.Schedule"
+            },
+            "ResultPath": "$.Polling",
+            "Next": f"Wait for {prefix} Job to Progress"
+        },
+        f"Wait for {prefix} Job to Progress": {
+            "Type": "Wait",
+            "SecondsPath": "$.Polling.WaitSeconds",
+            "Next": check_state_name
+        }
+    }
+
+
+def build_still_running_choices(prefix, status_variable, running_statuses, wait_schedule):
+    """
+    Build the choice rules that go back to waiting while the job is running. The wait is only increased while the end
+    of the schedule hasn't been reached.
+    """
+    is_running = {"Or": [{"Variable": status_variable, "StringEquals": status} for status in running_statuses]}
+    return [
+        {
+            "And": [
+                is_running,
+                {"Variable": "$.Polling.Attempt", "NumericLessThan": len(wait_schedule) - 1}
+            ],
+            "Next": f"Increase {prefix} Wait"
+        },
+        {
+            **is_running,
+            "Next": f"Wait for {prefix} Job to Progress"
+        }
+    ]
+
+
+def build_translation_item_processor(wait_schedule, retry_options=None):
+    states = {
+        "StartTextTranslationJob": {
+            "Type": "Task",
+            "Next": "Initialize Translation Polling",
+            "Parameters": {
+                "ClientToken.$": "$.ClientToken",
+                "DataAccessRoleArn.$": "$.DataAccessRoleArn",
+                "InputDataConfig.$": "$.InputDataConfig",
+                "OutputDataConfig.$": "$.OutputDataConfig",
+                "SourceLanguageCode.$": "$.SourceLanguageCode",
+                "TargetLanguageCodes.$": "$.TargetLanguageCodes"
+            },
+            "Resource": "arn:aws:states:::aws-sdk:translate:startTextTranslationJob"
+        },
+        **build_polling_states("Translation", wait_schedule, "DescribeTextTranslationJob"),
+        "DescribeTextTranslationJob": {
+            "Type": "Task",
+            "Next": "Job Complete?",
+            "Parameters": {
+                "JobId.$": "$.JobId"
+            },
+            "Resource": "arn:aws:states:::aws-sdk:translate:describeTextTranslationJob",
+            "ResultSelector": {
+                "JobId.$": "$.TextTranslationJobProperties.JobId",
+                "JobStatus.$": "$.TextTranslationJobProperties.JobStatus"
+            },
+            "ResultPath": "$.Result"
+        },
+        "Job Complete?": {
+            "Type": "Choice",
+            "Choices": [
+                *build_still_running_choices("Translation", "$.Result.JobStatus", ["IN_PROGRESS", "SUBMITTED"],
+                                             wait_schedule),
+                {
+                    "Variable": "$.Result.JobStatus",
+                    "StringEquals": "COMPLETED",
+                    "Next": "Translation Job Succeeded"
+                }
+            ],
+            "Default": "Translation Job Failed"
+        },
+        "Translation Job Succeeded": {
+            "Comment": "Placeholder for a state which handles the success.",
+            "Type": "Pass",
+            "OutputPath": "$.Result",
+            "End": True
+        },
+        "Translation Job Failed": {
+            "Comment": "Placeholder for a state which handles the failure.",
+            "Type": "Pass",
+            "OutputPath": "$.Result",
+            "End": True
+        }
+    }
+    if retry_options is not None:
+        states['StartTextTranslationJob']['Retry'] = build_retry(TRANSLATE_THROTTLING_ERRORS, **retry_options)
+        states['DescribeTextTranslationJob']['Retry'] = build_retry(TRANSLATE_THROTTLING_ERRORS, **retry_options)
+
+    return {
+        "ProcessorConfig": {
+            "Mode": "INLINE"
+        },
+        "StartAt": "StartTextTranslationJob",
+        "States": states
+    }
+
+
+def build_definition(pipeline='transcribe-translate',
+                     initial_wait_seconds=DEFAULT_INITIAL_WAIT_SECONDS,
+                     max_wait_seconds=DEFAULT_MAX_WAIT_SECONDS,
+                     backoff_rate=DEFAULT_BACKOFF_RATE,
+                     max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                     retry_options=None):
+    """
+    Build a state machine definition.
+
+    :param pipeline: Either 'transcribe' or 'transcribe-translate'.
+    :param initial_wait_seconds: The wait before the first check of a job.
+    :param max_wait_seconds: The longest wait between checks of a job.
+    :param backoff_rate: The factor by which each wait is longer than the previous one.
+    :param max_concurrency: The maximum number of translation jobs run at the same time.
+    :param retry_options: The arguments of build_retry, or None to not retry throttled service calls.
+    :return: The definition as a dict.
+    """
+    if pipeline not in PIPELINES:
+        raise ValueError(f"Unknown pipeline: {pipeline}")
+
+    wait_schedule = build_wait_schedule(initial_wait_seconds, max_wait_seconds, backoff_rate)
+    translate = pipeline == 'transcribe-translate'
+
+    if translate:
+        comment = "A state machine that transcribes and translates documents."
+        start_transcription_job_parameters = {
+            "Media.$": "$.Transcribe.Media",
+            "IdentifyLanguage.$": "$.Transcribe.IdentifyLanguage",
+            "LanguageCode.$": "$.Transcribe.LanguageCode",
+            "OutputBucketName.$": "$.Transcribe.OutputBucketName",
+            "OutputKey.$": "$.Transcribe.OutputKey",
+            "TranscriptionJobName.$": "$.Transcribe.TranscriptionJobName",
+            "Subtitles.$": "$.Transcribe.Subtitles"
+        }
+        transcription_completed_state_name = "Translate Transcription Files"
+        transcription_skipped_state_name = "Translate Transcription Files"
+    else:
+        comment = "A state machine that transcribes documents."
+        start_transcription_job_parameters = {
+            "Media.$": "$.Transcribe.Media",
+            "IdentifyLanguage": "true",
+            "OutputBucketName.$": "$.Transcribe.OutputBucketName",
+            "TranscriptionJobName.$": "$.Transcribe.TranscriptionJobName",
+            "Subtitles": {
+                "Formats": [
+                    "srt",
+                    "vtt"
+                ],
+                "OutputStartIndex": 1
+            }
+        }
+        transcription_completed_state_name = "Success"
+        transcription_skipped_state_name = "Use Existing Transcription Output"
+
+    states = {
+        # Planned run inputs leave out the transcription when its output already exists
+        "Transcribe?": {
+            "Type": "Choice",
+            "Choices": [
+                {
+                    "And": [
+                        {"Variable": "$.SkipTranscription", "IsPresent": True},
+                        {"Variable": "$.SkipTranscription", "BooleanEquals": True}
+                    ],
+                    "Next": transcription_skipped_state_name
+                }
+            ],
+            "Default": "StartTranscriptionJob"
+        },
+        "StartTranscriptionJob": {
+            "Type": "Task",
+            "Parameters": start_transcription_job_parameters,
+            "Resource": "arn:aws:states:::aws-sdk:transcribe:startTranscriptionJob",
+            "Next": "Initialize Transcription Polling",
+            "Catch": [
+                {
+                    "ErrorEquals": ["Transcribe.ConflictException"],
+                    "ResultPath": "$.Error",
+                    "Next": "Reuse Existing Transcription Job?"
+                }
+            ]
+        },
+        "Reuse Existing Transcription Job?": {
+            "Comment": "A job with the same name exists. It is only the same work when the name has a content key.",
+            "Type": "Choice",
+            "Choices": [
+                {
+                    "And": [
+                        {"Variable": "$.ReuseTranscriptionOutput", "IsPresent": True},
+                        {"Variable": "$.ReuseTranscriptionOutput", "BooleanEquals": True}
+                    ],
+                    "Next": "Use Existing Transcription Job"
+                }
+            ],
+            "Default": "Transcription Job Name Conflict"
+        },
+        "Transcription Job Name Conflict": {
+            "Type": "Fail",
+            "Error": "Transcribe.ConflictException",
+            "Cause": "A transcription job with the same name exists and its name doesn't identify the media content."
+        },
+        "Use Existing Transcription Job": {
+            "Comment": "A job with the same name was already started for the same media, so wait for it instead.",
+            "Type": "Pass",
+            "Parameters": {
+                "TranscriptionJob": {
+                    "TranscriptionJobName.$": "$.Transcribe.TranscriptionJobName"
+                }
+            },
+            "Next": "Initialize Transcription Polling"
+        },
+        **build_polling_states("Transcription", wait_schedule, "GetTranscriptionJob"),
+        "GetTranscriptionJob": {
+            "Type": "Task",
+            "Parameters": {
+                "TranscriptionJobName.$": "$.TranscriptionJob.TranscriptionJobName"
+            },
+            "Resource": "arn:aws:states:::aws-sdk:transcribe:getTranscriptionJob",
+            "ResultPath": "$.Result",
+            "Next": "Is Running?"
+        },
+        "Is Running?": {
+            "Type": "Choice",
+            "Choices": [
+                {
+                    "Variable": "$.Result.TranscriptionJob.TranscriptionJobStatus",
+                    "StringEquals": "COMPLETED",
+                    "Next": transcription_completed_state_name
+                },
+                *build_still_running_choices("Transcription", "$.Result.TranscriptionJob.TranscriptionJobStatus",
+                                             ["IN_PROGRESS", "QUEUED"], wait_schedule)
+            ],
+            "Default": "Transcription Job Failed"
+        }
+    }
+
+    if translate:
+        states["Translate Transcription Files"] = {
+            "Type": "Map",
+            "ItemProcessor": build_translation_item_processor(wait_schedule, retry_options),
+            "Next": "Success",
+            "MaxConcurrency": max_concurrency,
+            "InputPath": "$$.Execution.Input.Translate.Inputs"
+        }
+        states["Success"] = {
+            "Type": "Succeed"
+        }
+    else:
+        states["Use Existing Transcription Output"] = {
+            "Comment": "The output of the transcription exists, so output the name of its job like a finished job.",
+            "Type": "Pass",
+            "Parameters": {
+                "TranscriptionJob": {
+                    "TranscriptionJobName.$": "$.Transcribe.TranscriptionJobName"
+                }
+            },
+            "ResultPath": "$.Result",
+            "Next": "Success"
+        }
+        states["Success"] = {
+            "Type": "Succeed",
+            "OutputPath": "$.Result"
+        }
+    states["Transcription Job Failed"] = {
+        "Type": "Fail"
+    }
+
+    if retry_options is not None:
+        states['StartTranscriptionJob']['Retry'] = build_retry(TRANSCRIBE_THROTTLING_ERRORS, **retry_options)
+        states['GetTranscriptionJob']['Retry'] = build_retry(TRANSCRIBE_THROTTLING_ERRORS, **retry_options)
+
+    return {
+        "Comment": comment,
+        "StartAt": "Transcribe?",
+        "States": states
+    }
+
+
+def get_state_transitions(state):
+    next_state_names = []
+    if 'Next' in state:
+        next_state_names.append(state['Next'])
+    if state.get('Type') == 'Choice':
+        next_state_names.extend(choice.get('Next') for choice in state.get('Choices', []))
+        if 'Default' in state:
+            next_state_names.append(state['Default'])
+    for catcher in state.get('Catch', []):
+        next_state_names.append(catcher.get('Next'))
+    return next_state_names
+
+
+def validate_definition(definition, path='$'):
+    """
+    Check the structure of a state machine definition without calling AWS.
+
+    The checks cover the states' types and transitions, the reachability of every state, the fields of Wait, Task, Map
+    and Retry, and the nested definitions of Map states.
+
+    :param definition: The definition as a dict.
+    :param path: The location of the definition, used in error messages.
+    :return: A list of error messages, empty if the definition is valid.
+    """
+    errors = []
+    states = definition.get('States')
+    if not isinstance(states, dict) or not states:
+        return [f"{path}: States must be a non-empty object"]
+
+    start_at = definition.get('StartAt')
+    if start_at not in states:
+        errors.append(f"{path}: StartAt '{start_at}' is not a state")
+
+    for state_name, state in states.items():
+        state_path = f"{path}.States['{state_name}']"
+        state_type = state.get('Type')
+        if state_type not in STATE_TYPES:
+            errors.append(f"{state_path}: unknown Type '{state_type}'")
+            continue
+
+        is_terminal = state_type in ('Succeed', 'Fail') or state.get('End') is True
+        if state_type == 'Choice':
+            if not state.get('Choices'):
+                errors.append(f"{state_path}: Choice states must have Choices")
+            for choice in state.get('Choices', []):
+                if 'Next' not in choice:
+                    errors.append(f"{state_path}: every choice rule must have a Next")
+        elif is_terminal == ('Next' in state):
+            errors.append(f"{state_path}: states must have either Next or End")
+
+        for next_state_name in get_state_transitions(state):
+            if next_state_name not in states:
+                errors.append(f"{state_path}: transition to unknown state '{next_state_name}'")
+
+        if state_type == 'Wait':
+            wait_fields = [field for field in ('Seconds', 'SecondsPath', 'Timestamp', 'TimestampPath')
+                           if field in state]
+            if len(wait_fields) != 1:
+                errors.append(f"{state_path}: Wait states must have exactly one of Seconds, SecondsPath, Timestamp "
+                              f"or TimestampPath")
+        if state_type == 'Task' and not state.get('Resource'):
+            errors.append(f"{state_path}: Task states must have a Resource")
+        if state_type == 'Map':
+            max_concurrency = state.get('MaxConcurrency', 0)
+            if not isinstance(max_concurrency, int) or max_concurrency < 0:
+                errors.append(f"{state_path}: MaxConcurrency must be a non-negative integer")
+            item_processor = state.get('ItemProcessor') or state.get('Iterator')
+            if item_processor is None:
+                errors.append(f"{state_path}: Map states must have an ItemProcessor")
+            else:
+                errors.extend(validate_definition(item_processor, f"{state_path}.ItemProcessor"))
+
+        for retrier in state.get('Retry', []):
+            if not retrier.get('ErrorEquals'):
+                errors.append(f"{state_path}: every retrier must have ErrorEquals")
+            if retrier.get('MaxAttempts', 3) < 0 or retrier.get('BackoffRate', 2.0) < 1:
+                errors.append(f"{state_path}: retriers must have MaxAttempts >= 0 and BackoffRate >= 1")
+
+    # Every state must be reachable from StartAt
+    reachable = set()
+    to_visit = [start_at] if start_at in states else []
+    while to_visit:
+        state_name = to_visit.pop()
+        if state_name in reachable or state_name not in states:
+            continue
+        reachable.add(state_name)
+        to_visit.extend(get_state_transitions(states[state_name]))
+    for state_name in states:
+        if state_name not in reachable:
+            errors.append(f"{path}.States['{state_name}']: state is not reachable from StartAt")
+
+    return errors
+
+
+def parse_command_line(cli_args):
+    parser = argparse.ArgumentParser(
+        description='Generates the Envoi Transcribe Translate state machine definition',
+    )
+    parser.add_argument('--pipeline', dest='pipeline',
+                        choices=PIPELINES,
+                        default='transcribe-translate',
+                        help='The pipeline to generate the definition for.')
+    parser.add_argument('--initial-wait-seconds', dest='initial_wait_seconds',
+                        type=int,
+                        default=DEFAULT_INITIAL_WAIT_SECONDS,
+                        help='The number of seconds to wait before the first check of a job.')
+    parser.add_argument('--max-wait-seconds', dest='max_wait_seconds',
+                        type=int,
+                        default=DEFAULT_MAX_WAIT_SECONDS,
+                        help='The maximum number of seconds to wait between checks of a job.')
+    parser.add_argument('--backoff-rate', dest='backoff_rate',
+                        type=float,
+                        default=DEFAULT_BACKOFF_RATE,
+                        help='The factor by which each wait is longer than the previous one.')
+    parser.add_argument('--max-concurrency', dest='max_concurrency',
+                        type=int,
+                        default=DEFAULT_MAX_CONCURRENCY,
+                        help='The maximum number of translation jobs to run at the same time.')
+    parser.add_argument('--no-retry', dest='retry',
+                        action='store_false',
+                        help='Do not retry throttled Transcribe and Translate calls.')
+    parser.add_argument('--retry-max-attempts', dest='retry_max_attempts',
+                        type=int,
+                        default=DEFAULT_RETRY_MAX_ATTEMPTS,
+                        help='The number of times to retry a throttled call.')
+    parser.add_argument('--validate', dest='validate_file_path',
+                        default=None,
+                        help='Validate an existing definition file instead of generating one.')
+    return parser.parse_args(cli_args)
+
+
+def main(cli_args):
+    opts = parse_command_line(cli_args)
+
+    if opts.validate_file_path is not None:
+        with open(opts.validate_file_path) as f:
+            definition = json.load(f)
+    else:
+        retry_options = {"max_attempts": opts.retry_max_attempts} if opts.retry else None
+        definition = build_definition(pipeline=opts.pipeline,
+                                      initial_wait_seconds=opts.initial_wait_seconds,
+                                      max_wait_seconds=opts.max_wait_seconds,
+                                      backoff_rate=opts.backoff_rate,
+                                      max_concurrency=opts.max_concurrency,
+                                      retry_options=retry_options)
+
+    errors = validate_definition(definition)
+    if errors:
+        for error in errors:
+            print(error, file=sys.stderr)
+        return 1
+
+    if opts.validate_file_path is None:
+        print(json.dumps(definition, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -217,150 +217,15 @@ POLICY_JSON=$(cat <<-EOF
 EOF
 )
 
-STEP_FUNCTION_JSON=$(cat <<-EOF
-{
-  "Comment": "A state machine that transcribes and translates documents.",
-  "StartAt": "StartTranscriptionJob",
-  "States": {
-    "StartTranscriptionJob": {
-      "Type": "Task",
-      "Parameters": {
-        "Media.$": "$.Transcribe.Media",
-        "IdentifyLanguage.$": "$.Transcribe.IdentifyLanguage",
-        "LanguageCode.$": "$.Transcribe.LanguageCode",
-        "OutputBucketName.$": "$.Transcribe.OutputBucketName",
-        "OutputKey.$": "$.Transcribe.OutputKey",
-        "TranscriptionJobName.$": "$.Transcribe.TranscriptionJobName",
-        "Subtitles.$": "$.Transcribe.Subtitles"
-      },
-      "Resource": "arn:aws:states:::aws-sdk:transcribe:startTranscriptionJob",
-      "Next": "Wait X Seconds for Transcription Job to Progress"
-    },
-    "Wait X Seconds for Transcription Job to Progress": {
-      "Type": "Wait",
-      "Seconds": 5,
-      "Next": "GetTranscriptionJob"
-    },
-    "GetTranscriptionJob": {
-      "Type": "Task",
-      "Parameters": {
-        "TranscriptionJobName.$": "$.TranscriptionJob.TranscriptionJobName"
-      },
-      "Resource": "arn:aws:states:::aws-sdk:transcribe:getTranscriptionJob",
-      "Next": "Is Running?"
-    },
-    "Is Running?": {
-      "Type": "Choice",
-      "Choices": [
-        {
-          "Variable": "$.TranscriptionJob.TranscriptionJobStatus",
-          "StringEquals": "COMPLETED",
-          "Next": "Translate Transcription Files"
-        },
-        {
-          "Or": [
-            {
-              "Variable": "$.TranscriptionJob.TranscriptionJobStatus",
-              "StringEquals": "IN_PROGRESS"
-            },
-            {
-              "Variable": "$.TranscriptionJob.TranscriptionJobStatus",
-              "StringEquals": "QUEUED"
-            }
-          ],
-          "Next": "Wait X Seconds for Transcription Job to Progress"
-        }
-      ],
-      "Default": "Transcription Job Failed"
-    },
-    "Translate Transcription Files": {
-      "Type": "Map",
-      "ItemProcessor": {
-        "ProcessorConfig": {
-          "Mode": "INLINE"
-        },
-        "StartAt": "StartTextTranslationJob",
-        "States": {
-          "StartTextTranslationJob": {
-            "Type": "Task",
-            "Next": "Wait X Seconds for Translation Job to Progress",
-            "Parameters": {
-              "ClientToken.$": "$.ClientToken",
-              "DataAccessRoleArn.$": "$.DataAccessRoleArn",
-              "InputDataConfig.$": "$.InputDataConfig",
-              "OutputDataConfig.$": "$.OutputDataConfig",
-              "SourceLanguageCode.$": "$.SourceLanguageCode",
-              "TargetLanguageCodes.$": "$.TargetLanguageCodes"
-            },
-            "Resource": "arn:aws:states:::aws-sdk:translate:startTextTranslationJob"
-          },
-          "Wait X Seconds for Translation Job to Progress": {
-            "Type": "Wait",
-            "Next": "DescribeTextTranslationJob",
-            "Seconds": 5
-          },
-          "DescribeTextTranslationJob": {
-            "Type": "Task",
-            "Next": "Job Complete?",
-            "Parameters": {
-              "JobId.$": "$.JobId"
-            },
-            "Resource": "arn:aws:states:::aws-sdk:translate:describeTextTranslationJob",
-            "ResultSelector": {
-              "JobId.$": "$.TextTranslationJobProperties.JobId",
-              "JobStatus.$": "$.TextTranslationJobProperties.JobStatus"
-            }
-          },
-          "Job Complete?": {
-            "Type": "Choice",
-            "Choices": [
-              {
-                "Or": [
-                  {
-                    "Variable": "$.JobStatus",
-                    "StringEquals": "IN_PROGRESS"
-                  },
-                  {
-                    "Variable": "$.JobStatus",
-                    "StringEquals": "SUBMITTED"
-                  }
-                ],
-                "Next": "Wait X Seconds for Translation Job to Progress"
-              },
-              {
-                "Variable": "$.JobStatus",
-                "StringEquals": "COMPLETED",
-                "Next": "Translation Job Succeeded"
-              }
-            ],
-            "Default": "Translation Job Failed"
-          },
-          "Translation Job Succeeded": {
-            "Comment": "Placeholder for a state which handles the success.",
-            "Type": "Pass",
-            "End": true
-          },
-          "Translation Job Failed": {
-            "Comment": "Placeholder for a state which handles the failure.",
-            "Type": "Pass",
-            "End": true
-          }
-        }
-      },
-      "Next": "Success",
-      "MaxConcurrency": 40,
-      "InputPath": "$$.Execution.Input.Translate.Inputs"
-    },
-    "Success": {
-      "Type": "Succeed"
-    },
-    "Transcription Job Failed": {
-      "Type": "Fail"
-    }
-  }
-}
-EOF
-)
+# The definition is generated so the polling and concurrency can be tuned per environment.
+# Pass generator options with the STATE_MACHINE_DEFINITION_ARGS environment variable
+# ex: export STATE_MACHINE_DEFINITION_ARGS="--initial-wait-seconds 10 --max-wait-seconds 300 --max-concurrency 20"
+SCRIPT_DIR=$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)
+# shellcheck disable=SC2086
+if ! STEP_FUNCTION_JSON=$(python3 "${SCRIPT_DIR}/generate_state_machine_definition.py" --pipeline transcribe-translate ${STATE_MACHINE_DEFINITION_ARGS}); then
+  echo "Error: Failed to generate the state machine definition" >&2
+  exit 1
+fi
 
 if [ -z "${ROLE_ARN}" ]; then
   [ -z "${ROLE_NAME}" ] && echo "ROLE_ARN or ROLE_NAME must be specified." && exit 1
@@ -190,60 +190,15 @@ POLICY_JSON=$(cat <<-EOF
 EOF
 )
 
-STEP_FUNCTION_JSON=$(cat <<-EOF
-{
-  "Comment": "A state machine that transcribes documents.",
-  "StartAt": "StartTranscriptionJob",
-  "States": {
-    "StartTranscriptionJob": {
-      "Type": "Task",
-      "Parameters": {
-        "Media.$": "$.Transcribe.Media",
-        "IdentifyLanguage": "true",
-        "OutputBucketName.$": "$.Transcribe.OutputBucketName",
-        "TranscriptionJobName.$": "$.Transcribe.TranscriptionJobName",
-        "Subtitles": {
-          "Formats": [
-            "srt",
-            "vtt"
-          ],
-          "OutputStartIndex": 1
-        }
-      },
-      "Resource": "arn:aws:states:::aws-sdk:transcribe:startTranscriptionJob",
-      "Next": "GetTranscriptionJob"
-    },
-    "GetTranscriptionJob": {
-      "Type": "Task",
-      "Parameters": {
-        "TranscriptionJobName.$": "$.TranscriptionJob.TranscriptionJobName"
-      },
-      "Resource": "arn:aws:states:::aws-sdk:transcribe:getTranscriptionJob",
-      "Next": "Is Running?"
-    },
-    "Is Running?": {
-      "Type": "Choice",
-      "Choices": [
-        {
-          "Variable": "$.TranscriptionJob.TranscriptionJobStatus",
-          "StringEquals": "IN_PROGRESS",
-          "Next": "Wait for Transcription to Complete"
-        }
-      ],
-      "Default": "Success"
-    },
-    "Success": {
-      "Type": "Succeed"
-    },
-    "Wait for Transcription to Complete": {
-      "Type": "Wait",
-      "Seconds": 5,
-      "Next": "GetTranscriptionJob"
-    }
-  }
-}
-EOF
-)
+# The definition is generated so the polling and concurrency can be tuned per environment.
+# Pass generator options with the STATE_MACHINE_DEFINITION_ARGS environment variable
+# ex: export STATE_MACHINE_DEFINITION_ARGS="--initial-wait-seconds 10 --max-wait-seconds 300 --max-concurrency 20"
+SCRIPT_DIR=$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)
+# shellcheck disable=SC2086
+if ! STEP_FUNCTION_JSON=$(python3 "${SCRIPT_DIR}/generate_state_machine_definition.py" --pipeline transcribe ${STATE_MACHINE_DEFINITION_ARGS}); then
+  echo "Error: Failed to generate the state machine definition" >&2
+  exit 1
+fi
 
 if [ -z "${ROLE_ARN}" ]; then
   [ -z "${ROLE_NAME}" ] && echo "ROLE_ARN or ROLE_NAME must be specified." && exit 1
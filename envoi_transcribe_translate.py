@@ -1,23 +1,34 @@
 #!/usr/bin/env python3
 
 import argparse
+import codecs
+import contextlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import csv
 import datetime
+import functools
+import hashlib
+import io
+import itertools
 import json
+import random
 import re
 from json import JSONEncoder
 import logging
 import os
+import shutil
 import sys
+import threading
 import time
 from types import SimpleNamespace
-from urllib.request import urlopen
+import unicodedata
 from urllib.parse import urlparse
 import uuid
 
-import boto3
-from botocore.exceptions import ClientError
-
-from iconik_helper import IconikHelper
+# boto3, botocore.config, cProfile, sqlite3 and urllib.request are imported where they are first used, to keep the start
+# of the CLI and the cold start of the Lambda function short. botocore.exceptions is cheap and is needed by every except
+# clause.
+from botocore.exceptions import BotoCoreError, ClientError
 
 logger = logging.Logger('envoi-transcribe-translate')
 
@@ -26,9 +37,76 @@ DEFAULT_TRANSCRIPTION_SOURCE_LANGUAGE_CODE = None
 DEFAULT_TRANSCRIPTION_SUBTITLE_FORMATS = ['srt', 'vtt']
 DEFAULT_TRANSCRIPTION_AUTO_IDENTIFY_SOURCE_LANGUAGE = False
 DEFAULT_TRANSCRIPTION_CREATE_DEFAULT_JOB_NAME = True
+DEFAULT_USE_CONTENT_IDENTITY = True
+# The options that change the output of a transcription job, and so are part of its content key
+TRANSCRIPTION_CONTENT_KEY_OPTIONS = ['transcription_source_language_code', 'auto_identify_source_language',
+                                     'subtitle_formats', 'output_bucket_name', 'output_s3_uri',
+                                     'transcription_output_s3_uri', 'transcription_output_folder_name']
 
 DEFAULT_TRANSLATION_OUTPUT_FOLDER_NAME = 'translated'
 DEFAULT_TRANSLATION_SOURCE_LANGUAGE_CODE = 'auto'
+DEFAULT_TRANSLATION_LANGUAGE_CODES_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                            'aws-translate-language-codes.csv')
+DEFAULT_TRANSLATION_LANGUAGE_CATALOG_REFRESH_INTERVAL = 7 * 24 * 60 * 60
+DEFAULT_TRANSLATION_LANGUAGE_GROUP_SIZE = 1
+# The maximum number of target languages of a single StartTextTranslationJob request
+MAX_TRANSLATION_LANGUAGE_GROUP_SIZE = 10
+
+DEFAULT_LAMBDA_MAX_WORKERS = 8
+
+DEFAULT_BATCH_MAX_WORKERS = 8
+DEFAULT_BATCH_RATE_LIMIT = 25
+DEFAULT_BATCH_MAX_RETRIES = 8
+# Options that change how a batch is submitted but not what a row submits, so they are left out of the row keys
+BATCH_CONTROL_OPTION_NAMES = ('command', 'dry_run', 'log_level', 'max_retries', 'max_workers', 'rate_limit')
+
+DEFAULT_WATCH_INITIAL_INTERVAL = 2
+DEFAULT_WATCH_MAX_INTERVAL = 60
+DEFAULT_WATCH_BACKOFF_FACTOR = 1.5
+DEFAULT_WATCH_JITTER = 0.1
+DEFAULT_WATCH_MAX_WORKERS = 8
+DEFAULT_WATCH_LIST_EXECUTIONS_THRESHOLD = 10
+
+DEFAULT_DIRECT_INITIAL_INTERVAL = 1
+DEFAULT_DIRECT_MAX_INTERVAL = 30
+DEFAULT_DIRECT_MAX_WORKERS = 10
+
+DEFAULT_PLAN_MAX_WORKERS = 16
+
+DEFAULT_DESCRIBE_MAX_WORKERS = 16
+EXECUTION_STATUSES = ['RUNNING', 'SUCCEEDED', 'FAILED', 'TIMED_OUT', 'ABORTED', 'PENDING_REDRIVE']
+
+TRANSLATION_MODES = ['auto', 'batch', 'sync']
+DEFAULT_TRANSLATION_MODE = 'batch'
+# In auto mode, translations are synchronous when the subtitle file size times the number of languages is below this
+DEFAULT_SYNC_TRANSLATION_THRESHOLD = 200000
+DEFAULT_SYNC_TRANSLATION_MAX_WORKERS = 10
+# The maximum size, in UTF-8 bytes, of the text of a TranslateText request
+MAX_TRANSLATE_TEXT_BYTES = 10000
+DEFAULT_TRANSLATION_MEMORY_MAX_ENTRIES = 100000
+# Entries used again within this many seconds keep their last use time, so reading the memory rarely writes to it
+TRANSLATION_MEMORY_RECENCY_INTERVAL = 24 * 60 * 60
+
+TRANSCRIPTION_JOB_RUNNING_STATUSES = frozenset(['QUEUED', 'IN_PROGRESS'])
+TRANSLATION_JOB_RUNNING_STATUSES = frozenset(['SUBMITTED', 'IN_PROGRESS', 'STOP_REQUESTED'])
+DEFAULT_CONFIG_CACHE_TTL = 300
+
+DEFAULT_STREAM_CHUNK_SIZE = 1024 * 1024
+DEFAULT_RANGED_DOWNLOAD_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_RANGED_DOWNLOAD_MAX_WORKERS = 8
+
+DEFAULT_AWS_MAX_POOL_CONNECTIONS = 50
+DEFAULT_AWS_RETRY_MODE = 'standard'
+DEFAULT_AWS_MAX_ATTEMPTS = 5
+
+METRICS_FORMATS = ['json', 'emf']
+DEFAULT_METRICS_NAMESPACE = 'EnvoiTranscribeTranslate'
+# The logger of the timing spans of the calls to AWS and Iconik, iconik_api_client logs to the same logger
+METRICS_LOGGER_NAME = 'envoi.metrics'
+DEFAULT_PROFILE_STATS_LIMIT = 40
+
+THROTTLING_ERROR_CODES = frozenset(['Throttling', 'ThrottlingException', 'TooManyRequestsException',
+                                    'RequestLimitExceeded'])
 
 
 class CustomJsonEncoder(JSONEncoder):
@@ -41,6 +119,261 @@ class CustomJsonEncoder(JSONEncoder):
         return JSONEncoder.default(self, o)
 
 
+class AwsClientRegistry:
+    """
+    Creates Boto3 clients once and shares them across the module.
+
+    Clients are keyed by service, region and profile. Boto3 clients are thread safe, so sharing them lets concurrent
+    callers reuse the same pool of warm HTTPS connections instead of creating a new client on each call.
+    """
+
+    def __init__(self, max_pool_connections=None, retry_mode=None, max_attempts=None):
+        self.max_pool_connections = max_pool_connections or int(
+            os.environ.get('AWS_MAX_POOL_CONNECTIONS', DEFAULT_AWS_MAX_POOL_CONNECTIONS))
+        self.retry_mode = retry_mode or os.environ.get('AWS_RETRY_MODE', DEFAULT_AWS_RETRY_MODE)
+        self.max_attempts = max_attempts or int(os.environ.get('AWS_MAX_ATTEMPTS', DEFAULT_AWS_MAX_ATTEMPTS))
+        self.sessions = {}
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def configure(self, max_pool_connections=None, retry_mode=None, max_attempts=None):
+        """
+        Change the client configuration. Clients that were already created are discarded.
+        """
+        with self.lock:
+            if max_pool_connections is not None:
+                self.max_pool_connections = max_pool_connections
+            if retry_mode is not None:
+                self.retry_mode = retry_mode
+            if max_attempts is not None:
+                self.max_attempts = max_attempts
+            self.clients.clear()
+
+    def build_client_config(self):
+        from botocore.config import Config
+
+        return Config(max_pool_connections=self.max_pool_connections,
+                      retries={"mode": self.retry_mode, "total_max_attempts": self.max_attempts})
+
+    def get_session(self, profile_name=None):
+        with self.lock:
+            return self._get_session(profile_name)
+
+    def _get_session(self, profile_name=None):
+        session = self.sessions.get(profile_name)
+        if session is None:
+            import boto3.session
+
+            session = boto3.session.Session(profile_name=profile_name)
+            self.sessions[profile_name] = session
+        return session
+
+    def get_client(self, service_name, region_name=None, profile_name=None):
+        key = (service_name, region_name, profile_name)
+        client = self.clients.get(key)
+        if client is not None:
+            return client
+
+        # Sessions are not thread safe, so clients are created while holding the lock
+        with self.lock:
+            client = self.clients.get(key)
+            if client is None:
+                session = self._get_session(profile_name)
+                client = session.client(service_name, region_name=region_name, config=self.build_client_config())
+                if metrics_logger.isEnabledFor(logging.INFO):
+                    instrument_aws_client(client)
+                self.clients[key] = client
+            return client
+
+    def clear(self):
+        with self.lock:
+            self.clients.clear()
+            self.sessions.clear()
+
+
+aws_client_registry = AwsClientRegistry()
+
+
+def get_aws_client(service_name, region_name=None, profile_name=None):
+    return aws_client_registry.get_client(service_name, region_name=region_name, profile_name=profile_name)
+
+
+# The metrics logger is disabled until configure_metrics_logger is called, so the calls are only timed when it is
+metrics_logger = logging.getLogger(METRICS_LOGGER_NAME)
+metrics_handler = None
+
+
+class MetricsFormatter(logging.Formatter):
+    """
+    Formats the timing span of a call as a JSON line, or as a CloudWatch Embedded Metric Format (EMF) document from
+    which CloudWatch Logs extracts the latency, bytes and retries as metrics with the service and operation as
+    dimensions.
+    """
+    METRIC_UNITS = {"Latency": "Milliseconds", "BytesSent": "Bytes", "BytesReceived": "Bytes", "Retries": "Count"}
+
+    def __init__(self, metrics_format='json', namespace=DEFAULT_METRICS_NAMESPACE):
+        super().__init__()
+        self.metrics_format = metrics_format
+        self.namespace = namespace
+
+    def format(self, record):
+        span = getattr(record, 'span', None)
+        if span is None:
+            return super().format(record)
+
+        timestamp = int(record.created * 1000)
+        if self.metrics_format == 'emf':
+            return json.dumps(self.build_emf_document(span, timestamp), default=str)
+        return json.dumps({"timestamp": timestamp, **span}, default=str)
+
+    def build_emf_document(self, span, timestamp):
+        metrics = remove_none_values({
+            "Latency": span['latency_ms'],
+            "BytesSent": span.get('bytes_sent'),
+            "BytesReceived": span.get('bytes_received'),
+            "Retries": span.get('retries')
+        })
+        return remove_none_values({
+            "_aws": {
+                "Timestamp": timestamp,
+                "CloudWatchMetrics": [{
+                    "Namespace": self.namespace,
+                    "Dimensions": [["Service", "Operation"]],
+                    "Metrics": [{"Name": name, "Unit": self.METRIC_UNITS[name]} for name in metrics]
+                }]
+            },
+            "Service": span['service'],
+            "Operation": span['operation'],
+            "Status": span.get('status'),
+            "Error": span.get('error'),
+            **metrics
+        })
+
+
+def configure_metrics_logger(metrics_format=None, namespace=None, stream=None):
+    """
+    Enable the timing spans of the calls to AWS and Iconik.
+
+    Spans are written to stdout, which Lambda sends to CloudWatch Logs. Calling this again changes the format, and the
+    stream if one is given.
+
+    :param metrics_format: json or emf, defaults to the METRICS_FORMAT environment variable. Spans stay disabled if
+                           neither is set, or if the format is not supported.
+    :param namespace: The CloudWatch namespace of EMF metrics, defaults to the METRICS_NAMESPACE environment variable.
+    :param stream: The stream to write the spans to.
+    :return: Whether the spans are enabled.
+    """
+    global metrics_handler
+
+    metrics_format = metrics_format or os.environ.get('METRICS_FORMAT')
+    if not metrics_format:
+        return False
+    if metrics_format not in METRICS_FORMATS:
+        logger.warning("Unsupported metrics format %s, the spans are disabled. Use one of: %s", metrics_format,
+                       ', '.join(METRICS_FORMATS))
+        return False
+
+    formatter = MetricsFormatter(metrics_format,
+                                 namespace or os.environ.get('METRICS_NAMESPACE', DEFAULT_METRICS_NAMESPACE))
+    if metrics_handler is None:
+        metrics_handler = logging.StreamHandler(stream or sys.stdout)
+        metrics_logger.addHandler(metrics_handler)
+        metrics_logger.setLevel(logging.INFO)
+        metrics_logger.propagate = False
+        # Clients created before the spans were enabled are not instrumented
+        aws_client_registry.configure()
+    elif stream is not None:
+        metrics_handler.setStream(stream)
+    metrics_handler.setFormatter(formatter)
+    return True
+
+
+def log_call_span(service, operation, latency, status=None, bytes_sent=None, bytes_received=None, retries=None,
+                  error=None):
+    metrics_logger.info("%s %s took %.1f ms", service, operation, latency * 1000, extra={"span": remove_none_values({
+        "service": service,
+        "operation": operation,
+        "latency_ms": round(latency * 1000, 3),
+        "status": status,
+        "bytes_sent": bytes_sent,
+        "bytes_received": bytes_received,
+        "retries": retries,
+        "error": error
+    })})
+
+
+def instrument_aws_client(client):
+    """
+    Log a timing span for every call made with a Boto3 client, using botocore's event hooks.
+
+    The span covers the whole call, including botocore's retries.
+    """
+    service_name = client.meta.service_model.service_name
+    # Registered first and as specifically as botocore's Stubber, so that stubbed calls are timed too
+    client.meta.events.register_first('before-call.*.*', start_aws_call_span)
+    client.meta.events.register('after-call.*.*', functools.partial(end_aws_call_span, service_name))
+    client.meta.events.register('after-call-error.*.*', functools.partial(fail_aws_call_span, service_name))
+
+
+def start_aws_call_span(model, params, context, **_kwargs):
+    body = params.get('body')
+    if isinstance(body, (bytes, str)):
+        bytes_sent = len(body)
+    else:
+        bytes_sent = params.get('headers', {}).get('Content-Length')
+    context['span'] = {"operation": model.name, "started_at": time.perf_counter(),
+                       "bytes_sent": int(bytes_sent) if bytes_sent is not None else None}
+
+
+def end_aws_call_span(service_name, http_response, parsed, context, **_kwargs):
+    span = context.pop('span', None)
+    if span is None:
+        return
+    content_length = http_response.headers.get('content-length') if http_response is not None else None
+    log_call_span(service_name, span['operation'], time.perf_counter() - span['started_at'],
+                  status=http_response.status_code if http_response is not None else None,
+                  bytes_sent=span['bytes_sent'],
+                  bytes_received=int(content_length) if content_length is not None else None,
+                  retries=parsed.get('ResponseMetadata', {}).get('RetryAttempts'),
+                  error=parsed.get('Error', {}).get('Code'))
+
+
+def fail_aws_call_span(service_name, exception, context, **_kwargs):
+    span = context.pop('span', None)
+    if span is None:
+        return
+    log_call_span(service_name, span['operation'], time.perf_counter() - span['started_at'],
+                  bytes_sent=span['bytes_sent'], error=exception.__class__.__name__)
+
+
+@contextlib.contextmanager
+def profile_if_enabled():
+    """
+    Profile the block with cProfile when the PROFILE_OUTPUT_PATH environment variable is set.
+
+    The stats are written to that path, to be read with pstats or snakeviz, or printed to stderr, sorted by cumulative
+    time, if it is "-". Only the calling thread is profiled, the time spent in worker threads shows as waits.
+    """
+    output_path = os.environ.get('PROFILE_OUTPUT_PATH')
+    if not output_path:
+        yield
+        return
+
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        if output_path == '-':
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(DEFAULT_PROFILE_STATS_LIMIT)
+        else:
+            profiler.dump_stats(output_path)
+
+
 class StorageHelper:
 
     @classmethod
@@ -49,21 +382,197 @@ class StorageHelper:
             bucket_name, object_key = parse_s3_uri(file_path)
             return S3Helper().read_object(bucket_name=bucket_name, object_key=object_key)
         elif file_path.startswith('http'):
+            from urllib.request import urlopen
+
             return urlopen(file_path).read()
         else:
             with open(file_path) as f:
                 return f.read()
 
+    @classmethod
+    def open_file(cls, file_path, offset=None, size=None):
+        """
+        Open a file as a binary file-like object, without reading its contents.
+
+        :param file_path: The S3 URI, URL or local path of the file.
+        :param offset: The offset of the first byte to read.
+        :param size: The number of bytes to read from the offset, or None to read to the end of the file.
+        :return: A file-like object, or None if the S3 object doesn't exist.
+        """
+        if file_path.startswith('s3://'):
+            bucket_name, object_key = parse_s3_uri(file_path)
+            return S3Helper().open_object(bucket_name=bucket_name, object_key=object_key, offset=offset, size=size)
+        elif file_path.startswith('http'):
+            from urllib.request import Request, urlopen
+
+            headers = {}
+            if offset is not None or size is not None:
+                headers['Range'] = build_range_header(offset or 0, size)
+            response = urlopen(Request(file_path, headers=headers))
+            if 'Range' in headers:
+                content_range = response.headers.get('Content-Range') if response.status == 206 else None
+                try:
+                    check_range_response(file_path, offset, size, content_range)
+                except ValueError:
+                    response.close()
+                    raise
+            return response
+        else:
+            if size is not None:
+                with open(file_path, 'rb') as f:
+                    f.seek(offset or 0)
+                    return io.BytesIO(f.read(size))
+            f = open(file_path, 'rb')
+            if offset:
+                f.seek(offset)
+            return f
+
+    @classmethod
+    def iter_file_chunks(cls, file_path, chunk_size=DEFAULT_STREAM_CHUNK_SIZE, offset=None, size=None):
+        stream = cls.open_file(file_path, offset=offset, size=size)
+        if stream is None:
+            return
+        with stream:
+            yield from iter_stream_chunks(stream, chunk_size)
+
+    @classmethod
+    def read_file_range(cls, file_path, offset, size):
+        stream = cls.open_file(file_path, offset=offset, size=size)
+        if stream is None:
+            return None
+        with stream:
+            return stream.read()
+
+    @classmethod
+    def download_file(cls, file_path, destination_file_path, part_size=DEFAULT_RANGED_DOWNLOAD_PART_SIZE,
+                      max_workers=DEFAULT_RANGED_DOWNLOAD_MAX_WORKERS):
+        """
+        Copy a file to a local path. S3 objects are downloaded as parallel ranged GETs, other files are streamed.
+        """
+        if file_path.startswith('s3://'):
+            bucket_name, object_key = parse_s3_uri(file_path)
+            return S3Helper().download_object(bucket_name, object_key, destination_file_path,
+                                              part_size=part_size, max_workers=max_workers)
+        with cls.open_file(file_path) as stream, open(destination_file_path, 'wb') as f:
+            shutil.copyfileobj(stream, f, DEFAULT_STREAM_CHUNK_SIZE)
+        return destination_file_path
+
     @classmethod
     def read_file_json(cls, file_path):
-        file_contents = cls.read_file(file_path)
-        return json.loads(file_contents) if file_contents is not None else None
+        """
+        Parse a JSON file.
+
+        :param file_path: The S3 URI, URL or local path of the file, or a binary file-like object to parse from.
+        """
+        if hasattr(file_path, 'read'):
+            return load_json_stream(file_path)
+        stream = cls.open_file(file_path)
+        if stream is None:
+            return None
+        with stream:
+            return load_json_stream(stream)
+
+    @classmethod
+    def read_file_if_modified(cls, file_path, etag=None, last_modified=None):
+        """
+        Read a file only if it has changed since it was last read.
+
+        :param file_path: The S3 URI, URL or local path of the file.
+        :param etag: The ETag returned by the previous read.
+        :param last_modified: The Last-Modified value returned by the previous read.
+        :return: None if the file has not been modified, otherwise a dict with the contents, etag and last_modified.
+        """
+        if file_path.startswith('s3://'):
+            bucket_name, object_key = parse_s3_uri(file_path)
+            return S3Helper().read_object_if_modified(bucket_name=bucket_name, object_key=object_key, etag=etag)
+        elif file_path.startswith('http'):
+            from urllib.error import HTTPError
+            from urllib.request import Request, urlopen
+
+            headers = {}
+            if etag is not None:
+                headers['If-None-Match'] = etag
+            if last_modified is not None:
+                headers['If-Modified-Since'] = last_modified
+            try:
+                with urlopen(Request(file_path, headers=headers)) as response:
+                    return {
+                        "contents": response.read(),
+                        "etag": response.headers.get('ETag'),
+                        "last_modified": response.headers.get('Last-Modified')
+                    }
+            except HTTPError as e:
+                if e.code == 304:
+                    return None
+                raise e
+        else:
+            file_last_modified = os.stat(file_path).st_mtime_ns
+            if last_modified is not None and file_last_modified == last_modified:
+                return None
+            with open(file_path) as f:
+                return {"contents": f.read(), "etag": None, "last_modified": file_last_modified}
+
+
+class ConfigCache:
+    """
+    Caches parsed JSON configuration files so that they survive warm Lambda invocations.
+
+    Entries are returned as is until their TTL expires, after which the file is revalidated using a conditional
+    request, so an unchanged file is never downloaded and parsed again.
+    """
+
+    def __init__(self, ttl=DEFAULT_CONFIG_CACHE_TTL):
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, file_uri, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+
+        with self.lock:
+            now = time.monotonic()
+            entry = self.entries.get(file_uri)
+            if entry is not None and now - entry['checked_at'] < ttl:
+                return entry['value']
+
+            if entry is None:
+                response = StorageHelper.read_file_if_modified(file_uri)
+            else:
+                response = StorageHelper.read_file_if_modified(file_uri,
+                                                               etag=entry['etag'],
+                                                               last_modified=entry['last_modified'])
+
+            if response is None:
+                logger.debug("Config file %s has not been modified", file_uri)
+                entry['checked_at'] = now
+                return entry['value']
+
+            file_contents = response['contents']
+            value = json.loads(file_contents) if file_contents is not None else None
+            if value is None:
+                self.entries.pop(file_uri, None)
+            else:
+                self.entries[file_uri] = {
+                    "value": value,
+                    "etag": response['etag'],
+                    "last_modified": response['last_modified'],
+                    "checked_at": now
+                }
+            return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+config_cache = ConfigCache()
 
 
 class S3Helper:
 
     def __init__(self, client=None):
-        self.s3 = client or boto3.client('s3')
+        self.s3 = client or get_aws_client('s3')
 
     def read_object(self, bucket_name, object_key):
         try:
@@ -76,11 +585,324 @@ class S3Helper:
                 raise e
 
     def read_object_json(self, bucket, key):
-        file_contents = self.read_object(bucket, key)
-        return json.loads(file_contents) if file_contents is not None else None
+        stream = self.open_object(bucket, key)
+        if stream is None:
+            return None
+        with stream:
+            return load_json_stream(stream)
+
+    def open_object(self, bucket_name, object_key, offset=None, size=None, if_match=None):
+        """
+        Get an object's body as a file-like stream, without reading it.
+
+        :param offset: The offset of the first byte to read.
+        :param size: The number of bytes to read from the offset, or None to read to the end of the object.
+        :param if_match: Only read the object if its ETag still matches.
+        :return: The botocore StreamingBody, or None if the object doesn't exist.
+        :raises ValueError: If a range was requested and the response holds the whole object instead.
+        """
+        get_object_args = {"Bucket": bucket_name, "Key": object_key}
+        if offset is not None or size is not None:
+            get_object_args['Range'] = build_range_header(offset or 0, size)
+        if if_match is not None:
+            get_object_args['IfMatch'] = if_match
+        try:
+            response = self.s3.get_object(**get_object_args)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ("404", "NoSuchKey"):
+                return None
+            raise e
+        if 'Range' in get_object_args:
+            try:
+                check_range_response(f"s3://{bucket_name}/{object_key}", offset, size, response.get('ContentRange'))
+            except ValueError:
+                response['Body'].close()
+                raise
+        return response['Body']
+
+    def iter_object_chunks(self, bucket_name, object_key, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+        stream = self.open_object(bucket_name, object_key)
+        if stream is None:
+            return
+        with stream:
+            yield from stream.iter_chunks(chunk_size)
+
+    def read_object_if_modified(self, bucket_name, object_key, etag=None):
+        get_object_args = {"Bucket": bucket_name, "Key": object_key}
+        if etag is not None:
+            get_object_args['IfNoneMatch'] = etag
+        try:
+            response = self.s3.get_object(**get_object_args)
+        except ClientError as e:
+            error_code = e.response['Error']['Code']
+            if error_code in ("304", "NotModified"):
+                return None
+            if error_code in ("404", "NoSuchKey"):
+                return {"contents": None, "etag": None, "last_modified": None}
+            raise e
+
+        return {
+            "contents": response['Body'].read().decode('utf-8'),
+            "etag": response.get('ETag'),
+            "last_modified": response.get('LastModified')
+        }
+
+    def write_object(self, bucket_name, object_key, contents, content_type=None):
+        put_object_args = {"Bucket": bucket_name, "Key": object_key,
+                           "Body": contents.encode('utf-8') if isinstance(contents, str) else contents}
+        if content_type is not None:
+            put_object_args['ContentType'] = content_type
+        return self.s3.put_object(**put_object_args)
 
+    def get_object_size(self, bucket_name, object_key):
+        return self.s3.head_object(Bucket=bucket_name, Key=object_key)['ContentLength']
 
+    def iter_object_keys(self, bucket_name, prefix=''):
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            for s3_object in page.get('Contents', []):
+                yield s3_object['Key']
 
+    def object_exists(self, bucket_name, object_key):
+        try:
+            self.s3.head_object(Bucket=bucket_name, Key=object_key)
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise e
+
+    def read_object_range(self, bucket_name, object_key, offset, size):
+        """
+        :return: The bytes of the range, which are empty if the size is 0, or None if the object doesn't exist.
+        """
+        if size <= 0:
+            return b''
+        stream = self.open_object(bucket_name, object_key, offset=offset, size=size)
+        if stream is None:
+            return None
+        with stream:
+            return stream.read()
+
+    def download_object(self, bucket_name, object_key, file_path, part_size=DEFAULT_RANGED_DOWNLOAD_PART_SIZE,
+                        max_workers=DEFAULT_RANGED_DOWNLOAD_MAX_WORKERS):
+        """
+        Download an object to a local file as parallel ranged GETs.
+
+        Each part is streamed to its place in the file in chunks, so memory use is bounded by the number of workers
+        rather than the size of the object. The parts are pinned to the object's ETag, so a download fails instead of
+        mixing two versions of an object that is overwritten while it is being read.
+        """
+        head = self.s3.head_object(Bucket=bucket_name, Key=object_key)
+        size = head['ContentLength']
+        etag = head.get('ETag')
+
+        with open(file_path, 'wb') as f:
+            f.truncate(size)
+
+        def download_part(offset):
+            stream = self.open_object(bucket_name, object_key, offset=offset, size=min(part_size, size - offset),
+                                      if_match=etag)
+            if stream is None:
+                raise FileNotFoundError(f"s3://{bucket_name}/{object_key} was deleted while it was being downloaded")
+            with stream, open(file_path, 'r+b') as part_file:
+                part_file.seek(offset)
+                for chunk in stream.iter_chunks(DEFAULT_STREAM_CHUNK_SIZE):
+                    part_file.write(chunk)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(download_part, range(0, size, part_size)))
+        return file_path
+
+
+class S3ObjectSource:
+    """
+    An S3 object read in parts, using ranged GETs, so it can be uploaded with IconikMultipartUploader without
+    downloading it first.
+    """
+
+    def __init__(self, bucket_name, object_key, s3_helper=None):
+        self.bucket_name = bucket_name
+        self.object_key = object_key
+        self.s3_helper = s3_helper or S3Helper()
+        self.size = self.s3_helper.get_object_size(bucket_name, object_key)
+
+    @classmethod
+    def from_uri(cls, s3_uri, s3_helper=None):
+        parsed_uri = urlparse(s3_uri)
+        return cls(parsed_uri.netloc, parsed_uri.path.lstrip('/'), s3_helper=s3_helper)
+
+    def read(self, offset, size):
+        data = self.s3_helper.read_object_range(self.bucket_name, self.object_key, offset, size)
+        if data is None:
+            raise FileNotFoundError(f"s3://{self.bucket_name}/{self.object_key} no longer exists")
+        return data
+
+
+class JsonStreamReader:
+    """
+    A minimal pull parser over a binary JSON stream, used to walk to one part of a large document without loading the
+    rest of it.
+
+    The caller drives the walk: iter_object_keys() and iter_array() leave the reader at the start of each value, which
+    the caller must then consume with read_value(), skip_value() or another iteration.
+    """
+    WHITESPACE = re.compile(r'\s*')
+    STRING_SPECIAL_CHARS = re.compile(r'["\\]')
+    STRUCTURAL_CHARS = re.compile(r'["{}\[\]]')
+    NUMBER_CHARS = re.compile(r'[0-9.eE+-]*')
+
+    def __init__(self, stream, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+        self.chunks = iter_stream_chunks(stream, chunk_size)
+        self.text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def fill(self):
+        """
+        Append the next chunk of the stream to the buffer, dropping the part that has been consumed.
+
+        :return: False if the stream has already been read to the end.
+        """
+        if self.eof:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            text = self.text_decoder.decode(b'', final=True)
+        else:
+            text = self.text_decoder.decode(chunk)
+        self.buffer = self.buffer[self.position:] + text
+        self.position = 0
+        return True
+
+    def peek(self):
+        while True:
+            self.position = self.WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                raise ValueError("Unexpected end of JSON stream")
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found}' in JSON stream")
+        self.position += 1
+
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number may continue in the next chunk, including after a '.' or an exponent that was cut off
+            if self.NUMBER_CHARS.match(self.buffer, end).end() == len(self.buffer) and self.fill():
+                continue
+            self.position = end
+            return value
+
+    def skip_string(self):
+        self.expect('"')
+        while True:
+            match = self.STRING_SPECIAL_CHARS.search(self.buffer, self.position)
+            if match is None or (match.group() == '\\' and match.end() == len(self.buffer)):
+                # Consume what has been scanned so far, so a long string isn't scanned again after the buffer is filled
+                self.position = len(self.buffer) if match is None else match.start()
+                if not self.fill():
+                    raise ValueError("Unterminated string in JSON stream")
+                continue
+            if match.group() == '"':
+                self.position = match.end()
+                return
+            self.position = match.end() + 1
+
+    def skip_value(self):
+        char = self.peek()
+        if char == '"':
+            return self.skip_string()
+        if char not in '{[':
+            self.read_value()
+            return
+
+        depth = 0
+        while True:
+            match = self.STRUCTURAL_CHARS.search(self.buffer, self.position)
+            if match is None:
+                self.position = len(self.buffer)
+                if not self.fill():
+                    raise ValueError("Unexpected end of JSON stream")
+                continue
+            self.position = match.start()
+            char = match.group()
+            if char == '"':
+                self.skip_string()
+                continue
+            self.position += 1
+            depth += 1 if char in '{[' else -1
+            if depth == 0:
+                return
+
+    def read_tree(self):
+        """
+        Read the value at the current position, like read_value().
+
+        An object or array that is already in the buffer is decoded at once. One that continues past the buffer is
+        built one member at a time, so that it is not decoded again each time the buffer is filled.
+        """
+        char = self.peek()
+        if char not in '{[':
+            return self.read_value()
+        try:
+            value, self.position = self.json_decoder.raw_decode(self.buffer, self.position)
+            return value
+        except json.JSONDecodeError:
+            pass
+        if char == '{':
+            return {key: self.read_tree() for key in self.iter_object_keys()}
+        return [self.read_tree() for _ in self.iter_array()]
+
+    def expect_end(self):
+        """
+        :raises ValueError: If there is anything but whitespace left in the stream.
+        """
+        while True:
+            self.position = self.WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                raise ValueError(f"Unexpected '{self.buffer[self.position]}' after the end of the JSON value")
+            if not self.fill():
+                return
+
+    def iter_object_keys(self):
+        self.expect('{')
+        if self.peek() == '}':
+            self.position += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(':')
+            yield key
+            if self.peek() == '}':
+                self.position += 1
+                return
+            self.expect(',')
+
+    def iter_array(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self.position += 1
+            return
+        while True:
+            yield
+            if self.peek() == ']':
+                self.position += 1
+                return
+            self.expect(',')
 
 
 class EnvoiTranscribeTranslateCreateCommand:
@@ -113,6 +935,12 @@ class EnvoiTranscribeTranslateCreateCommand:
         parser.add_argument('--media-file-uri', dest='media_file_uri',
                             required=True,
                             help='The S3 URI of the media file to transcribe.')
+        cls.add_run_input_arguments(parser)
+
+        return parser
+
+    @classmethod
+    def add_run_input_arguments(cls, parser):
         parser.add_argument('--auto-identify-source-language', dest='auto_identify_source_language',
                             action='store_true',
                             help='Tells transcribe to try and automatically identify the source language of the '
@@ -162,6 +990,24 @@ class EnvoiTranscribeTranslateCreateCommand:
         parser.add_argument('-l', '--translation-languages', dest='translation_language_codes',
                             nargs="+",
                             help='The languages to translate to.')
+        parser.add_argument('--translation-language-group-size', dest='translation_language_group_size',
+                            type=int,
+                            default=DEFAULT_TRANSLATION_LANGUAGE_GROUP_SIZE,
+                            help='The number of languages to translate to in each translation job '
+                                 f'(max: {MAX_TRANSLATION_LANGUAGE_GROUP_SIZE}).')
+        parser.add_argument('--skip-translation-language-validation', dest='validate_translation_language_codes',
+                            action='store_false',
+                            help='Do not check that the languages to translate to are supported by AWS Translate.')
+        parser.add_argument('--skip-content-identity', dest='use_content_identity',
+                            action='store_false',
+                            help='Do not derive the default transcription job name and the translation client tokens '
+                                 'from the ETag and size of the media file.')
+        parser.add_argument('--translation-attempt', dest='translation_attempt',
+                            type=int,
+                            default=None,
+                            help='A number that is added to the translation client tokens. Translation jobs that '
+                                 'failed are returned again for the same tokens, pass a new number to start them '
+                                 'again.')
         parser.add_argument('--translation-output-folder-name', dest='translation_output_folder_name',
                             default=DEFAULT_TRANSLATION_OUTPUT_FOLDER_NAME,
                             help='The name of the folder in the S3 bucket where the translated files are stored.')
@@ -187,52 +1033,155 @@ class EnvoiTranscribeTranslateCreateCommand:
         return parser
 
 
-class EnvoiTranscribeTranslateDescribeCommand:
+class EnvoiTranscribeTranslateCreateBatchCommand:
 
-    def __init__(self, opts=None):
+    def __init__(self, opts):
         self.opts = opts
+        self.journal_lock = threading.Lock()
 
     def run(self, opts=None):
         if opts is None:
             opts = self.opts
 
-        execution_arn = opts.execution_arn
-        sme = StateMachineExecution(execution_arn=execution_arn)
-        description = sme.describe()
-        logger.debug("Description: %s", description)
+        base_options = {key: value for key, value in vars(opts).items() if key not in ('handler', 'manifest_file_path',
+                                                                                     'journal_file_path')}
+        is_dry_run = getattr(opts, 'dry_run', False)
+        journal_file_path = getattr(opts, 'journal_file_path', None)
+        completed_row_keys = read_batch_journal(journal_file_path) if journal_file_path and not is_dry_run else set()
+
+        rate_limiter = RateLimiter(getattr(opts, 'rate_limit', DEFAULT_BATCH_RATE_LIMIT))
+        max_retries = getattr(opts, 'max_retries', DEFAULT_BATCH_MAX_RETRIES)
+        max_workers = max(1, getattr(opts, 'max_workers', DEFAULT_BATCH_MAX_WORKERS))
+
+        summary = {"submitted": 0, "skipped": 0, "failed": 0}
+        journal_file = None
+        if journal_file_path and not is_dry_run:
+            journal_file = open(journal_file_path, 'a')
+
+        def handle_result(result):
+            summary["submitted" if result['success'] else "failed"] += 1
+            if journal_file is not None:
+                with self.journal_lock:
+                    journal_file.write(json.dumps(result) + "\n")
+                    journal_file.flush()
+            if not result['success']:
+                logger.error("Failed to submit row %s: %s", result['row'], result['error'])
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                pending = set()
+                for row_number, row in read_batch_manifest(opts.manifest_file_path):
+                    row_options = {**base_options, **row}
+                    row_key = build_batch_row_key(row_options)
+                    if row_key in completed_row_keys:
+                        summary['skipped'] += 1
+                        continue
+
+                    row_opts = SimpleNamespace(**row_options)
+                    if is_dry_run:
+                        print(json.dumps(build_run_input(row_opts)))
+                        continue
+
+                    pending.add(executor.submit(submit_batch_row, row_number, row_key, row_opts, rate_limiter,
+                                                max_retries))
+                    # Keep a bounded number of rows in flight so the manifest is streamed instead of loaded up front
+                    if len(pending) >= max_workers * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            handle_result(future.result())
+
+                for future in pending:
+                    handle_result(future.result())
+        finally:
+            if journal_file is not None:
+                journal_file.close()
+
+        if not is_dry_run:
+            print(json.dumps(summary))
 
-        input_as_string = description.get('input', None)
-        output_as_string = description.get('output', None)
+    @classmethod
+    def init_parser(cls, subparsers=None, command_name="create-batch"):
+        if subparsers is None:
+            parser = argparse.ArgumentParser()
+        else:
+            parser = subparsers.add_parser(
+                command_name,
+                help="Create state machine executions for every media file in a manifest.",
+            )
+        parser.set_defaults(handler=cls)
+        parser.add_argument('--manifest-file-path', dest='manifest_file_path',
+                            required=True,
+                            help='A JSONL or CSV file with a media_file_uri and optional option overrides per row.')
+        parser.add_argument('--journal-file-path', dest='journal_file_path',
+                            default=None,
+                            help='An append-only file where the result of each row is written. Rows that were '
+                                 'already submitted successfully are skipped when the batch is run again.')
+        parser.add_argument('--max-workers', dest='max_workers',
+                            type=int,
+                            default=DEFAULT_BATCH_MAX_WORKERS,
+                            help='The maximum number of executions to start at the same time.')
+        parser.add_argument('--rate-limit', dest='rate_limit',
+                            type=float,
+                            default=DEFAULT_BATCH_RATE_LIMIT,
+                            help='The maximum number of executions to start per second.')
+        parser.add_argument('--max-retries', dest='max_retries',
+                            type=int,
+                            default=DEFAULT_BATCH_MAX_RETRIES,
+                            help='The number of times to retry starting an execution when throttled.')
+        EnvoiTranscribeTranslateCreateCommand.add_run_input_arguments(parser)
 
-        if input_as_string is not None:
-            input_as_json = json.loads(input_as_string)
-            description['input'] = input_as_json
-            # print(json.dumps(input_as_json, indent=2))
+        return parser
 
-        output_as_json = None
-        if output_as_string is not None:
-            output_as_json = json.loads(output_as_string)
-            description['output'] = output_as_json
-            # print(json.dumps(output_as_json, indent=2))
 
-        if opts.uris_only:
-            transcription_job = output_as_json.get('TranscriptionJob', {})
-            subtitles = transcription_job.get('Subtitles', {})
-            sub_title_file_urls = subtitles.get('SubtitleFileUris', None)
+class EnvoiTranscribeTranslateDescribeCommand:
 
-            transcript = transcription_job.get('Transcript', None)
-            transcript_uri = transcript.get('TranscriptFileUri', None)
+    def __init__(self, opts=None):
+        self.opts = opts
 
-            output = {
-                "Transcription": {
-                    "TranscriptFileUri": transcript_uri,
-                    "SubtitleFileUris": sub_title_file_urls
-                }
-            }
-            print(json.dumps(output, indent=2))
+    def run(self, opts=None):
+        if opts is None:
+            opts = self.opts
 
+        if opts.state_machine_arn is not None:
+            return self.run_bulk(opts)
+        if opts.execution_arn is None:
+            raise ValueError("Either --execution-arn or --state-machine-arn must be specified.")
+
+        execution_arn = opts.execution_arn
+        sme = StateMachineExecution(execution_arn=execution_arn)
+        description = parse_execution_description(sme.describe())
+        logger.debug("Description: %s", description)
+
+        if opts.uris_only:
+            print(json.dumps(build_execution_output_uris(description), indent=2))
         else:
-            print(json.dumps(json.loads(CustomJsonEncoder().encode(description)), indent=2))
+            print(json.dumps(description, indent=2, cls=CustomJsonEncoder))
+
+    def run_bulk(self, opts):
+        """
+        Describe the executions of a state machine, printing one JSON line per execution as soon as it is described.
+        """
+        describer = ExecutionDescriber(max_workers=opts.max_workers)
+        executions = describer.iter_executions(opts.state_machine_arn,
+                                               status_filter=opts.status_filter,
+                                               started_after=opts.started_after,
+                                               started_before=opts.started_before)
+
+        # Only succeeded executions have output files, the listing is enough for the others
+        should_describe = (lambda execution: execution['status'] == 'SUCCEEDED') if opts.uris_only else None
+        for description in describer.describe_executions(executions, should_describe=should_describe):
+            try:
+                description = parse_execution_description(description)
+                if opts.uris_only and description['status'] != 'ERROR':
+                    output = {"executionArn": description['executionArn'], "status": description['status'],
+                              **build_execution_output_uris(description)}
+                else:
+                    output = description
+            except Exception as e:
+                # Report the execution and go on with the others
+                output = {"executionArn": description.get('executionArn'), "status": "ERROR",
+                          "error": f"{e.__class__.__name__}: {e}"}
+            print(json.dumps(output, cls=CustomJsonEncoder), flush=True)
 
     @classmethod
     def init_parser(cls, subparsers=None, command_name="describe"):
@@ -241,7 +1190,7 @@ class EnvoiTranscribeTranslateDescribeCommand:
         else:
             parser = subparsers.add_parser(
                 command_name,
-                help="Describe an execution.",
+                help="Describe an execution, or the executions of a state machine.",
             )
         parser.set_defaults(handler=cls)
         parser.add_argument(
@@ -251,6 +1200,42 @@ class EnvoiTranscribeTranslateDescribeCommand:
             default=None,
             help="The ARN of the state machine execution to describe.",
         )
+        parser.add_argument(
+            "--state-machine-arn",
+            dest="state_machine_arn",
+            default=None,
+            help="Describe the executions of this state machine instead, printing one JSON line per execution.",
+        )
+        parser.add_argument(
+            "--status-filter",
+            dest="status_filter",
+            choices=EXECUTION_STATUSES,
+            default=None,
+            help="Only describe the executions with this status.",
+        )
+        parser.add_argument(
+            "--started-after",
+            dest="started_after",
+            type=parse_datetime,
+            default=None,
+            help="Only describe the executions started at or after this ISO 8601 date and time, UTC if it has no "
+                 "time zone.",
+        )
+        parser.add_argument(
+            "--started-before",
+            dest="started_before",
+            type=parse_datetime,
+            default=None,
+            help="Only describe the executions started before this ISO 8601 date and time, UTC if it has no time "
+                 "zone.",
+        )
+        parser.add_argument(
+            "--max-workers",
+            dest="max_workers",
+            type=int,
+            default=DEFAULT_DESCRIBE_MAX_WORKERS,
+            help="The maximum number of executions to describe at the same time.",
+        )
         parser.add_argument(
             "--uris-only",
             action="store_true",
@@ -262,6 +1247,225 @@ class EnvoiTranscribeTranslateDescribeCommand:
         return parser
 
 
+class EnvoiTranscribeTranslateWatchCommand:
+
+    def __init__(self, opts=None):
+        self.opts = opts
+
+    def run(self, opts=None):
+        if opts is None:
+            opts = self.opts
+
+        execution_arns = list(opts.execution_arns or [])
+        if opts.execution_arns_file_path:
+            execution_arns.extend(read_execution_arns_file(opts.execution_arns_file_path))
+        if not execution_arns:
+            raise ValueError("At least one execution ARN must be specified.")
+
+        watcher = ExecutionWatcher(dict.fromkeys(execution_arns),
+                                   initial_interval=opts.initial_interval,
+                                   max_interval=opts.max_interval,
+                                   jitter=opts.jitter,
+                                   max_workers=opts.max_workers)
+        for description in watcher.watch(timeout=opts.timeout):
+            output = {key: description.get(key) for key in ('executionArn', 'status', 'startDate', 'stopDate')}
+            print(json.dumps(output, cls=CustomJsonEncoder), flush=True)
+
+        for execution_arn in watcher.pending:
+            print(json.dumps({"executionArn": execution_arn, "status": "RUNNING"}), flush=True)
+
+    @classmethod
+    def init_parser(cls, subparsers=None, command_name="watch"):
+        if subparsers is None:
+            parser = argparse.ArgumentParser()
+        else:
+            parser = subparsers.add_parser(
+                command_name,
+                help="Wait for executions to finish.",
+            )
+        parser.set_defaults(handler=cls)
+        parser.add_argument(
+            "--execution-arn",
+            action="append",
+            dest="execution_arns",
+            default=None,
+            help="The ARN of a state machine execution to watch. Can be specified multiple times.",
+        )
+        parser.add_argument(
+            "--execution-arns-file-path",
+            dest="execution_arns_file_path",
+            default=None,
+            help="A file with one execution ARN per line, or a create-batch journal file.",
+        )
+        parser.add_argument(
+            "--initial-interval",
+            dest="initial_interval",
+            type=float,
+            default=DEFAULT_WATCH_INITIAL_INTERVAL,
+            help="The number of seconds to wait before checking an execution for the second time.",
+        )
+        parser.add_argument(
+            "--max-interval",
+            dest="max_interval",
+            type=float,
+            default=DEFAULT_WATCH_MAX_INTERVAL,
+            help="The maximum number of seconds to wait between checks of an execution.",
+        )
+        parser.add_argument(
+            "--jitter",
+            dest="jitter",
+            type=float,
+            default=DEFAULT_WATCH_JITTER,
+            help="The fraction by which the interval between checks is randomly varied.",
+        )
+        parser.add_argument(
+            "--max-workers",
+            dest="max_workers",
+            type=int,
+            default=DEFAULT_WATCH_MAX_WORKERS,
+            help="The maximum number of executions to check at the same time.",
+        )
+        parser.add_argument(
+            "--timeout",
+            dest="timeout",
+            type=float,
+            default=None,
+            help="The maximum number of seconds to watch for.",
+        )
+
+        return parser
+
+
+class EnvoiTranscribeTranslateRunCommand:
+
+    def __init__(self, opts):
+        self.opts = opts
+
+    def run(self, opts=None):
+        if opts is None:
+            opts = self.opts
+
+        run_input = build_run_input(opts)
+        if getattr(opts, 'dry_run', False):
+            print(json.dumps(run_input, indent=2))
+            return
+
+        translation_memory = None
+        if opts.translation_memory_uri:
+            translation_memory = TranslationMemory.from_uri(opts.translation_memory_uri,
+                                                            max_entries=opts.translation_memory_max_entries)
+
+        runner = DirectPipelineRunner(initial_interval=opts.initial_interval,
+                                      max_interval=opts.max_interval,
+                                      max_workers=opts.max_workers,
+                                      translation_mode=opts.translation_mode,
+                                      sync_translation_threshold=opts.sync_translation_threshold,
+                                      translation_memory=translation_memory)
+        result = runner.run(run_input)
+        print(json.dumps(result, indent=2, cls=CustomJsonEncoder))
+        if result['Status'] != 'SUCCEEDED':
+            raise RuntimeError("The pipeline did not complete successfully.")
+
+    @classmethod
+    def init_parser(cls, subparsers=None, command_name="run"):
+        if subparsers is None:
+            parser = argparse.ArgumentParser()
+        else:
+            parser = subparsers.add_parser(
+                command_name,
+                help="Run the transcribe and translate jobs directly, without a state machine.",
+            )
+        parser.set_defaults(handler=cls)
+        parser.add_argument('--media-file-uri', dest='media_file_uri',
+                            required=True,
+                            help='The S3 URI of the media file to transcribe.')
+        parser.add_argument('--initial-interval', dest='initial_interval',
+                            type=float,
+                            default=DEFAULT_DIRECT_INITIAL_INTERVAL,
+                            help='The number of seconds to wait before checking a job for the second time.')
+        parser.add_argument('--max-interval', dest='max_interval',
+                            type=float,
+                            default=DEFAULT_DIRECT_MAX_INTERVAL,
+                            help='The maximum number of seconds to wait between checks of a job.')
+        parser.add_argument('--max-workers', dest='max_workers',
+                            type=int,
+                            default=DEFAULT_DIRECT_MAX_WORKERS,
+                            help='The maximum number of translation jobs to run at the same time.')
+        parser.add_argument('--translation-mode', dest='translation_mode',
+                            choices=TRANSLATION_MODES,
+                            default=DEFAULT_TRANSLATION_MODE,
+                            help='Translate with batch translation jobs, with synchronous TranslateText requests, or '
+                                 'choose automatically based on the size of the subtitles.')
+        parser.add_argument('--sync-translation-threshold', dest='sync_translation_threshold',
+                            type=int,
+                            default=DEFAULT_SYNC_TRANSLATION_THRESHOLD,
+                            help='In auto mode, translate synchronously when the subtitle file size, in bytes, times '
+                                 'the number of target languages is at most this.')
+        parser.add_argument('--translation-memory-uri', dest='translation_memory_uri',
+                            default=None,
+                            help='A SQLite database file path or an S3 URI prefix where synchronous translations are '
+                                 'remembered, so repeated segments are not translated again. Only used by sync '
+                                 'translation.')
+        parser.add_argument('--translation-memory-max-entries', dest='translation_memory_max_entries',
+                            type=int,
+                            default=DEFAULT_TRANSLATION_MEMORY_MAX_ENTRIES,
+                            help='The maximum number of translations to remember for each language pair.')
+        EnvoiTranscribeTranslateCreateCommand.add_run_input_arguments(parser)
+
+        return parser
+
+
+class EnvoiTranscribeTranslatePlanCommand:
+
+    def __init__(self, opts):
+        self.opts = opts
+
+    def run(self, opts=None):
+        if opts is None:
+            opts = self.opts
+
+        plan = RunPlanner(max_workers=opts.max_workers).plan(opts)
+        if opts.start and not plan['UpToDate']:
+            plan['ExecutionArn'] = run_step_function(opts.state_machine_arn, plan['RunInput'])
+        print(json.dumps(plan, indent=2))
+
+    @classmethod
+    def validate_opts(cls, opts):
+        """
+        Check the options that depend on each other, when the command line is parsed.
+
+        :return: An error message, or None if the options are valid.
+        """
+        if opts.start and not opts.state_machine_arn:
+            return "--start requires --state-machine-arn"
+        return None
+
+    @classmethod
+    def init_parser(cls, subparsers=None, command_name="plan"):
+        if subparsers is None:
+            parser = argparse.ArgumentParser()
+        else:
+            parser = subparsers.add_parser(
+                command_name,
+                help="Print the run input reduced to the transcription and translations that don't exist yet.",
+            )
+        parser.set_defaults(handler=cls)
+        parser.add_argument('--media-file-uri', dest='media_file_uri',
+                            required=True,
+                            help='The S3 URI of the media file to transcribe.')
+        parser.add_argument('--max-workers', dest='max_workers',
+                            type=int,
+                            default=DEFAULT_PLAN_MAX_WORKERS,
+                            help='The maximum number of S3 requests to make at the same time.')
+        parser.add_argument('--start', dest='start',
+                            action='store_true',
+                            help='Start the state machine with the reduced run input, unless everything already '
+                                 'exists. Requires --state-machine-arn.')
+        EnvoiTranscribeTranslateCreateCommand.add_run_input_arguments(parser)
+
+        return parser
+
+
 class EnvoiTranscribeTranslateCommand:
 
     def __init__(self):
@@ -279,88 +1483,1158 @@ class EnvoiTranscribeTranslateCommand:
 
         sub_commands = {
             'create': EnvoiTranscribeTranslateCreateCommand,
-            'describe': EnvoiTranscribeTranslateDescribeCommand
+            'create-batch': EnvoiTranscribeTranslateCreateBatchCommand,
+            'describe': EnvoiTranscribeTranslateDescribeCommand,
+            'plan': EnvoiTranscribeTranslatePlanCommand,
+            'run': EnvoiTranscribeTranslateRunCommand,
+            'watch': EnvoiTranscribeTranslateWatchCommand
         }
 
         if sub_commands is not None:
             sub_command_parsers = {}
             sub_parsers = parser.add_subparsers(dest='transcribe_translate_command')
 
-            for sub_command_name, sub_command_handler in sub_commands.items():
-                sub_command_parser = sub_command_handler.init_parser(sub_parsers, command_name=sub_command_name)
-                sub_command_parser.required = True
-                sub_command_parsers[sub_command_name] = sub_command_parser
+            for sub_command_name, sub_command_handler in sub_commands.items():
+                sub_command_parser = sub_command_handler.init_parser(sub_parsers, command_name=sub_command_name)
+                sub_command_parser.required = True
+                sub_command_parsers[sub_command_name] = sub_command_parser
+
+        return parser
+
+
+class StateMachine:
+    """Encapsulates Step Functions state machine actions."""
+
+    def __init__(self, stepfunctions_client=None, state_machine_arn=None):
+        """
+        :param stepfunctions_client: A Boto3 Step Functions client.
+        """
+        if stepfunctions_client is None:
+            stepfunctions_client = get_aws_client('stepfunctions')
+
+        self.stepfunctions_client = stepfunctions_client
+        self.state_machine_arn = state_machine_arn
+
+    def start(self, run_input, state_machine_arn=None):
+        """
+        Start a run of a state machine with a specified input. A run is also known
+        as an "execution" in Step Functions.
+
+        :param state_machine_arn: The ARN of the state machine to run.
+        :param run_input: The input to the state machine, in JSON format.
+        :return: The ARN of the run. This can be used to get information about the run,
+                 including its current status and final output.
+        """
+
+        if state_machine_arn is None:
+            state_machine_arn = self.state_machine_arn
+
+        try:
+            response = self.stepfunctions_client.start_execution(
+                stateMachineArn=state_machine_arn, input=run_input
+            )
+        except ClientError as err:
+            logger.error(
+                "Couldn't start state machine %s. Here's why: %s: %s",
+                state_machine_arn,
+                err.response["Error"]["Code"],
+                err.response["Error"]["Message"],
+            )
+            raise
+        else:
+            return response["executionArn"]
+
+
+class StateMachineExecution:
+
+    def __init__(self, stepfunctions_client=None, execution_arn=None):
+        if stepfunctions_client is None:
+            stepfunctions_client = get_aws_client('stepfunctions')
+
+        self.stepfunctions_client = stepfunctions_client
+        self.execution_arn = execution_arn
+
+    def describe(self):
+        try:
+            response = self.stepfunctions_client.describe_execution(
+                executionArn=self.execution_arn
+            )
+        except ClientError as err:
+            logger.error(
+                "Couldn't describe state machine execution %s. %s: %s",
+                self.execution_arn,
+                err.response["Error"]["Code"],
+                err.response["Error"]["Message"],
+            )
+            raise
+        else:
+            return response
+
+
+class ExecutionWatcher:
+    """
+    Watches many state machine executions at the same time and yields each one as soon as it finishes.
+
+    Each execution is polled on its own schedule, starting with a short interval that grows by the backoff factor after
+    every check, up to the maximum interval. When many executions of the same state machine are being watched, the
+    status of the ones that are due is checked with a single paginated ListExecutions call and only the executions
+    that are no longer running are described.
+    """
+
+    def __init__(self, execution_arns, stepfunctions_client=None,
+                 initial_interval=DEFAULT_WATCH_INITIAL_INTERVAL,
+                 max_interval=DEFAULT_WATCH_MAX_INTERVAL,
+                 backoff_factor=DEFAULT_WATCH_BACKOFF_FACTOR,
+                 jitter=DEFAULT_WATCH_JITTER,
+                 max_workers=DEFAULT_WATCH_MAX_WORKERS,
+                 list_executions_threshold=DEFAULT_WATCH_LIST_EXECUTIONS_THRESHOLD):
+        if stepfunctions_client is None:
+            stepfunctions_client = get_aws_client('stepfunctions')
+
+        self.stepfunctions_client = stepfunctions_client
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.jitter = jitter
+        self.max_workers = max_workers
+        self.list_executions_threshold = list_executions_threshold
+
+        now = time.monotonic()
+        self.pending = {execution_arn: {"interval": initial_interval, "next_check_at": now}
+                        for execution_arn in execution_arns}
+
+    def add(self, execution_arn):
+        self.pending[execution_arn] = {"interval": self.initial_interval, "next_check_at": time.monotonic()}
+
+    def schedule_next_check(self, execution_arn, now):
+        schedule = self.pending[execution_arn]
+        interval = schedule['interval']
+        if self.jitter:
+            interval *= 1 + random.uniform(-self.jitter, self.jitter)
+        schedule['next_check_at'] = now + interval
+        schedule['interval'] = min(self.max_interval, schedule['interval'] * self.backoff_factor)
+
+    def describe_execution(self, execution_arn):
+        try:
+            return self.stepfunctions_client.describe_execution(executionArn=execution_arn)
+        except ClientError as e:
+            if is_throttling_error(e):
+                return None
+            if e.response['Error']['Code'] == 'ExecutionDoesNotExist':
+                return {"executionArn": execution_arn, "status": "NOT_FOUND"}
+            raise e
+
+    def list_running_execution_arns(self, state_machine_arn):
+        running_execution_arns = set()
+        paginator = self.stepfunctions_client.get_paginator('list_executions')
+        for page in paginator.paginate(stateMachineArn=state_machine_arn, statusFilter='RUNNING'):
+            running_execution_arns.update(execution['executionArn'] for execution in page['executions'])
+        return running_execution_arns
+
+    def check(self, execution_arns, executor):
+        """
+        Check the status of the given executions.
+
+        :return: A list of the descriptions of the executions that have finished.
+        """
+        pending_groups = group_execution_arns_by_state_machine(self.pending)
+        execution_arns_to_describe = []
+        for state_machine_arn, group in group_execution_arns_by_state_machine(execution_arns).items():
+            pending_group = pending_groups.get(state_machine_arn, [])
+            if state_machine_arn is None or len(pending_group) < self.list_executions_threshold:
+                execution_arns_to_describe.extend(group)
+                continue
+            try:
+                running_execution_arns = self.list_running_execution_arns(state_machine_arn)
+            except ClientError as e:
+                if not is_throttling_error(e):
+                    raise e
+                continue
+            # The listing covers every watched execution of the state machine, not only the ones that are due, and
+            # only the executions that are no longer running need to be described to get their final status
+            execution_arns_to_describe.extend(arn for arn in pending_group if arn not in running_execution_arns)
+
+        finished = []
+        for description in executor.map(self.describe_execution, execution_arns_to_describe):
+            if description is not None and description['status'] not in ('RUNNING', 'PENDING_REDRIVE'):
+                finished.append(description)
+        return finished
+
+    def watch(self, timeout=None):
+        """
+        Watch the executions until they have all finished.
+
+        :param timeout: The maximum number of seconds to watch for. Executions that haven't finished when the timeout
+                        expires are left in self.pending.
+        :return: A generator of the descriptions of the executions, in the order in which they finish.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        last_checked_at = None
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while self.pending:
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    return
+
+                due_execution_arns = [arn for arn, schedule in self.pending.items() if schedule['next_check_at'] <= now]
+                if not due_execution_arns:
+                    next_check_at = min(schedule['next_check_at'] for schedule in self.pending.values())
+                    # Checks are at least initial_interval apart so that executions that are due at around the same
+                    # time are checked together
+                    if last_checked_at is not None:
+                        next_check_at = max(next_check_at, last_checked_at + self.initial_interval)
+                    if deadline is not None:
+                        next_check_at = min(next_check_at, deadline)
+                    time.sleep(max(0, next_check_at - now))
+                    continue
+
+                last_checked_at = now
+                for description in self.check(due_execution_arns, executor):
+                    self.pending.pop(description['executionArn'], None)
+                    yield description
+
+                now = time.monotonic()
+                for execution_arn in due_execution_arns:
+                    if execution_arn in self.pending:
+                        self.schedule_next_check(execution_arn, now)
+
+
+class ExecutionDescriber:
+    """
+    Describes the executions of a state machine in bulk.
+
+    Executions are listed one page at a time and described concurrently, with a bounded number of descriptions in
+    flight, so the memory used doesn't grow with the number of executions. Descriptions are yielded as soon as they
+    arrive, not in the order of the listing. Throttled calls are retried by the client's retry mode.
+    """
+
+    def __init__(self, stepfunctions_client=None, max_workers=DEFAULT_DESCRIBE_MAX_WORKERS):
+        if stepfunctions_client is None:
+            stepfunctions_client = get_aws_client('stepfunctions')
+
+        self.stepfunctions_client = stepfunctions_client
+        self.max_workers = max(1, max_workers)
+
+    def iter_executions(self, state_machine_arn, status_filter=None, started_after=None, started_before=None):
+        """
+        List the executions of a state machine lazily, most recently started first.
+
+        ListExecutions returns the executions in descending order of start date, so the listing stops at the first
+        execution that started before started_after instead of paging through the older ones.
+
+        :param started_after: Only list the executions started at or after this timezone aware datetime.
+        :param started_before: Only list the executions started before this timezone aware datetime.
+        :return: A generator of ListExecutions entries.
+        """
+        list_executions_args = remove_none_values({"stateMachineArn": state_machine_arn,
+                                                   "statusFilter": status_filter})
+        paginator = self.stepfunctions_client.get_paginator('list_executions')
+        for page in paginator.paginate(**list_executions_args):
+            for execution in page['executions']:
+                start_date = execution['startDate']
+                if started_before is not None and start_date >= started_before:
+                    continue
+                if started_after is not None and start_date < started_after:
+                    return
+                yield execution
+
+    def describe_execution(self, execution_arn):
+        """
+        :return: The description of the execution, or a dict with its executionArn and a NOT_FOUND status, or an ERROR
+                 status and the error, so one execution that can't be described doesn't stop the others.
+        """
+        try:
+            return self.stepfunctions_client.describe_execution(executionArn=execution_arn)
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ExecutionDoesNotExist':
+                return {"executionArn": execution_arn, "status": "NOT_FOUND"}
+            return {"executionArn": execution_arn, "status": "ERROR", "error": f"{e.__class__.__name__}: {e}"}
+        except BotoCoreError as e:
+            return {"executionArn": execution_arn, "status": "ERROR", "error": f"{e.__class__.__name__}: {e}"}
+
+    def describe_executions(self, executions, should_describe=None):
+        """
+        Describe executions concurrently.
+
+        :param executions: An iterable of ListExecutions entries, it is consumed only as fast as the executions are
+                           described.
+        :param should_describe: A function that tells whether an entry must be described. The entries for which it
+                                returns False are yielded as they are.
+        :return: A generator of the descriptions, in the order in which they arrive.
+        """
+        executions = iter(executions)
+        max_in_flight = self.max_workers * 2
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = set()
+            while True:
+                for execution in executions:
+                    if should_describe is not None and not should_describe(execution):
+                        yield execution
+                        continue
+                    futures.add(executor.submit(self.describe_execution, execution['executionArn']))
+                    if len(futures) >= max_in_flight:
+                        break
+                if not futures:
+                    return
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+
+def parse_execution_description(description):
+    """
+    Replace the input and output JSON strings of an execution description with their parsed values.
+    """
+    for key in ('input', 'output'):
+        if description.get(key) is not None:
+            description[key] = json.loads(description[key])
+    return description
+
+
+def build_execution_output_uris(description):
+    """
+    Get the URIs of the output files of an execution from its parsed description.
+
+    The transcribe state machine outputs its transcription job, which has the URIs of the transcript and subtitle files.
+    The transcribe-translate state machine outputs the list of results of its Map state instead, so the URIs are built
+    from the run input, like the state machine builds them.
+    """
+    output = description.get('output')
+    run_input = description.get('input')
+    run_input = run_input if isinstance(run_input, dict) else {}
+    transcription_job = (output.get('TranscriptionJob') if isinstance(output, dict) else None) or {}
+    transcribe_input = run_input.get('Transcribe')
+
+    transcript_file_uri = (transcription_job.get('Transcript') or {}).get('TranscriptFileUri')
+    subtitle_file_uris = (transcription_job.get('Subtitles') or {}).get('SubtitleFileUris')
+    if transcript_file_uri is None and transcribe_input is not None:
+        transcript_file_uri = build_transcribe_output_s3_uri_from_transcribe_input(transcribe_input)
+        subtitle_file_uris = build_transcribe_subtitle_s3_uris(transcribe_input) or None
+
+    output_uris = {
+        "Transcription": {
+            "TranscriptFileUri": transcript_file_uri,
+            "SubtitleFileUris": subtitle_file_uris
+        }
+    }
+    translate_inputs = (run_input.get('Translate') or {}).get('Inputs') or []
+    if translate_inputs:
+        output_uris['Translation'] = {
+            "OutputS3Uris": list(dict.fromkeys(translate_input['OutputDataConfig']['S3Uri']
+                                               for translate_input in translate_inputs))
+        }
+    return output_uris
+
+
+def parse_datetime(value):
+    """
+    Parse an ISO 8601 date and time, assuming UTC when it has no time zone.
+    """
+    try:
+        parsed_datetime = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid ISO 8601 date and time: {value}")
+    if parsed_datetime.tzinfo is None:
+        parsed_datetime = parsed_datetime.replace(tzinfo=datetime.timezone.utc)
+    return parsed_datetime
+
+
+def get_state_machine_arn_from_execution_arn(execution_arn):
+    # arn:aws:states:{region}:{account}:execution:{state machine name}:{execution name}
+    arn_parts = execution_arn.split(':')
+    if len(arn_parts) < 8 or arn_parts[5] != 'execution':
+        return None
+    return ':'.join(arn_parts[:5] + ['stateMachine', arn_parts[6]])
+
+
+def group_execution_arns_by_state_machine(execution_arns):
+    groups = {}
+    for execution_arn in execution_arns:
+        groups.setdefault(get_state_machine_arn_from_execution_arn(execution_arn), []).append(execution_arn)
+    return groups
+
+
+def poll(check, initial_interval=DEFAULT_DIRECT_INITIAL_INTERVAL, max_interval=DEFAULT_DIRECT_MAX_INTERVAL,
+         backoff_factor=DEFAULT_WATCH_BACKOFF_FACTOR, jitter=DEFAULT_WATCH_JITTER, sleep=time.sleep):
+    """
+    Call check until it returns something other than None, waiting longer after each call.
+
+    :param check: A function that returns None while the polled resource isn't ready.
+    :param initial_interval: The number of seconds to wait after the first call.
+    :param max_interval: The maximum number of seconds to wait between calls.
+    :param backoff_factor: The factor by which the interval grows after each call.
+    :param jitter: The fraction by which the interval is randomly varied.
+    :param sleep: The function used to wait.
+    :return: The first value returned by check that isn't None.
+    """
+    interval = initial_interval
+    while True:
+        result = check()
+        if result is not None:
+            return result
+        sleep(interval * (1 + random.uniform(-jitter, jitter)) if jitter else interval)
+        interval = min(max_interval, interval * backoff_factor)
+
+
+def remove_none_values(d):
+    return {key: value for key, value in d.items() if value is not None}
+
+
+class DirectPipelineRunner:
+    """
+    Runs the transcribe and translate pipeline of a run input in-process, without Step Functions.
+
+    The run input is the same document that build_run_input creates for the state machine. The transcription job is
+    started and polled first, then all the translation jobs are started and polled concurrently. Every wait uses
+    adaptive polling, and the clients and the sleep function can be injected to run against local stubs.
+    """
+
+    def __init__(self, transcribe_client=None, translate_client=None,
+                 initial_interval=DEFAULT_DIRECT_INITIAL_INTERVAL,
+                 max_interval=DEFAULT_DIRECT_MAX_INTERVAL,
+                 backoff_factor=DEFAULT_WATCH_BACKOFF_FACTOR,
+                 jitter=DEFAULT_WATCH_JITTER,
+                 max_workers=DEFAULT_DIRECT_MAX_WORKERS,
+                 sleep=time.sleep,
+                 translation_mode=DEFAULT_TRANSLATION_MODE,
+                 sync_translation_threshold=DEFAULT_SYNC_TRANSLATION_THRESHOLD,
+                 s3_helper=None,
+                 translation_memory=None):
+        self.transcribe_client = transcribe_client or get_aws_client('transcribe')
+        self.translate_client = translate_client or get_aws_client('translate')
+        self.translation_mode = translation_mode
+        self.sync_translation_threshold = sync_translation_threshold
+        self.translation_memory = translation_memory
+        self.s3_helper = s3_helper
+        self.sleep = sleep
+        self.poll_args = {
+            "initial_interval": initial_interval,
+            "max_interval": max_interval,
+            "backoff_factor": backoff_factor,
+            "jitter": jitter,
+            "sleep": sleep
+        }
+        self.max_workers = max_workers
+
+    def run(self, run_input):
+        """
+        Run the pipeline.
+
+        :param run_input: The run input created by build_run_input.
+        :return: A dict with the status, the transcription job, the translation jobs and the timings of each stage.
+        """
+        started_at = time.monotonic()
+        timings = {}
+        result = {"Status": "SUCCEEDED", "TranscriptionJob": None, "TranslationJobs": [], "Timings": timings}
+
+        transcription_job = self.run_transcription_job(run_input['Transcribe'], timings,
+                                                       reuse_output=run_input.get('ReuseTranscriptionOutput', False),
+                                                       skip=run_input.get('SkipTranscription', False))
+        result['TranscriptionJob'] = transcription_job
+        if transcription_job['TranscriptionJobStatus'] != 'COMPLETED':
+            result['Status'] = 'FAILED'
+        else:
+            translate_inputs = run_input.get('Translate', {}).get('Inputs', [])
+            subtitle_file_uris = build_transcribe_subtitle_s3_uris(run_input['Transcribe'])
+            result['TranslationMode'] = self.select_translation_mode(subtitle_file_uris, translate_inputs)
+            if result['TranslationMode'] == 'sync':
+                translation_jobs = self.run_sync_translations(translate_inputs, subtitle_file_uris, timings)
+            else:
+                translation_jobs = self.run_translation_jobs(translate_inputs, timings)
+            result['TranslationJobs'] = translation_jobs
+            if any(translation_job['JobStatus'] != 'COMPLETED' for translation_job in translation_jobs):
+                result['Status'] = 'FAILED'
+
+        timings['total'] = time.monotonic() - started_at
+        return result
+
+    def get_existing_transcription_job(self, transcribe_input):
+        """
+        Find the transcription job of a previous run of the same work.
+
+        This must only be used when the job name identifies the media file's content, otherwise the job or output found
+        may be of another file with the same name.
+
+        :return: The job if it exists or its output does, otherwise None.
+        """
+        transcription_job_name = transcribe_input['TranscriptionJobName']
+        try:
+            return self.transcribe_client.get_transcription_job(
+                TranscriptionJobName=transcription_job_name)['TranscriptionJob']
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('BadRequestException', 'NotFoundException'):
+                raise e
+
+        s3_helper = self.s3_helper or S3Helper()
+        transcribe_output_s3_uri = build_transcribe_output_s3_uri_from_transcribe_input(transcribe_input)
+        if s3_helper.object_exists(*parse_s3_uri(transcribe_output_s3_uri)):
+            return {"TranscriptionJobName": transcription_job_name,
+                    "TranscriptionJobStatus": "COMPLETED",
+                    "Transcript": {"TranscriptFileUri": transcribe_output_s3_uri}}
+        return None
+
+    def run_transcription_job(self, transcribe_input, timings, reuse_output=False, skip=False):
+        """
+        Run a transcription job and wait for it to finish.
+
+        :param reuse_output: Whether an existing job with the same name, or its output, is reused. It is only set when
+                             the job name identifies the media file's content. Otherwise an existing job fails the run,
+                             like StartTranscriptionJob does. An existing job that failed is not restarted, as in the
+                             state machine, it has to be deleted first.
+        :param skip: Whether the run input was planned with the transcription left out.
+        """
+        started_at = time.monotonic()
+        if skip:
+            # The run input was planned with the transcription left out because its output already exists
+            return {"TranscriptionJobName": transcribe_input['TranscriptionJobName'],
+                    "TranscriptionJobStatus": "COMPLETED",
+                    "Reused": True}
+
+        transcription_job = self.get_existing_transcription_job(transcribe_input) if reuse_output else None
+        if transcription_job is not None and transcription_job['TranscriptionJobStatus'] in ('COMPLETED', 'FAILED'):
+            timings['transcribe'] = time.monotonic() - started_at
+            return {**transcription_job, "Reused": True}
+
+        if transcription_job is None:
+            try:
+                self.transcribe_client.start_transcription_job(**remove_none_values(transcribe_input))
+            except ClientError as e:
+                # Another run started the same job in the meantime, wait for it instead
+                if e.response['Error']['Code'] != 'ConflictException' or not reuse_output:
+                    raise e
+        transcription_job_name = transcribe_input['TranscriptionJobName']
+        timings['transcribe_submit'] = time.monotonic() - started_at
+
+        def check():
+            try:
+                transcription_job = self.transcribe_client.get_transcription_job(
+                    TranscriptionJobName=transcription_job_name)['TranscriptionJob']
+            except ClientError as e:
+                if is_throttling_error(e):
+                    return None
+                raise e
+            if transcription_job['TranscriptionJobStatus'] in TRANSCRIPTION_JOB_RUNNING_STATUSES:
+                return None
+            return transcription_job
+
+        transcription_job = poll(check, **self.poll_args)
+        timings['transcribe'] = time.monotonic() - started_at
+        return transcription_job
+
+    def run_translation_job(self, translate_input):
+        started_at = time.monotonic()
+        job_id = self.translate_client.start_text_translation_job(**remove_none_values(translate_input))['JobId']
+
+        def check():
+            try:
+                translation_job = self.translate_client.describe_text_translation_job(
+                    JobId=job_id)['TextTranslationJobProperties']
+            except ClientError as e:
+                if is_throttling_error(e):
+                    return None
+                raise e
+            if translation_job['JobStatus'] in TRANSLATION_JOB_RUNNING_STATUSES:
+                return None
+            return translation_job
+
+        translation_job = poll(check, **self.poll_args)
+        return {"JobId": job_id,
+                "JobStatus": translation_job['JobStatus'],
+                "TargetLanguageCodes": translate_input['TargetLanguageCodes'],
+                "Duration": time.monotonic() - started_at}
+
+    def run_translation_jobs(self, translate_inputs, timings):
+        started_at = time.monotonic()
+        translation_jobs = []
+        if translate_inputs:
+            max_workers = max(1, min(self.max_workers, len(translate_inputs)))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                translation_jobs = list(executor.map(self.run_translation_job, translate_inputs))
+        timings['translate'] = time.monotonic() - started_at
+        return translation_jobs
+
+    def select_translation_mode(self, subtitle_file_uris, translate_inputs):
+        """
+        Choose between batch translation jobs and synchronous translation.
+
+        In auto mode the transcript is translated synchronously when the size of its smallest subtitle file, times the
+        number of target languages, is below the sync translation threshold.
+        """
+        if self.translation_mode != 'auto':
+            return self.translation_mode
+        if not subtitle_file_uris or not translate_inputs:
+            return 'batch'
+        s3_helper = self.s3_helper or S3Helper()
+        subtitle_size = min(s3_helper.get_object_size(*parse_s3_uri(uri)) for uri in subtitle_file_uris)
+        language_count = sum(len(translate_input['TargetLanguageCodes']) for translate_input in translate_inputs)
+        return 'sync' if subtitle_size * language_count <= self.sync_translation_threshold else 'batch'
+
+    def run_sync_translations(self, translate_inputs, subtitle_file_uris, timings):
+        started_at = time.monotonic()
+        translator = SyncTranslator(translate_client=self.translate_client, s3_helper=self.s3_helper,
+                                    max_workers=self.max_workers, sleep=self.sleep,
+                                    translation_memory=self.translation_memory)
+        translation_jobs = translator.run(translate_inputs, subtitle_file_uris)
+        timings['translate'] = time.monotonic() - started_at
+        return translation_jobs
+
+
+class SyncTranslator:
+    """
+    Translates subtitle files with synchronous TranslateText requests instead of batch translation jobs.
+
+    The text of each cue is translated as a whole, so that a sentence broken over the lines of a cue is translated as
+    one. The cue texts of all the files are deduplicated and, when there is a translation memory, looked up in it. The
+    ones it doesn't have are packed one per line into requests under the TranslateText size limit, a cue text over the
+    limit is split into chunks translated on their own, and every language and request is translated concurrently. Each
+    translation is broken back into the number of lines of its cue, so the output files keep the timings and the line
+    count of the source cues. The output files are written where a batch translation job writes them, to a
+    {account id}-TranslateText-{id} folder under the output S3 URI of their translate input, as
+    {target language code}.{source file name}. The id is the client token of the translate input.
+    """
+
+    def __init__(self, translate_client=None, s3_helper=None, max_workers=DEFAULT_SYNC_TRANSLATION_MAX_WORKERS,
+                 max_retries=DEFAULT_BATCH_MAX_RETRIES, max_text_bytes=MAX_TRANSLATE_TEXT_BYTES, sleep=time.sleep,
+                 translation_memory=None):
+        self.translate_client = translate_client or get_aws_client('translate')
+        self.s3_helper = s3_helper or S3Helper()
+        self.translation_memory = translation_memory
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.max_text_bytes = max_text_bytes
+        self.sleep = sleep
+
+    def translate_text(self, text, source_language_code, target_language_code):
+        attempt = 0
+        while True:
+            try:
+                response = self.translate_client.translate_text(Text=text,
+                                                                SourceLanguageCode=source_language_code,
+                                                                TargetLanguageCode=target_language_code)
+                return response['TranslatedText']
+            except ClientError as e:
+                if not is_throttling_error(e) or attempt >= self.max_retries:
+                    raise e
+                self.sleep(compute_backoff_delay(attempt))
+                attempt += 1
+
+    def translate_batch(self, texts, source_language_code, target_language_code):
+        """
+        :return: A dict of the translation of each text.
+        """
+        if len(texts) == 1:
+            translated_texts = [self.translate_segment(texts[0], source_language_code, target_language_code)]
+        else:
+            translated_texts = self.translate_text('\n'.join(texts), source_language_code,
+                                                   target_language_code).split('\n')
+            if len(translated_texts) != len(texts):
+                # The lines were merged or split by the translation, translate them one at a time to keep them aligned
+                translated_texts = [self.translate_segment(text, source_language_code, target_language_code)
+                                    for text in texts]
+        return dict(zip(texts, (translated_text.strip() for translated_text in translated_texts)))
+
+    def translate_segment(self, text, source_language_code, target_language_code):
+        """
+        Translate a text on its own, in chunks when it is over the TranslateText size limit.
+        """
+        return ' '.join(self.translate_text(chunk, source_language_code, target_language_code).strip()
+                        for chunk in split_translate_text(text, self.max_text_bytes))
+
+    def read_source_file(self, file_uri):
+        if file_uri.startswith('s3://'):
+            return self.s3_helper.read_object(*parse_s3_uri(file_uri))
+        return StorageHelper.read_file(file_uri)
+
+    def write_output_file(self, output_s3_uri, source_file_uri, target_language_code, cues, translations):
+        output_file_uri = f"{output_s3_uri}{target_language_code}.{os.path.basename(source_file_uri)}"
+        self.s3_helper.write_object(*parse_s3_uri(output_file_uri), render_subtitle_cues(cues, translations),
+                                    content_type='text/plain; charset=utf-8')
+        return output_file_uri
+
+    def run(self, translate_inputs, source_file_uris):
+        """
+        Translate the source files into the target languages of each translate input.
+
+        :param translate_inputs: The translate inputs created by build_translate_input.
+        :param source_file_uris: The S3 URIs of the SRT or WebVTT files to translate.
+        :return: A result for each translate input, in the same shape as the translation jobs of DirectPipelineRunner.
+        """
+        started_at = time.monotonic()
+        source_files = {uri: parse_subtitle_cues(self.read_source_file(uri) or '') for uri in source_file_uris}
+        texts = list(dict.fromkeys(get_subtitle_cue_text(cue) for cues in source_files.values() for cue in cues
+                                   if cue['text_lines']))
+
+        language_pairs = list(dict.fromkeys((translate_input['SourceLanguageCode'], target_language_code)
+                                            for translate_input in translate_inputs
+                                            for target_language_code in translate_input['TargetLanguageCodes']))
+        translations = {}
+        for language_pair in language_pairs:
+            translations[language_pair] = (self.translation_memory.lookup(*language_pair, texts)
+                                           if self.translation_memory is not None else {})
+        translation_memory_hit_counts = {language_pair: len(translations[language_pair])
+                                         for language_pair in language_pairs}
+        errors = {}
+
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+            batch_futures = [(language_pair, executor.submit(self.translate_batch, batch, *language_pair))
+                             for language_pair in language_pairs
+                             for batch in pack_translate_text_batches(
+                                 [text for text in texts if text not in translations[language_pair]],
+                                 self.max_text_bytes)]
+            for language_pair, future in batch_futures:
+                try:
+                    batch_translations = future.result()
+                except Exception as e:
+                    errors.setdefault(language_pair, f"{e.__class__.__name__}: {e}")
+                    continue
+                translations[language_pair].update(batch_translations)
+                if self.translation_memory is not None:
+                    self.translation_memory.store(*language_pair, batch_translations)
+            if self.translation_memory is not None:
+                self.translation_memory.flush()
+
+            write_futures = {}
+            for translate_input in translate_inputs:
+                for target_language_code in translate_input['TargetLanguageCodes']:
+                    language_pair = (translate_input['SourceLanguageCode'], target_language_code)
+                    if language_pair in errors:
+                        continue
+                    for source_file_uri, cues in source_files.items():
+                        write_futures[(id(translate_input), target_language_code, source_file_uri)] = executor.submit(
+                            self.write_output_file, build_sync_translation_output_s3_uri(translate_input),
+                            source_file_uri, target_language_code, cues, translations[language_pair])
+
+        results = []
+        for translate_input in translate_inputs:
+            result = {"JobId": None,
+                      "JobStatus": "COMPLETED",
+                      "TargetLanguageCodes": translate_input['TargetLanguageCodes'],
+                      "OutputFileUris": [],
+                      "SegmentCount": len(texts),
+                      "TranslationMemoryHitCount": sum(
+                          translation_memory_hit_counts[(translate_input['SourceLanguageCode'], target_language_code)]
+                          for target_language_code in translate_input['TargetLanguageCodes']),
+                      "Duration": time.monotonic() - started_at}
+            for target_language_code in translate_input['TargetLanguageCodes']:
+                error = errors.get((translate_input['SourceLanguageCode'], target_language_code))
+                if error is not None:
+                    result['JobStatus'] = 'FAILED'
+                    result.setdefault('Errors', {})[target_language_code] = error
+                    continue
+                for source_file_uri in source_files:
+                    future = write_futures[(id(translate_input), target_language_code, source_file_uri)]
+                    try:
+                        result['OutputFileUris'].append(future.result())
+                    except Exception as e:
+                        result['JobStatus'] = 'FAILED'
+                        result.setdefault('Errors', {})[target_language_code] = f"{e.__class__.__name__}: {e}"
+            results.append(result)
+        return results
+
+
+class RunPlanner:
+    """
+    Reduces a run input to the work whose output doesn't exist yet.
+
+    The transcription's JSON and subtitle files are checked with concurrent HEAD requests, and the translated files are
+    found with one listing of each translation output folder, which covers every language at once. A language is
+    translated when a translation of every subtitle file exists, either in a batch translation job's output folder or
+    written directly by the sync translation mode. When the transcription has to be run again, every language is
+    translated again too.
+
+    Existing output is only trusted when the transcription job name identifies the media file's content, and
+    translations only when they are stored in that job's folder. Otherwise the files found may be of another media file
+    with the same name, so everything is planned to run.
+    """
+
+    def __init__(self, s3_helper=None, max_workers=DEFAULT_PLAN_MAX_WORKERS):
+        self.s3_helper = s3_helper or S3Helper()
+        self.max_workers = max_workers
+
+    def find_existing_files(self, file_uris, executor):
+        exists = executor.map(lambda file_uri: self.s3_helper.object_exists(*parse_s3_uri(file_uri)), file_uris)
+        return {file_uri for file_uri, file_exists in zip(file_uris, exists) if file_exists}
+
+    def list_file_names(self, folder_s3_uri):
+        bucket_name, prefix = parse_s3_uri(folder_s3_uri)
+        return {os.path.basename(object_key) for object_key in self.s3_helper.iter_object_keys(bucket_name, prefix)}
+
+    def plan(self, opts):
+        """
+        :param opts: The options of build_run_input.
+        :return: A dict with the reduced run input, what exists and what is missing, and whether everything is up to
+                 date.
+        """
+        run_input = build_run_input(opts)
+        transcribe_input = run_input['Transcribe']
+        transcript_file_uri = build_transcribe_output_s3_uri_from_transcribe_input(transcribe_input)
+        subtitle_file_uris = build_transcribe_subtitle_s3_uris(transcribe_input)
+        translate_inputs = run_input['Translate']['Inputs']
+        language_codes = list(dict.fromkeys(language_code for translate_input in translate_inputs
+                                            for language_code in translate_input['TargetLanguageCodes']))
+        translate_output_s3_uris = list(dict.fromkeys(translate_input['OutputDataConfig']['S3Uri']
+                                                      for translate_input in translate_inputs))
+        content_keyed = run_input.get('ReuseTranscriptionOutput', False)
+        transcription_job_folder = f"/{transcribe_input['TranscriptionJobName']}/"
+        translations_content_keyed = content_keyed and all(transcription_job_folder in output_s3_uri
+                                                           for output_s3_uri in translate_output_s3_uris)
+
+        existing_files = set()
+        translated_file_names = set()
+        if content_keyed:
+            with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+                translated_file_names_futures = [executor.submit(self.list_file_names, output_s3_uri)
+                                                 for output_s3_uri in translate_output_s3_uris
+                                                 if translations_content_keyed]
+                existing_files = self.find_existing_files([transcript_file_uri, *subtitle_file_uris], executor)
+                for future in translated_file_names_futures:
+                    translated_file_names.update(future.result())
+
+        transcription_exists = content_keyed and len(existing_files) == 1 + len(subtitle_file_uris)
+        source_file_names = [os.path.basename(file_uri) for file_uri in (subtitle_file_uris or [transcript_file_uri])]
+        if transcription_exists:
+            existing_language_codes = [language_code for language_code in language_codes
+                                       if all(f"{language_code}.{source_file_name}" in translated_file_names
+                                              for source_file_name in source_file_names)]
+        else:
+            existing_language_codes = []
+        missing_language_codes = [language_code for language_code in language_codes
+                                  if language_code not in existing_language_codes]
+
+        if transcription_exists:
+            run_input['SkipTranscription'] = True
+        if existing_language_codes:
+            reduced_opts = SimpleNamespace(**{**vars(opts),
+                                              "translation_language_codes": missing_language_codes,
+                                              "validate_translation_language_codes": False})
+            run_input['Translate'] = build_translate_input(
+                reduced_opts, transcript_file_uri,
+                content_identity=run_input.get('ContentIdentity'),
+                transcription_job_name=transcribe_input['TranscriptionJobName'])
+
+        return {
+            "UpToDate": transcription_exists and not missing_language_codes,
+            "Transcription": {"Exists": transcription_exists,
+                              "FileUris": [transcript_file_uri, *subtitle_file_uris]},
+            "Translation": {"ExistingLanguageCodes": existing_language_codes,
+                            "MissingLanguageCodes": missing_language_codes},
+            "RunInput": run_input
+        }
+
+
+class TranslationMemory:
+    """
+    Translations of segments that were already translated, keyed by language pair and segment hash.
 
-        return parser
+    Segments are normalized before they are hashed, so segments that only differ in Unicode normalization or whitespace
+    share a translation. The entries are kept by a backend, which evicts the least recently used entries of a language
+    pair once it has more than max_entries of them. The last use of an entry is only recorded once a day, so the
+    eviction order is approximate but a run that only reads the memory doesn't write to it.
 
+    Only sync translation uses the memory. Batch translation jobs, which the state machine and the default mode of the
+    run command use, translate whole files and don't read or write it.
+    """
 
-class StateMachine:
-    """Encapsulates Step Functions state machine actions."""
+    def __init__(self, backend):
+        self.backend = backend
 
-    def __init__(self, stepfunctions_client=None, state_machine_arn=None):
+    @classmethod
+    def from_uri(cls, uri, max_entries=DEFAULT_TRANSLATION_MEMORY_MAX_ENTRIES, s3_helper=None):
         """
-        :param stepfunctions_client: A Boto3 Step Functions client.
+        :param uri: An S3 URI prefix for an S3 backend, otherwise the path of a SQLite database file.
         """
-        if stepfunctions_client is None:
-            stepfunctions_client = boto3.client('stepfunctions')
+        if uri.startswith('s3://'):
+            return cls(S3TranslationMemoryBackend(uri, max_entries=max_entries, s3_helper=s3_helper))
+        return cls(SqliteTranslationMemoryBackend(uri, max_entries=max_entries))
 
-        self.stepfunctions_client = stepfunctions_client
-        self.state_machine_arn = state_machine_arn
+    @classmethod
+    def normalize_segment(cls, text):
+        return ' '.join(unicodedata.normalize('NFC', text).split())
 
-    def start(self, run_input, state_machine_arn=None):
-        """
-        Start a run of a state machine with a specified input. A run is also known
-        as an "execution" in Step Functions.
+    @classmethod
+    def hash_segment(cls, text):
+        return hashlib.sha256(cls.normalize_segment(text).encode('utf-8')).hexdigest()
 
-        :param state_machine_arn: The ARN of the state machine to run.
-        :param run_input: The input to the state machine, in JSON format.
-        :return: The ARN of the run. This can be used to get information about the run,
-                 including its current status and final output.
+    def lookup(self, source_language_code, target_language_code, texts):
+        """
+        :return: A dict of the translation of each text that is in the translation memory.
         """
+        segment_hashes = {text: self.hash_segment(text) for text in texts}
+        found = self.backend.get_many(source_language_code, target_language_code, set(segment_hashes.values()))
+        return {text: found[segment_hash] for text, segment_hash in segment_hashes.items() if segment_hash in found}
+
+    def store(self, source_language_code, target_language_code, translations):
+        self.backend.put_many(source_language_code, target_language_code,
+                              {self.hash_segment(text): translation for text, translation in translations.items()})
+
+    def flush(self):
+        self.backend.flush()
+
+
+class SqliteTranslationMemoryBackend:
+
+    def __init__(self, file_path, max_entries=DEFAULT_TRANSLATION_MEMORY_MAX_ENTRIES):
+        import sqlite3
+
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(file_path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS translation_memory ("
+                "source_language_code TEXT NOT NULL, target_language_code TEXT NOT NULL, segment_hash TEXT NOT NULL, "
+                "translation TEXT NOT NULL, last_used_at REAL NOT NULL, "
+                "PRIMARY KEY (source_language_code, target_language_code, segment_hash))")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS translation_memory_last_used_at "
+                "ON translation_memory (source_language_code, target_language_code, last_used_at)")
+
+    def get_many(self, source_language_code, target_language_code, segment_hashes):
+        segment_hashes = list(segment_hashes)
+        found = {}
+        with self.lock, self.connection:
+            # Stay under SQLite's limit on the number of parameters of a statement
+            now = time.time()
+            stale_segment_hashes = []
+            for i in range(0, len(segment_hashes), 500):
+                chunk = segment_hashes[i:i + 500]
+                rows = self.connection.execute(
+                    "SELECT segment_hash, translation, last_used_at FROM translation_memory "
+                    "WHERE source_language_code = ? AND target_language_code = ? "
+                    f"AND segment_hash IN ({', '.join('?' * len(chunk))})",
+                    [source_language_code, target_language_code, *chunk])
+                for segment_hash, translation, last_used_at in rows:
+                    found[segment_hash] = translation
+                    if now - last_used_at >= TRANSLATION_MEMORY_RECENCY_INTERVAL:
+                        stale_segment_hashes.append(segment_hash)
+            if stale_segment_hashes:
+                self.connection.executemany(
+                    "UPDATE translation_memory SET last_used_at = ? "
+                    "WHERE source_language_code = ? AND target_language_code = ? AND segment_hash = ?",
+                    [(now, source_language_code, target_language_code, segment_hash)
+                     for segment_hash in stale_segment_hashes])
+        return found
+
+    def put_many(self, source_language_code, target_language_code, translations):
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO translation_memory VALUES (?, ?, ?, ?, ?)",
+                [(source_language_code, target_language_code, segment_hash, translation, now)
+                 for segment_hash, translation in translations.items()])
+            entry_count = self.connection.execute(
+                "SELECT COUNT(*) FROM translation_memory WHERE source_language_code = ? AND target_language_code = ?",
+                (source_language_code, target_language_code)).fetchone()[0]
+            if entry_count > self.max_entries:
+                self.connection.execute(
+                    "DELETE FROM translation_memory WHERE rowid IN ("
+                    "SELECT rowid FROM translation_memory WHERE source_language_code = ? AND target_language_code = ? "
+                    "ORDER BY last_used_at LIMIT ?)",
+                    (source_language_code, target_language_code, entry_count - self.max_entries))
+
+    def flush(self):
+        pass
 
-        if state_machine_arn is None:
-            state_machine_arn = self.state_machine_arn
 
-        try:
-            response = self.stepfunctions_client.start_execution(
-                stateMachineArn=state_machine_arn, input=run_input
-            )
-        except ClientError as err:
-            logger.error(
-                "Couldn't start state machine %s. Here's why: %s: %s",
-                state_machine_arn,
-                err.response["Error"]["Code"],
-                err.response["Error"]["Message"],
-            )
-            raise
+class S3TranslationMemoryBackend:
+    """
+    Keeps the entries of each language pair in one JSON object under an S3 prefix.
+
+    An object is read the first time its language pair is used and written back on flush when it has new entries, or
+    entries whose last use has to be recorded, so a run makes one GET and at most one PUT per language pair. Runs that
+    flush the same language pair at the same time keep the entries of the last one to finish.
+    """
+
+    def __init__(self, s3_uri, max_entries=DEFAULT_TRANSLATION_MEMORY_MAX_ENTRIES, s3_helper=None):
+        self.bucket_name, self.key_prefix = parse_s3_uri(s3_uri)
+        if self.key_prefix and not self.key_prefix.endswith('/'):
+            self.key_prefix += '/'
+        self.max_entries = max_entries
+        self.s3_helper = s3_helper or S3Helper()
+        self.lock = threading.Lock()
+        self.language_pairs = {}
+        self.modified_language_pairs = set()
+
+    def get_object_key(self, source_language_code, target_language_code):
+        return f"{self.key_prefix}{source_language_code}/{target_language_code}.json"
+
+    def get_entries(self, source_language_code, target_language_code):
+        language_pair = (source_language_code, target_language_code)
+        if language_pair not in self.language_pairs:
+            contents = self.s3_helper.read_object_json(self.bucket_name,
+                                                       self.get_object_key(source_language_code, target_language_code))
+            self.language_pairs[language_pair] = (contents or {}).get('entries', {})
+        return self.language_pairs[language_pair]
+
+    def get_many(self, source_language_code, target_language_code, segment_hashes):
+        now = time.time()
+        found = {}
+        with self.lock:
+            entries = self.get_entries(source_language_code, target_language_code)
+            for segment_hash in segment_hashes:
+                entry = entries.get(segment_hash)
+                if entry is None:
+                    continue
+                found[segment_hash] = entry[0]
+                if now - entry[1] >= TRANSLATION_MEMORY_RECENCY_INTERVAL:
+                    entry[1] = now
+                    self.modified_language_pairs.add((source_language_code, target_language_code))
+        return found
+
+    def put_many(self, source_language_code, target_language_code, translations):
+        now = time.time()
+        with self.lock:
+            entries = self.get_entries(source_language_code, target_language_code)
+            for segment_hash, translation in translations.items():
+                entries[segment_hash] = [translation, now]
+            if len(entries) > self.max_entries:
+                least_recently_used = sorted(entries, key=lambda segment_hash: entries[segment_hash][1])
+                for segment_hash in least_recently_used[:len(entries) - self.max_entries]:
+                    del entries[segment_hash]
+            self.modified_language_pairs.add((source_language_code, target_language_code))
+
+    def flush(self):
+        with self.lock:
+            for source_language_code, target_language_code in self.modified_language_pairs:
+                self.s3_helper.write_object(self.bucket_name,
+                                            self.get_object_key(source_language_code, target_language_code),
+                                            json.dumps({"entries": self.language_pairs[(source_language_code,
+                                                                                        target_language_code)]}),
+                                            content_type='application/json')
+            self.modified_language_pairs.clear()
+
+
+def parse_subtitle_cues(contents):
+    """
+    Split the contents of an SRT or WebVTT file into blocks.
+
+    Each block is a dict with its lines up to and including the cue timing line, and the non-empty lines of the cue
+    text. Blocks that are not cues, such as the WEBVTT header or NOTE blocks, have no text lines.
+    """
+    cues = []
+    for block in re.split(r'\r?\n[ \t]*\r?\n', contents.strip()):
+        lines = block.splitlines()
+        timing_index = next((index for index, line in enumerate(lines) if '-->' in line), None)
+        if timing_index is None:
+            cues.append({"lines": lines, "text_lines": []})
         else:
-            return response["executionArn"]
+            cues.append({"lines": lines[:timing_index + 1],
+                         "text_lines": [line.strip() for line in lines[timing_index + 1:] if line.strip()]})
+    return cues
 
 
-class StateMachineExecution:
+def get_subtitle_cue_text(cue):
+    """
+    The text of a cue, its lines joined by spaces.
+    """
+    return ' '.join(cue['text_lines'])
 
-    def __init__(self, stepfunctions_client=None, execution_arn=None):
-        if stepfunctions_client is None:
-            stepfunctions_client = boto3.client('stepfunctions')
 
-        self.stepfunctions_client = stepfunctions_client
-        self.execution_arn = execution_arn
+def wrap_subtitle_text(text, line_count):
+    """
+    Break a text into at most line_count lines of about the same length.
+
+    The text is broken at spaces, or between characters when it has too few of them, as in languages written without
+    spaces between words.
+    """
+    if line_count <= 1:
+        return [text]
+    separator = ' ' if text.count(' ') >= line_count - 1 else ''
+    units = text.split(separator) if separator else list(text)
+    if not units:
+        return [text]
+    lengths = list(itertools.accumulate(len(unit) + len(separator) for unit in units))
+    breaks = [0]
+    for line_index in range(1, line_count):
+        # Leave at least one unit for each of the following lines
+        candidates = range(breaks[-1] + 1, len(units) - (line_count - line_index) + 1)
+        if not candidates:
+            break
+        target_length = lengths[-1] * line_index / line_count
+        breaks.append(min(candidates, key=lambda index: abs(lengths[index - 1] - target_length)))
+    breaks.append(len(units))
+    return [separator.join(units[start:end]) for start, end in zip(breaks, breaks[1:])]
+
+
+def render_subtitle_cues(cues, translations):
+    """
+    Render cues with the translation of their text, broken into as many lines as the text of the cue had.
+    """
+    blocks = []
+    for cue in cues:
+        lines = list(cue['lines'])
+        if cue['text_lines']:
+            translation = translations.get(get_subtitle_cue_text(cue))
+            lines.extend(cue['text_lines'] if translation is None
+                         else wrap_subtitle_text(translation, len(cue['text_lines'])))
+        blocks.append('\n'.join(lines))
+    return '\n\n'.join(blocks) + '\n'
+
+
+def split_translate_text(text, max_bytes=MAX_TRANSLATE_TEXT_BYTES):
+    """
+    Split a text into chunks that are at most max_bytes long in UTF-8.
+
+    Each chunk ends at the last sentence end that fits, otherwise at the last space or, failing that, at the last
+    character that fits.
+    """
+    chunks = []
+    while len(text.encode('utf-8')) > max_bytes:
+        head = text.encode('utf-8')[:max_bytes].decode('utf-8', errors='ignore')
+        match = (re.match(r'.*(?:[.!?]\s|[\u3002\uff01\uff1f])', head, re.DOTALL)
+                 or re.match(r'.*\s', head, re.DOTALL))
+        end = match.end() if match else len(head)
+        chunks.append(text[:end].strip())
+        text = text[end:]
+    chunks.append(text.strip())
+    return [chunk for chunk in chunks if chunk]
+
+
+def pack_translate_text_batches(texts, max_bytes=MAX_TRANSLATE_TEXT_BYTES):
+    """
+    Pack single line texts into batches that, joined by newlines, are at most max_bytes long in UTF-8.
+
+    A text that is longer than max_bytes on its own is put in a batch by itself.
+    """
+    batches = []
+    batch = []
+    batch_size = 0
+    for text in texts:
+        text_size = len(text.encode('utf-8')) + 1
+        if batch and batch_size + text_size > max_bytes:
+            batches.append(batch)
+            batch = []
+            batch_size = 0
+        batch.append(text)
+        batch_size += text_size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def build_sync_translation_output_s3_uri(translate_input):
+    """
+    The S3 URI of the folder that SyncTranslator writes the files of a translate input to.
+
+    It is named like the folder of a batch translation job, {account id}-TranslateText-{job id}, with the client token
+    of the translate input as the id. The account id is the one of the data access role.
+    """
+    output_s3_uri = translate_input['OutputDataConfig']['S3Uri']
+    if not output_s3_uri.endswith('/'):
+        output_s3_uri += '/'
+    # arn:aws:iam::{account}:role/{role name}
+    account_id = translate_input['DataAccessRoleArn'].split(':')[4]
+    return f"{output_s3_uri}{account_id}-TranslateText-{translate_input['ClientToken']}/"
 
-    def describe(self):
-        try:
-            response = self.stepfunctions_client.describe_execution(
-                executionArn=self.execution_arn
-            )
-        except ClientError as err:
-            logger.error(
-                "Couldn't describe state machine execution %s. %s: %s",
-                self.execution_arn,
-                err.response["Error"]["Code"],
-                err.response["Error"]["Message"],
-            )
-            raise
-        else:
-            return response
+
+def build_transcribe_subtitle_s3_uris(transcribe_input):
+    """
+    The S3 URIs of the subtitle files that a transcription job creates.
+    """
+    subtitle_formats = (transcribe_input.get('Subtitles') or {}).get('Formats') or []
+    transcribe_output_s3_uri = build_transcribe_output_s3_uri_from_transcribe_input(transcribe_input)
+    return [f"{os.path.splitext(transcribe_output_s3_uri)[0]}.{subtitle_format}"
+            for subtitle_format in subtitle_formats]
 
 
 def build_translate_input_for_file_and_language(input_data_config_s3_uri,
@@ -408,7 +2682,15 @@ def get_uri_from_opts(opts, attribute_name):
     return output_s3_uri
 
 
-def build_default_transcription_job_name(opts, media_file_uri=None, file_name_without_extension=None):
+def build_default_transcription_job_name(opts, media_file_uri=None, file_name_without_extension=None,
+                                         content_identity=None):
+    """
+    Build a transcription job name from the media file name and the source language.
+
+    When the identity of the media file's content is known, the name ends with a hash of the content and of the
+    transcription options, so different files with the same name get different jobs, and the same file transcribed the
+    same way always gets the same job.
+    """
     if file_name_without_extension is None:
         if media_file_uri is None:
             media_file_uri = opts.media_file_uri
@@ -420,14 +2702,22 @@ def build_default_transcription_job_name(opts, media_file_uri=None, file_name_wi
     source_language_for_file_name = source_language_code or 'auto'
     transcription_job_name = f"{file_name_without_extension}-{source_language_for_file_name}"
 
+    if content_identity is not None:
+        content_key = build_content_key(content_identity, {option_name: getattr(opts, option_name, None)
+                                                           for option_name in TRANSCRIPTION_CONTENT_KEY_OPTIONS})
+        # Transcription job names are limited to 200 characters
+        transcription_job_name = f"{transcription_job_name[:180]}-{content_key[:16]}"
+
     return transcription_job_name
 
 
-def determine_transcription_job_name(opts, media_file_uri=None, file_name_without_extension=None):
+def determine_transcription_job_name(opts, media_file_uri=None, file_name_without_extension=None,
+                                     content_identity=None):
     transcription_job_name = getattr(opts, 'transcription_job_name', None)
     if transcription_job_name is None and getattr(opts, 'create_default_transcription_job_name',
                                                   DEFAULT_TRANSCRIPTION_CREATE_DEFAULT_JOB_NAME):
-        transcription_job_name = build_default_transcription_job_name(opts, media_file_uri, file_name_without_extension)
+        transcription_job_name = build_default_transcription_job_name(opts, media_file_uri, file_name_without_extension,
+                                                                      content_identity=content_identity)
 
     transcription_job_name = re.sub(r'[^0-9a-zA-Z._-]', '-', transcription_job_name)
     return transcription_job_name
@@ -500,11 +2790,15 @@ def build_transcription_output_uri_without_folder_name(opts, transcription_job_n
     return transcription_output_s3_uri
 
 
-def build_translate_output_s3_uri(opts, transcribe_output_s3_uri):
+def build_translate_output_s3_uri(opts, transcribe_output_s3_uri, transcription_job_name=None):
+    """
+    :param transcription_job_name: The name of the transcription job. When the translations are stored next to the
+                                   transcription, they go in the folder of this job, so that they share its content key.
+    """
     translate_output_s3_uri = get_uri_from_opts(opts, 'translation_output_s3_uri')
 
     if transcribe_output_s3_uri.startswith(translate_output_s3_uri):
-        translate_output_s3_uri = build_transcription_output_uri_without_folder_name(opts)
+        translate_output_s3_uri = build_transcription_output_uri_without_folder_name(opts, transcription_job_name)
 
     if not translate_output_s3_uri.endswith('/'):
         translate_output_s3_uri += '/'
@@ -527,12 +2821,16 @@ def build_transcribe_output_s3_uri_from_transcribe_input(transcribe_input):
     return transcribe_output_s3_uri
 
 
-def build_translate_input(opts, transcribe_output_s3_uri):
+def build_translate_input(opts, transcribe_output_s3_uri, content_identity=None, transcription_job_name=None):
     """
     Build the AWS Translate input from the AWS Transcribe input.
 
     :param transcribe_output_s3_uri: The transcribe output s3 URI.
     :param opts: The command line options.
+    :param content_identity: The identity of the media file's content. When it is known, the client token of each
+                             translation job is derived from it, so submitting the same work again doesn't start a
+                             duplicate job.
+    :param transcription_job_name: The name of the transcription job, see build_translate_output_s3_uri.
     :return: The AWS Translate input.
     """
 
@@ -544,25 +2842,49 @@ def build_translate_input(opts, transcribe_output_s3_uri):
         translate_language_codes = get_translation_language_codes([source_language_code])
     else:
         translate_language_codes = translation_language_codes
+        if getattr(opts, 'validate_translation_language_codes', True):
+            validate_translation_language_codes(translate_language_codes)
 
     data_access_role_arn = getattr(opts, 'translation_data_access_role_arn', None)
 
-    translate_output_s3_uri = build_translate_output_s3_uri(opts, transcribe_output_s3_uri)
+    translate_output_s3_uri = build_translate_output_s3_uri(opts, transcribe_output_s3_uri,
+                                                            transcription_job_name=transcription_job_name)
 
     # We need the URI without a filename because AWS Transcribe requires a directory for the input
     translate_input_s3_uri = os.path.dirname(transcribe_output_s3_uri)  # .replace('.json', f".{subtitle_format}")
     if not translate_input_s3_uri.endswith('/'):
         translate_input_s3_uri += '/'
 
+    translation_language_group_size = getattr(opts, 'translation_language_group_size',
+                                              DEFAULT_TRANSLATION_LANGUAGE_GROUP_SIZE)
+    translation_language_group_size = max(1, min(translation_language_group_size or 1,
+                                                 MAX_TRANSLATION_LANGUAGE_GROUP_SIZE))
+
+    translation_attempt = getattr(opts, 'translation_attempt', None)
+
     translate_inputs = []
-    for language_code in translate_language_codes:
-        target_languages = [language_code]
+    for target_languages in group_language_codes(translate_language_codes, translation_language_group_size):
+        client_token = None
+        if content_identity is not None:
+            # Client tokens are at most 64 characters long
+            client_token_options = {
+                "transcribe_output_s3_uri": transcribe_output_s3_uri,
+                "source_language_code": source_language_code,
+                "target_languages": target_languages,
+                "data_access_role_arn": data_access_role_arn,
+                "output_s3_uri": translate_output_s3_uri
+            }
+            # Left out when it isn't set, so the tokens of earlier submissions don't change
+            if translation_attempt is not None:
+                client_token_options['attempt'] = translation_attempt
+            client_token = build_content_key(content_identity, client_token_options)
         translate_input = build_translate_input_for_file_and_language(
             input_data_config_s3_uri=translate_input_s3_uri,
             source_language_code=source_language_code,
             target_languages=target_languages,
             data_access_role_arn=data_access_role_arn,
-            output_s3_uri=translate_output_s3_uri
+            output_s3_uri=translate_output_s3_uri,
+            client_token=client_token
         )
         if translate_input is not None:
             translate_inputs.append(translate_input)
@@ -574,6 +2896,53 @@ def build_translate_input(opts, transcribe_output_s3_uri):
     return translate_input
 
 
+def group_language_codes(language_codes, group_size):
+    """
+    Split the language codes into groups of up to group_size codes, keeping their order.
+    """
+    return [language_codes[i:i + group_size] for i in range(0, len(language_codes), group_size)]
+
+
+def build_range_header(offset, size=None):
+    """
+    :raises ValueError: If the size is 0 or less, which can't be expressed as a byte range.
+    """
+    if size is None:
+        return f"bytes={offset}-"
+    if size <= 0:
+        raise ValueError(f"The size of a byte range must be greater than 0, got {size}")
+    return f"bytes={offset}-{offset + size - 1}"
+
+
+def check_range_response(file_path, offset, size, content_range):
+    """
+    Check that the response to a ranged GET holds the requested range.
+
+    A server that doesn't support ranges ignores the Range header and returns the whole file with a 200 status and no
+    Content-Range, which is only the requested range if that range is the whole file.
+
+    :param content_range: The Content-Range of a 206 response, or None.
+    :raises ValueError: If the response holds the whole file instead of the requested range.
+    """
+    if not content_range and (offset or size is not None):
+        raise ValueError(f"{file_path} was returned whole instead of the requested range "
+                         f"{build_range_header(offset or 0, size)}")
+
+
+def load_json_stream(stream, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+    """
+    Parse a binary JSON stream chunk by chunk with JsonStreamReader, instead of reading all of it first.
+    """
+    reader = JsonStreamReader(stream, chunk_size)
+    value = reader.read_tree()
+    reader.expect_end()
+    return value
+
+
+def iter_stream_chunks(stream, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+    return iter(lambda: stream.read(chunk_size), b'')
+
+
 def parse_s3_uri(uri):
     parsed_uri = urlparse(uri)
     if not parsed_uri.netloc:
@@ -583,7 +2952,7 @@ def parse_s3_uri(uri):
     return bucket_name, object_key
 
 
-def build_transcribe_input(opts):
+def build_transcribe_input(opts, content_identity=None):
     media_file_uri = opts.media_file_uri
     file_name = os.path.basename(media_file_uri)
     file_name_without_extension, _file_name_ext = os.path.splitext(file_name)
@@ -599,7 +2968,8 @@ def build_transcribe_input(opts):
     if should_identify_language:
         source_language_code = None
 
-    transcription_job_name = determine_transcription_job_name(opts, file_name_without_extension)
+    transcription_job_name = determine_transcription_job_name(opts, file_name_without_extension,
+                                                              content_identity=content_identity)
 
     transcription_output_s3_uri = build_transcription_output_uri_with_file_name(
         opts,
@@ -636,51 +3006,384 @@ def build_run_input(opts):
     :return: The input to the state machine, in JSON format.
     """
 
-    transcribe_input = build_transcribe_input(opts)
+    content_identity = get_media_content_identity(opts)
+    transcribe_input = build_transcribe_input(opts, content_identity=content_identity)
     transcribe_output_s3_uri = build_transcribe_output_s3_uri_from_transcribe_input(transcribe_input)
 
-    translate_input = build_translate_input(opts, transcribe_output_s3_uri)
+    translate_input = build_translate_input(opts, transcribe_output_s3_uri, content_identity=content_identity,
+                                            transcription_job_name=transcribe_input['TranscriptionJobName'])
 
     sf_input = {
         "Transcribe": transcribe_input,
         "Translate": translate_input
     }
+    if content_identity is not None:
+        sf_input['ContentIdentity'] = content_identity
+        # An existing job with the same name, or the output of one that no longer exists, can only be reused when the
+        # name identifies the content
+        sf_input['ReuseTranscriptionOutput'] = getattr(opts, 'transcription_job_name', None) is None
     return sf_input
 
 
-def run_step_function(state_machine_arn, run_input):
+def get_media_content_identity(opts, s3_helper=None):
+    """
+    Get the identity of the media file's content: its S3 ETag, size and version id.
+
+    The identity is taken from the options when it is already known, e.g. from an S3 event, otherwise the media file is
+    read with a HEAD request. Dry runs send it too, so they print the job names and output paths of the real run.
+
+    :return: A dict with the etag, size and version_id, or None if content identities are disabled or the media file is
+             not an S3 object.
+    :raises BotoCoreError, ClientError: If the media file can't be read. Falling back to no identity would give the same
+                                        input a different job name depending on whether S3 answered.
+    """
+    if not getattr(opts, 'use_content_identity', DEFAULT_USE_CONTENT_IDENTITY):
+        return None
+
+    etag = getattr(opts, 'media_file_etag', None)
+    size = getattr(opts, 'media_file_size', None)
+    version_id = getattr(opts, 'media_file_version_id', None)
+    if etag is None:
+        media_file_uri = opts.media_file_uri
+        if not media_file_uri.startswith('s3://'):
+            return None
+        bucket_name, object_key = parse_s3_uri(media_file_uri)
+        try:
+            response = (s3_helper or S3Helper()).s3.head_object(Bucket=bucket_name, Key=object_key)
+        except (BotoCoreError, ClientError) as e:
+            logger.error("Couldn't read the content identity of %s, use --skip-content-identity to submit it without "
+                         "one: %s", media_file_uri, e)
+            raise
+        etag = response.get('ETag')
+        size = response.get('ContentLength')
+        version_id = response.get('VersionId')
+
+    return {"etag": etag.strip('"'), "size": size, "version_id": version_id}
+
+
+def build_content_key(content_identity, options):
+    """
+    Hash the identity of a media file's content together with the options of the work done on it.
+
+    Version ids are left out, so uploading the same bytes again doesn't change the key.
+    """
+    key_data = {"etag": content_identity['etag'], "size": content_identity.get('size'), "options": options}
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def run_step_function(state_machine_arn, run_input, stepfunctions_client=None):
     logger.debug('Running state machine: %s %s', state_machine_arn, run_input)
     run_input_json: str = json.dumps(run_input)
-    execution_arn = StateMachine(state_machine_arn=state_machine_arn).start(run_input_json)
+    execution_arn = StateMachine(stepfunctions_client=stepfunctions_client,
+                                 state_machine_arn=state_machine_arn).start(run_input_json)
     return execution_arn
 
 
-def wait_for_state_machine_to_finish(execution_arn, sleep_time=60):
-    client = boto3.client('stepfunctions')
+class RateLimiter:
+    """
+    A thread safe token bucket that limits how many times per second an action can be performed.
+    """
 
-    while True:
-        response = client.describe_execution(
-            executionArn=execution_arn
-        )
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, rate or 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+
+def compute_backoff_delay(attempt, base_delay=0.5, max_delay=30):
+    """
+    Exponential backoff with full jitter.
 
-        status = response['status']
-        if status in ['SUCCEEDED', 'FAILED', 'TIMED_OUT', 'ABORTED']:
-            break
+    :param attempt: The number of attempts that have already failed, starting at 0.
+    :param base_delay: The delay, in seconds, of the first retry.
+    :param max_delay: The maximum delay, in seconds.
+    :return: The number of seconds to wait before the next attempt.
+    """
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def is_throttling_error(error):
+    return isinstance(error, ClientError) and error.response['Error']['Code'] in THROTTLING_ERROR_CODES
+
+
+@functools.lru_cache(maxsize=None)
+def get_batch_manifest_option_actions():
+    """
+    Get the argparse actions of the options a manifest row can override, by destination name.
+    """
+    parser = EnvoiTranscribeTranslateCreateBatchCommand.init_parser()
+    return {action.dest: action for action in parser._actions}
+
+
+def parse_batch_manifest_csv_value(key, value):
+    """
+    Convert a CSV manifest value to the type of the command line option it overrides.
+
+    :raises ValueError: If the value can't be converted.
+    """
+    action = get_batch_manifest_option_actions().get(key)
+    value_type = action.type if action is not None and action.type is not None else str
+    try:
+        if key == 'subtitle_formats' or (action is not None and action.nargs in ('*', '+')):
+            return [value_type(item) for item in value.replace(',', ' ').split()]
+        if value.lower() in ('true', 'false'):
+            return value.lower() == 'true'
+        return value_type(value)
+    except ValueError:
+        raise ValueError(f"Invalid value for {key} in the batch manifest: {value!r}") from None
+
+
+def read_batch_manifest(file_path):
+    """
+    Read the rows of a batch manifest one at a time.
+
+    JSONL manifests contain one JSON object per line. CSV manifests must have a header row; list values, such as
+    translation_language_codes, are separated by spaces or commas. Every row must have a media_file_uri, all other
+    keys override the command line options for that row.
+
+    :param file_path: The path of the manifest file.
+    :return: A generator of (row number, row) tuples.
+    """
+    with open(file_path, newline='') as f:
+        if file_path.lower().endswith('.csv'):
+            rows = ({key: parse_batch_manifest_csv_value(key, value)
+                     for key, value in row.items() if value not in (None, '')}
+                    for row in csv.DictReader(f))
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+
+        for row_number, row in enumerate(rows, start=1):
+            if not row.get('media_file_uri'):
+                raise ValueError(f"Row {row_number} of {file_path} is missing a media_file_uri.")
+            yield row_number, row
+
+
+def build_batch_row_key(row_options):
+    """
+    Hash the options a row is submitted with, i.e. the command line options overridden by the row, so that a row that
+    is run again with other languages, outputs or modes isn't skipped as already submitted.
+    """
+    key_options = {key: value for key, value in row_options.items() if key not in BATCH_CONTROL_OPTION_NAMES}
+    return hashlib.sha256(json.dumps(key_options, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def read_batch_journal(file_path):
+    """
+    Read the keys of the rows that were successfully submitted from a batch journal.
+
+    :param file_path: The path of the journal file.
+    :return: A set of row keys.
+    """
+    completed_row_keys = set()
+    if not os.path.exists(file_path):
+        return completed_row_keys
+
+    with open(file_path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line may be incomplete if a previous run was interrupted while writing it
+                continue
+            if result.get('success'):
+                completed_row_keys.add(result['row_key'])
+    return completed_row_keys
+
+
+def submit_batch_row(row_number, row_key, opts, rate_limiter, max_retries=DEFAULT_BATCH_MAX_RETRIES):
+    result = {"row": row_number, "row_key": row_key, "media_file_uri": opts.media_file_uri}
+    try:
+        run_input = build_run_input(opts)
+        attempt = 0
+        while True:
+            rate_limiter.acquire()
+            try:
+                execution_arn = run_step_function(opts.state_machine_arn, run_input)
+                break
+            except ClientError as e:
+                if not is_throttling_error(e) or attempt >= max_retries:
+                    raise e
+                time.sleep(compute_backoff_delay(attempt))
+                attempt += 1
+    except Exception as e:
+        return {**result, "success": False, "error": f"{e.__class__.__name__}: {e}"}
+
+    return {**result, "success": True, "execution_arn": execution_arn}
+
+
+def read_execution_arns_file(file_path):
+    """
+    Read execution ARNs from a file with one ARN per line. Lines that are JSON objects, like the lines of a create-batch
+    journal, are also accepted and their execution_arn is used.
+    """
+    with open(file_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                execution_arn = json.loads(line).get('execution_arn')
+                if execution_arn:
+                    yield execution_arn
+            else:
+                yield line
+
+
+def wait_for_state_machine_to_finish(execution_arn, sleep_time=DEFAULT_WATCH_MAX_INTERVAL):
+    watcher = ExecutionWatcher([execution_arn], max_interval=sleep_time)
+    for description in watcher.watch():
+        return description['status']
+
+
+class TranslationLanguageCatalog:
+    """
+    The languages supported by AWS Translate.
+
+    The catalog is loaded from the bundled aws-translate-language-codes.csv file or from an on-disk cached copy of the
+    ListLanguages response, so looking up languages doesn't require any network calls.
+    """
+
+    def __init__(self, languages):
+        """
+        :param languages: A dict of language codes to language names.
+        """
+        self.languages = dict(languages)
+        self.language_codes = frozenset(self.languages)
 
-        time.sleep(sleep_time)
+    def __contains__(self, language_code):
+        return language_code in self.language_codes
 
-    return status
+    def __len__(self):
+        return len(self.language_codes)
+
+    def get_language_name(self, language_code):
+        return self.languages.get(language_code)
+
+    def get_target_language_codes(self, exclude=None):
+        exclude = set(exclude or [])
+        exclude.add('auto')
+        return [language_code for language_code in self.languages if language_code not in exclude]
+
+    def get_unsupported_language_codes(self, language_codes):
+        return [language_code for language_code in language_codes if language_code not in self.language_codes]
+
+    @classmethod
+    def from_csv(cls, file_path=DEFAULT_TRANSLATION_LANGUAGE_CODES_FILE_PATH):
+        with open(file_path, newline='') as f:
+            return cls({row['LanguageCode']: row['LanguageName'] for row in csv.DictReader(f)})
+
+    @classmethod
+    def from_list_languages(cls, client=None):
+        if client is None:
+            client = get_aws_client('translate')
+
+        languages = {}
+        list_languages_args = {"MaxResults": 500}
+        while True:
+            response = client.list_languages(**list_languages_args)
+            for language in response['Languages']:
+                languages[language['LanguageCode']] = language['LanguageName']
+            next_token = response.get('NextToken')
+            if not next_token:
+                break
+            list_languages_args['NextToken'] = next_token
+        return cls(languages)
+
+    @classmethod
+    def from_cache_file(cls, file_path):
+        with open(file_path) as f:
+            return cls(json.load(f))
+
+    def write_cache_file(self, file_path):
+        # Write to a temporary file first so concurrent readers never see a partially written file
+        temp_file_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_file_path, 'w') as f:
+            json.dump(self.languages, f)
+        os.replace(temp_file_path, file_path)
+
+    @classmethod
+    def load(cls, cache_file_path=None, refresh_interval=DEFAULT_TRANSLATION_LANGUAGE_CATALOG_REFRESH_INTERVAL,
+             csv_file_path=DEFAULT_TRANSLATION_LANGUAGE_CODES_FILE_PATH):
+        """
+        Load the catalog.
+
+        If a cache file path is given then the cached copy is used until it is older than the refresh interval, at
+        which point it is refreshed by calling ListLanguages. Otherwise the bundled CSV file is used, falling back to
+        ListLanguages if the CSV file isn't available.
+
+        :param cache_file_path: The path of the on-disk copy of the ListLanguages response.
+        :param refresh_interval: The number of seconds after which the cached copy is refreshed.
+        :param csv_file_path: The path of the bundled language codes CSV file.
+        :return: The catalog.
+        """
+        if cache_file_path is not None:
+            cache_file_exists = os.path.exists(cache_file_path)
+            if cache_file_exists and time.time() - os.path.getmtime(cache_file_path) < refresh_interval:
+                return cls.from_cache_file(cache_file_path)
+
+            try:
+                catalog = cls.from_list_languages()
+            except ClientError as e:
+                logger.warning("Failed to refresh the translation language catalog: %s", e)
+                if cache_file_exists:
+                    return cls.from_cache_file(cache_file_path)
+            else:
+                catalog.write_cache_file(cache_file_path)
+                return catalog
+
+        if os.path.exists(csv_file_path):
+            return cls.from_csv(csv_file_path)
+
+        return cls.from_list_languages()
+
+
+translation_language_catalog = None
+translation_language_catalog_lock = threading.Lock()
+
+
+def get_translation_language_catalog():
+    """
+    Get the translation language catalog, loading it on first use.
+
+    Set the TRANSLATION_LANGUAGE_CATALOG_CACHE_FILE_PATH environment variable to use an on-disk cached copy of the
+    ListLanguages response instead of the bundled CSV file.
+    """
+    global translation_language_catalog
+    with translation_language_catalog_lock:
+        if translation_language_catalog is None:
+            refresh_interval = float(os.environ.get('TRANSLATION_LANGUAGE_CATALOG_REFRESH_INTERVAL',
+                                                    DEFAULT_TRANSLATION_LANGUAGE_CATALOG_REFRESH_INTERVAL))
+            translation_language_catalog = TranslationLanguageCatalog.load(
+                cache_file_path=os.environ.get('TRANSLATION_LANGUAGE_CATALOG_CACHE_FILE_PATH'),
+                refresh_interval=refresh_interval)
+        return translation_language_catalog
 
 
 def get_translation_language_codes(filter_values=None):
-    if filter_values is None:
-        filter_values = []
-    filter_values.append('auto')
+    return get_translation_language_catalog().get_target_language_codes(exclude=filter_values)
 
-    client = boto3.client('translate')
-    response = client.list_languages(MaxResults=500)
-    return [language['LanguageCode']
-            for language in response['Languages'] if language['LanguageCode'] not in filter_values]
+
+def validate_translation_language_codes(language_codes):
+    unsupported_language_codes = get_translation_language_catalog().get_unsupported_language_codes(language_codes)
+    if unsupported_language_codes:
+        raise ValueError(f"Unsupported translation language codes: {', '.join(unsupported_language_codes)}")
 
 
 def parse_command_line(cli_args, env_vars, sub_commands=None):
@@ -697,50 +3400,155 @@ def parse_command_line(cli_args, env_vars, sub_commands=None):
         sub_parsers = parser.add_subparsers(dest='command')
         sub_parsers.required = True
 
+        # Only the parser of the chosen sub command is built, all of them are needed to print the usage
+        sub_command_name = find_sub_command_name(cli_args, sub_commands)
+        if sub_command_name is not None:
+            sub_commands = {sub_command_name: sub_commands[sub_command_name]}
+
         for sub_command_name, sub_command_handler in sub_commands.items():
             sub_command_parser = sub_command_handler.init_parser(sub_parsers, command_name=sub_command_name)
             sub_command_parser.required = True
             sub_command_parsers[sub_command_name] = sub_command_parser
 
     (opts, args) = parser.parse_known_args(cli_args)
+    validate_opts = getattr(getattr(opts, 'handler', None), 'validate_opts', None)
+    if validate_opts is not None:
+        error = validate_opts(opts)
+        if error is not None:
+            sub_command_parsers[opts.command].error(error)
     return opts, args, env_vars, parser
 
 
+def find_sub_command_name(cli_args, sub_commands):
+    """
+    Find the sub command in the command line arguments, which is the first argument that isn't an option of the main
+    parser.
+
+    :return: The name of the sub command, or None if there is no known sub command.
+    """
+    cli_args = iter(cli_args)
+    for arg in cli_args:
+        if arg == '--log-level':
+            next(cli_args, None)
+        elif not arg.startswith('-'):
+            return arg if arg in sub_commands else None
+    return None
+
+
+class EventRecordsError(Exception):
+    """
+    Raised by lambda_handler when records of the event failed, so that Lambda retries the asynchronous invocation and
+    then sends the event to the function's dead-letter queue or on-failure destination.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        failed_records = [record for record in records if not record['success']]
+        super().__init__(f"{len(failed_records)} of {len(records)} event records failed: " +
+                         "; ".join(f"record {record['index']}: {record['error']}" for record in failed_records))
+
+
 def lambda_handler(event, _context):
+    """
+    :return: A report of the records of the event.
+    :raises EventRecordsError: If any record failed, after printing the report.
+    """
     print("Received event: " + json.dumps(event, indent=2))
 
-    event_record = event['Records'][0]
+    configure_metrics_logger()
+    event_records = event.get('Records', [])
+    max_workers = int(os.environ.get('MAX_WORKERS', DEFAULT_LAMBDA_MAX_WORKERS))
+    with profile_if_enabled():
+        records = handle_event_records(event_records, max_workers=max_workers)
+
+    report = {"success": all(record['success'] for record in records), "records": records}
+    if not report['success']:
+        # S3 invokes the function asynchronously, which ignores the returned value. Only an error is retried.
+        print("Event records failed: " + json.dumps(report, indent=2))
+        raise EventRecordsError(records)
+    return report
+
+
+def handle_event_records(event_records, max_workers=DEFAULT_LAMBDA_MAX_WORKERS):
+    """
+    Handle every record of an event concurrently using a bounded pool of worker threads.
+
+    :param event_records: The records of the event.
+    :param max_workers: The maximum number of records to handle at the same time.
+    :return: A list with a success/failure report for each record, in the same order as the records.
+    """
+    if not event_records:
+        return []
+
+    # Clients are thread safe, creating them up front means the workers share the same connection pools
+    config = None
+    config_error = None
+    stepfunctions_client = None
+    if any(event_record.get('eventSource') == 'aws:s3' for event_record in event_records):
+        try:
+            config = load_config()
+            if not config['input'].get('dry_run', False):
+                stepfunctions_client = get_aws_client('stepfunctions')
+        except Exception as e:
+            # Report every S3 record as failed instead of failing the whole event
+            logger.exception("Failed to load the config")
+            config_error = f"{e.__class__.__name__}: {e}"
+
+    def handle_record(index_and_event_record):
+        index, event_record = index_and_event_record
+        if config_error is not None and event_record.get('eventSource') == 'aws:s3':
+            return {"index": index, "success": False, "error": config_error}
+        try:
+            result = handle_event_record(event_record, config=config, stepfunctions_client=stepfunctions_client)
+        except Exception as e:
+            logger.exception("Failed to handle event record %s", index)
+            result = {"success": False, "error": f"{e.__class__.__name__}: {e}"}
+        return {"index": index, **result}
+
+    max_workers = max(1, min(max_workers, len(event_records)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(handle_record, enumerate(event_records)))
+
 
+def handle_event_record(event_record, config=None, stepfunctions_client=None):
     event_source = event_record['eventSource']
     match event_source:
         case 'aws:s3':
-            handle_s3_event_record(event_record)
+            return handle_s3_event_record(event_record, config=config, stepfunctions_client=stepfunctions_client)
         case _:
             raise NotImplementedError(f"Unsupported event source: {event_source}")
 
-    return {"success": True}
+
+def load_config():
+    config_file_uri = os.environ.get('CONFIG_FILE_URI')
+    if config_file_uri is None:
+        raise ValueError("CONFIG_FILE_URI environment variable must be set.")
+
+    config_cache_ttl = float(os.environ.get('CONFIG_CACHE_TTL', DEFAULT_CONFIG_CACHE_TTL))
+    config = config_cache.get(config_file_uri, ttl=config_cache_ttl)
+    if config is None:
+        raise ValueError(f"Error loading config from {config_file_uri}")
+
+    return config
 
 
-def handle_s3_event_record(event_record):
+def handle_s3_event_record(event_record, config=None, stepfunctions_client=None):
     """
     :param event_record: The event object containing information about the S3 event.
+    :param config: The configuration, it will be loaded from CONFIG_FILE_URI if not supplied.
+    :param stepfunctions_client: A Boto3 Step Functions client.
     :return: Object
 
     This method handles an S3 event triggered by a new file upload to the S3 bucket. It extracts relevant information
-    from the event and a configuration file, and then calls the appropriate command handler.
+    from the event and a configuration file, builds the run input and starts the state machine execution.
     """
 
     event_name = event_record['eventName']
     if event_name != 'ObjectCreated:Put':
         raise NotImplementedError(f"Unsupported S3 event: {event_name}")
 
-    config_file_uri = os.environ.get('CONFIG_FILE_URI')
-    if config_file_uri is None:
-        raise ValueError("CONFIG_FILE_URI environment variable must be set.")
-
-    config = StorageHelper.read_file_json(config_file_uri)
     if config is None:
-        raise ValueError(f"Error loading config from {config_file_uri}")
+        config = load_config()
 
     data_from_s3 = event_record['s3']
 
@@ -748,14 +3556,19 @@ def handle_s3_event_record(event_record):
     s3_object = data_from_s3['object']
 
     media_file_uri = f"s3://{s3_bucket['name']}/{s3_object['key']}"
-    config_input = config['input']
-    config_input['media_file_uri'] = media_file_uri
+    # Copy the input so that records handled at the same time don't overwrite each other's media file URI
+    config_input = {**config['input'], 'media_file_uri': media_file_uri}
+    if s3_object.get('eTag'):
+        config_input.update(media_file_etag=s3_object['eTag'], media_file_size=s3_object.get('size'),
+                            media_file_version_id=s3_object.get('versionId'))
     opts = SimpleNamespace(**config_input)
 
-    command_handler = EnvoiTranscribeTranslateCreateCommand(opts)
-    command_handler.run()
+    run_input = build_run_input(opts)
+    if getattr(opts, 'dry_run', False):
+        return {"success": True, "media_file_uri": media_file_uri, "run_input": run_input}
 
-    return {"success": True}
+    execution_arn = run_step_function(opts.state_machine_arn, run_input, stepfunctions_client=stepfunctions_client)
+    return {"success": True, "media_file_uri": media_file_uri, "execution_arn": execution_arn}
 
 
 def handle_cli_execution():
@@ -769,7 +3582,11 @@ def handle_cli_execution():
 
     sub_commands = {
         'create': EnvoiTranscribeTranslateCreateCommand,
+        'create-batch': EnvoiTranscribeTranslateCreateBatchCommand,
         'describe': EnvoiTranscribeTranslateDescribeCommand,
+        'plan': EnvoiTranscribeTranslatePlanCommand,
+        'run': EnvoiTranscribeTranslateRunCommand,
+        'watch': EnvoiTranscribeTranslateWatchCommand,
         # 'transcribe-translate': EnvoiTranscribeTranslateCommand,
     }
 
@@ -782,10 +3599,14 @@ def handle_cli_execution():
     logger.addHandler(ch)
 
     try:
+        # Spans go to stderr, the commands print their results to stdout
+        configure_metrics_logger(stream=sys.stderr)
+
         # If 'handler' is in args, run the correct handler
         if hasattr(opts, 'handler'):
             command_handler = opts.handler(opts)
-            command_handler.run()
+            with profile_if_enabled():
+                command_handler.run()
         else:
             parser.print_help()
             return 1
@@ -1,19 +1,246 @@
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import email.utils
 import http.client
 import json
 import logging
+import random
+import re
+import threading
+import time
 import urllib.parse
 
 logger = logging.getLogger(__name__)
+# The timing spans of requests are only logged when this logger is enabled, see configure_metrics_logger in
+# envoi_transcribe_translate
+metrics_logger = logging.getLogger('envoi.metrics')
+
+# Ids are replaced in the operation name of a span, so that requests to the same endpoint share the same operation
+ID_PATH_SEGMENT = re.compile(r'/[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}(?=/|$)')
+
+# Errors raised when a kept-alive connection was closed by the server while it was idle
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+
+class HttpConnectionPool:
+    """
+    A thread safe pool of keep-alive connections to a single host.
+
+    At most max_size connections are open at the same time, callers wait for a connection to be released when they are
+    all in use. Connections that have been idle for longer than idle_timeout are closed instead of being reused, and a
+    request that fails because the server closed a reused connection is retried on a new connection. A request that was
+    sent before the connection turned out to be closed is only retried if its method is idempotent, since the server
+    may have processed it.
+    """
+    DEFAULT_MAX_SIZE = 10
+    DEFAULT_IDLE_TIMEOUT = 60
+
+    def __init__(self, host, port=None, max_size=DEFAULT_MAX_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT, timeout=None,
+                 connection_class=http.client.HTTPSConnection):
+        self.host = host
+        self.port = port
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.connection_class = connection_class
+
+        self.idle_connections = collections.deque()
+        self.lock = threading.Lock()
+        self.semaphore = threading.BoundedSemaphore(max_size)
+
+    def new_connection(self):
+        if self.timeout is None:
+            return self.connection_class(self.host, self.port)
+        return self.connection_class(self.host, self.port, timeout=self.timeout)
+
+    def acquire(self):
+        """
+        Get a connection from the pool, waiting if all the connections are in use.
+
+        :return: A tuple of the connection and whether it is a reused connection.
+        """
+        self.semaphore.acquire()
+        now = time.monotonic()
+        with self.lock:
+            while self.idle_connections:
+                conn, released_at = self.idle_connections.pop()
+                if now - released_at < self.idle_timeout:
+                    return conn, True
+                conn.close()
+        return self.new_connection(), False
+
+    def release(self, conn, reusable=True):
+        if reusable:
+            with self.lock:
+                self.idle_connections.append((conn, time.monotonic()))
+        else:
+            conn.close()
+        self.semaphore.release()
+
+    def request(self, method, url, body=None, headers=None):
+        """
+        Send a request and read its response.
+
+        :return: A tuple of the response and the response body.
+        """
+        while True:
+            conn, is_reused = self.acquire()
+            is_sent = False
+            try:
+                conn.request(method, url, body=body, headers=headers or {})
+                is_sent = True
+                response = conn.getresponse()
+                response_body = response.read()
+            except STALE_CONNECTION_ERRORS:
+                self.release(conn, reusable=False)
+                if is_reused and (not is_sent or method in RetryPolicy.IDEMPOTENT_METHODS):
+                    logger.debug("Connection to %s was closed by the server, reconnecting", self.host)
+                    continue
+                raise
+            except BaseException:
+                self.release(conn, reusable=False)
+                raise
+
+            self.release(conn, reusable=not response.will_close)
+            return response, response_body
+
+    def close(self):
+        with self.lock:
+            while self.idle_connections:
+                conn, _released_at = self.idle_connections.pop()
+                conn.close()
+
+
+class IconikApiError(Exception):
+
+    def __init__(self, method, url, status, reason, body):
+        self.method = method
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.body = body
+        super().__init__(f"{method} {url} failed with {status} {reason}: {body}")
+
+
+class TokenBucket:
+    """
+    A thread safe token bucket shared by the clients that must stay under the same rate limit.
+
+    When the server responds that the rate limit was exceeded, pause() stops every client that shares the bucket from
+    sending requests until the server's Retry-After delay has passed. A rate of 0 doesn't limit the requests, which are
+    then only held back by pauses.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        :raises ValueError: If the rate is negative.
+        """
+        if rate < 0:
+            raise ValueError(f"The rate of a token bucket can't be negative, got {rate}")
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait_time = self.paused_until - now
+                elif not self.rate:
+                    return
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                    self.updated_at = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class RetryPolicy:
+    """
+    Decides which failed requests are retried and how long to wait before retrying them.
+
+    Requests are retried with exponential backoff and full jitter, unless the response has a Retry-After header, in
+    which case it is honored. GET requests are retried on rate limiting and on any server error. Other requests are
+    only retried when the server didn't process them: on rate limiting and when the service is unavailable.
+    """
+    DEFAULT_MAX_ATTEMPTS = 5
+    DEFAULT_BASE_DELAY = 0.5
+    DEFAULT_MAX_DELAY = 30
+    RETRYABLE_STATUSES = frozenset([429, 500, 502, 503, 504])
+    NON_IDEMPOTENT_RETRYABLE_STATUSES = frozenset([429, 503])
+    IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'])
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, method, status, attempt):
+        if attempt + 1 >= self.max_attempts:
+            return False
+        if method in self.IDEMPOTENT_METHODS:
+            return status in self.RETRYABLE_STATUSES
+        return status in self.NON_IDEMPOTENT_RETRYABLE_STATUSES
+
+    def get_delay(self, attempt, retry_after=None):
+        retry_after_seconds = parse_retry_after(retry_after)
+        if retry_after_seconds is not None:
+            return min(self.max_delay, retry_after_seconds)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+def parse_retry_after(retry_after):
+    """
+    Parse a Retry-After header, which is either a number of seconds or an HTTP date.
+
+    :return: The number of seconds to wait, or None if the header is missing or invalid.
+    """
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+# Iconik limits the number of requests per second of each user, so all the clients of a process share this bucket
+DEFAULT_RATE_LIMIT = 50
+default_rate_limiter = TokenBucket(DEFAULT_RATE_LIMIT)
 
 
 class IconikHttpClient:
     DEFAULT_BASE_URL = "https://apo.iconik.io/API"
 
-    def __init__(self, app_id, auth_token, base_url=DEFAULT_BASE_URL):
-        self.conn = None
+    def __init__(self, app_id, auth_token, base_url=DEFAULT_BASE_URL,
+                 max_connections=HttpConnectionPool.DEFAULT_MAX_SIZE,
+                 idle_timeout=HttpConnectionPool.DEFAULT_IDLE_TIMEOUT,
+                 retry_policy=None,
+                 rate_limiter=default_rate_limiter):
+        self.pool = None
         self.base_url = base_url
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter
 
         parsed_url = urllib.parse.urlparse(base_url)
+        self.scheme = parsed_url.scheme
         self.host = parsed_url.hostname
         self.host_port = parsed_url.port
         self.base_path = parsed_url.path
@@ -25,7 +252,11 @@ class IconikHttpClient:
         self.set_auth(app_id, auth_token)
 
     def init_connection(self):
-        self.conn = http.client.HTTPSConnection(self.host, self.host_port)
+        connection_class = http.client.HTTPConnection if self.scheme == 'http' else http.client.HTTPSConnection
+        self.pool = HttpConnectionPool(self.host, self.host_port,
+                                       max_size=self.max_connections,
+                                       idle_timeout=self.idle_timeout,
+                                       connection_class=connection_class)
 
     def set_auth(self, app_id, auth_token):
         self.default_headers['App-ID'] = app_id
@@ -54,10 +285,11 @@ class IconikHttpClient:
         return urllib.parse.urlencode(_query)
 
     @classmethod
-    def handle_response(cls, response):
-        response_body = response.read()
-        content_type, header_attribs_raw = response.getheader("Content-Type").split(";")
-        header_attribs = dict(map(lambda x: x.strip().split("="), header_attribs_raw.split(",")))
+    def handle_response(cls, response, response_body=None):
+        if response_body is None:
+            response_body = response.read()
+        content_type, _, header_attribs_raw = (response.getheader("Content-Type") or "").partition(";")
+        header_attribs = dict(x.strip().split("=", 1) for x in header_attribs_raw.split(",") if "=" in x)
         charset = header_attribs.get("charset", "utf-8")
         try:
             if content_type == 'text/plain:':
@@ -76,25 +308,163 @@ class IconikHttpClient:
         url += "?" + self.build_query_string(query=query)
         return url
 
+    def request(self, method, url, body=None, headers=None):
+        """
+        Send a request, retrying it according to the retry policy.
+
+        When the envoi.metrics logger is enabled, a timing span of the request, including its retries and the time spent
+        waiting for the rate limiter, is logged to it.
+
+        :raises IconikApiError: If the response is an error once the retries are exhausted.
+        """
+        if not metrics_logger.isEnabledFor(logging.INFO):
+            return self.send_request(method, url, body=body, headers=headers)
+
+        span = {"started_at": time.perf_counter(), "status": None, "retries": 0, "bytes_received": None}
+        error = None
+        try:
+            return self.send_request(method, url, body=body, headers=headers, span=span)
+        except Exception as e:
+            error = e.__class__.__name__
+            raise
+        finally:
+            latency = time.perf_counter() - span['started_at']
+            operation = self.__class__.build_operation_name(method, url)
+            span_data = {
+                "service": "iconik",
+                "operation": operation,
+                "latency_ms": round(latency * 1000, 3),
+                "status": span['status'],
+                "bytes_sent": len(body) if body is not None else 0,
+                "bytes_received": span['bytes_received'],
+                "retries": span['retries'],
+                "error": error
+            }
+            metrics_logger.info("iconik %s took %.1f ms", operation, latency * 1000,
+                                extra={"span": {key: value for key, value in span_data.items() if value is not None}})
+
+    def send_request(self, method, url, body=None, headers=None, span=None):
+        """
+        Send a request, retrying it according to the retry policy.
+
+        :param span: A dict in which the status, number of retries and size of the last response are recorded.
+        :raises IconikApiError: If the response is an error once the retries are exhausted.
+        """
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            response, response_body = self.pool.request(method, url, body=body, headers=headers)
+            if span is not None:
+                span.update(status=response.status, retries=attempt, bytes_received=len(response_body))
+            if response.status < 400:
+                return self.__class__.handle_response(response, response_body)
+
+            if not self.retry_policy.should_retry(method, response.status, attempt):
+                raise IconikApiError(method, url, response.status, response.reason,
+                                     self.__class__.handle_response(response, response_body))
+
+            delay = self.retry_policy.get_delay(attempt, response.getheader("Retry-After"))
+            logger.debug("%s %s failed with %s, retrying in %.2f seconds", method, url, response.status, delay)
+            if response.status == 429 and self.rate_limiter is not None:
+                self.rate_limiter.pause(delay)
+            else:
+                time.sleep(delay)
+            attempt += 1
+
+    @classmethod
+    def build_operation_name(cls, method, url):
+        """
+        Name a request by its method and path, with the ids in the path replaced by {id}.
+        """
+        path = re.sub(r'/{2,}', '/', urllib.parse.urlsplit(url).path)
+        return f"{method} {ID_PATH_SEGMENT.sub('/{id}', path)}"
+
+    def get_url(self, url, headers=None, default_headers=None):
+        """
+        GET a URL returned by the API, such as the next_url of a page.
+        """
+        parsed_url = urllib.parse.urlparse(url)
+        path = parsed_url.path
+        if not path.startswith(self.base_path):
+            path = self.base_path + "/" + path.lstrip("/")
+        query = dict(urllib.parse.parse_qsl(parsed_url.query))
+        url = path + "?" + self.build_query_string(query=query)
+        return self.request("GET", url, headers=self.build_headers(headers=headers, default_headers=default_headers))
+
+    def get_next_page_url(self, endpoint, query, page):
+        """
+        Get the URL of the page that follows the given page, using its next_url or its page number.
+
+        :return: The URL, or None if this is the last page.
+        """
+        if not isinstance(page, dict) or not page.get('objects'):
+            return None
+        if page.get('next_url'):
+            return page['next_url']
+        page_number = page.get('page')
+        if page_number is not None and page_number < page.get('pages', 0):
+            return self.build_url(self.base_path, endpoint, query={**(query or {}), "page": page_number + 1})
+        return None
+
+    def iter_pages(self, endpoint, query=None, read_ahead=False):
+        """
+        Fetch the pages of a list endpoint lazily.
+
+        :param endpoint: The endpoint of the list.
+        :param query: The query of the first page.
+        :param read_ahead: Fetch the next page on a background thread while the current page is being processed.
+        :return: A generator of pages.
+        """
+        executor = ThreadPoolExecutor(max_workers=1) if read_ahead else None
+        try:
+            page = self.get(endpoint, query=query)
+            while True:
+                next_page_url = self.get_next_page_url(endpoint, query, page)
+                next_page_future = None
+                if next_page_url is not None and executor is not None:
+                    next_page_future = executor.submit(self.get_url, next_page_url)
+
+                yield page
+
+                if next_page_url is None:
+                    return
+                page = next_page_future.result() if next_page_future is not None else self.get_url(next_page_url)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def iter_objects(self, endpoint, query=None, read_ahead=False):
+        """
+        Fetch the objects of a list endpoint lazily, one page at a time.
+
+        :return: A generator of objects.
+        """
+        for page in self.iter_pages(endpoint, query=query, read_ahead=read_ahead):
+            yield from (page or {}).get('objects', [])
+
     def get(self, endpoint, query=None, headers=None, default_headers=None):
         url = self.build_url(self.base_path, endpoint, query=query)
-        self.conn.request("GET", url, headers=self.build_headers(headers=headers, default_headers=default_headers))
-        response = self.conn.getresponse()
-        return self.__class__.handle_response(response)
+        return self.request("GET", url, headers=self.build_headers(headers=headers, default_headers=default_headers))
 
     def post(self, endpoint, data, query=None, headers=None, default_headers=None):
         url = self.build_url(self.base_path, endpoint, query=query)
-        self.conn.request("POST", url, body=json.dumps(data),
-                          headers=self.build_headers(headers=headers, default_headers=default_headers))
-        response = self.conn.getresponse()
-        return self.__class__.handle_response(response)
+        return self.request("POST", url, body=json.dumps(data).encode('utf-8'),
+                            headers=self.build_headers(headers=headers, default_headers=default_headers))
+
+    def patch(self, endpoint, data, query=None, headers=None, default_headers=None):
+        url = self.build_url(self.base_path, endpoint, query=query)
+        return self.request("PATCH", url, body=json.dumps(data).encode('utf-8'),
+                            headers=self.build_headers(headers=headers, default_headers=default_headers))
 
 
 class IconikApiClient(IconikHttpClient):
-    def __init__(self, app_id, auth_token, base_url=IconikHttpClient.DEFAULT_BASE_URL):
-        super().__init__(app_id, auth_token, base_url)
+    DEFAULT_PER_PAGE = 100
+
+    def __init__(self, app_id, auth_token, base_url=IconikHttpClient.DEFAULT_BASE_URL, **kwargs):
+        super().__init__(app_id, auth_token, base_url, **kwargs)
 
-    def create_format(self, asset_id, user_id, name, metadata, storage_methods):
+    def create_format(self, asset_id, user_id=None, name=None, metadata=None, storage_methods=None):
         endpoint = f"/files/v1/assets/{asset_id}/formats/"
         data = {
             "user_id": user_id,
@@ -102,6 +472,9 @@ class IconikApiClient(IconikHttpClient):
             "metadata": metadata,
             "storage_methods": storage_methods
         }
+        if user_id is None:
+            # Iconik uses the user of the auth token
+            del data["user_id"]
         return self.post(endpoint, data)
 
     def create_file_set(self, asset_id, format_id, storage_id, base_dir, name, component_ids):
@@ -158,6 +531,33 @@ class IconikApiClient(IconikHttpClient):
         }
         return self.get(endpoint, query=query)
 
+    def iter_asset_files(self, asset_id, per_page=DEFAULT_PER_PAGE, read_ahead=False):
+        endpoint = f"/files/v1/assets/{asset_id}/files/"
+        return self.iter_objects(endpoint, query={"per_page": per_page}, read_ahead=read_ahead)
+
+    def iter_asset_formats(self, asset_id, per_page=DEFAULT_PER_PAGE, read_ahead=False):
+        endpoint = f"/files/v1/assets/{asset_id}/formats/"
+        return self.iter_objects(endpoint, query={"per_page": per_page}, read_ahead=read_ahead)
+
+    def iter_asset_file_sets(self, asset_id, per_page=DEFAULT_PER_PAGE, read_ahead=False):
+        endpoint = f"/files/v1/assets/{asset_id}/file_sets/"
+        return self.iter_objects(endpoint, query={"per_page": per_page}, read_ahead=read_ahead)
+
+    def iter_asset_proxies(self, asset_id, per_page=DEFAULT_PER_PAGE, content_disposition=None,
+                           generate_signed_url=False, read_ahead=False):
+        endpoint = f"/files/v1/assets/{asset_id}/proxies/"
+        query = {
+            "per_page": per_page,
+            "generate_signed_url": generate_signed_url
+        }
+        if content_disposition is not None:
+            query["content_disposition"] = content_disposition
+        return self.iter_objects(endpoint, query=query, read_ahead=read_ahead)
+
+    def iter_storages(self, per_page=DEFAULT_PER_PAGE, read_ahead=False):
+        endpoint = f"/files/v1/storages/"
+        return self.iter_objects(endpoint, query={"per_page": per_page}, read_ahead=read_ahead)
+
     def get_multipart_upload_presigned_url(self, asset_id, file_id):
         endpoint = f"/files/v1/assets/{asset_id}/files/{file_id}/multipart_url/"
         return self.get(endpoint)
@@ -170,6 +570,18 @@ class IconikApiClient(IconikHttpClient):
         }
         return self.get(endpoint, query=query)
 
+    def complete_multipart_upload(self, asset_id, file_id, upload_id, parts):
+        endpoint = f"/files/v1/assets/{asset_id}/files/{file_id}/multipart_url/complete/"
+        data = {
+            "upload_id": upload_id,
+            "parts": parts
+        }
+        return self.post(endpoint, data)
+
+    def update_file(self, asset_id, file_id, data):
+        endpoint = f"/files/v1/assets/{asset_id}/files/{file_id}/"
+        return self.patch(endpoint, data)
+
     def get_storage(self, storage_id):
         endpoint = f"/files/v1/storages/{storage_id}/"
         return self.get(endpoint)
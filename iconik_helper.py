@@ -1,9 +1,266 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import math
 import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
 
-from iconik_api_client import IconikApiClient
+from iconik_api_client import IconikApiClient, IconikApiError
+
+logger = logging.getLogger(__name__)
+
+
+class IconikStorageCache:
+    """
+    Storages indexed by id, shared by the helpers of a process so they survive warm Lambda invocations.
+
+    All the storages are listed when the cache is first used and again once the TTL has expired. A storage that isn't
+    in the cache is fetched on its own. The storages can also be written to and read from an on-disk snapshot, which
+    is used instead of listing the storages as long as it is younger than the TTL.
+
+    No lock is held while a storage is fetched. The refresh lock only makes sure that one thread lists the storages at
+    a time: while it does, the other threads keep using the expired storages, or wait for it if there are none yet.
+    """
+    DEFAULT_TTL = 300
+
+    def __init__(self, client, ttl=DEFAULT_TTL, snapshot_file_path=None):
+        self.client = client
+        self.ttl = ttl
+        self.snapshot_file_path = snapshot_file_path
+        self.storages = {}
+        self.loaded_at = None
+        self.refresh_lock = threading.Lock()
+
+    def is_expired(self):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at >= self.ttl
+
+    def load_snapshot(self):
+        if self.snapshot_file_path is None or not os.path.exists(self.snapshot_file_path):
+            return False
+        snapshot_age = time.time() - os.path.getmtime(self.snapshot_file_path)
+        if snapshot_age >= self.ttl:
+            return False
+        with open(self.snapshot_file_path) as f:
+            self.storages = json.load(f)
+        self.loaded_at = time.monotonic() - snapshot_age
+        return True
+
+    def write_snapshot(self):
+        temp_file_path = f"{self.snapshot_file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_file_path, 'w') as f:
+            json.dump(self.storages, f)
+        os.replace(temp_file_path, self.snapshot_file_path)
+
+    def refresh(self):
+        with self.refresh_lock:
+            self._refresh()
+
+    def _refresh(self):
+        self.storages = {storage['id']: storage for storage in self.client.iter_storages()}
+        self.loaded_at = time.monotonic()
+        if self.snapshot_file_path is not None:
+            self.write_snapshot()
+
+    def refresh_if_expired(self):
+        if not self.is_expired():
+            return
+        if not self.refresh_lock.acquire(blocking=not self.storages):
+            # Another thread is listing the storages, use the expired ones meanwhile
+            return
+        try:
+            if self.is_expired() and not self.load_snapshot():
+                self._refresh()
+        finally:
+            self.refresh_lock.release()
+
+    def get(self, storage_id, default=None):
+        self.refresh_if_expired()
+        storages = self.storages
+        storage = storages.get(storage_id)
+        if storage is None and storage_id is not None:
+            try:
+                storage = self.client.get_storage(storage_id)
+            except IconikApiError as e:
+                if e.status != 404:
+                    raise
+            if storage:
+                storages[storage_id] = storage
+        return storage if storage else default
+
+    def __getitem__(self, storage_id):
+        storage = self.get(storage_id)
+        if storage is None:
+            raise KeyError(storage_id)
+        return storage
+
+
+storage_caches = {}
+storage_caches_lock = threading.Lock()
+
+
+class LocalFileSource:
+    """
+    A local file read in parts by IconikMultipartUploader.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.size = os.path.getsize(file_path)
+
+    def read(self, offset, size):
+        with open(self.file_path, 'rb') as f:
+            f.seek(offset)
+            return f.read(size)
+
+
+class IconikMultipartPartUrls:
+    """
+    The presigned URLs of the parts of a multipart upload.
+
+    Iconik returns the URLs of the parts numbered from 1 to parts_num with one request, so the URLs of every part are
+    fetched at once. The URLs expire together, so when a part's URL is rejected all the URLs are fetched again, once,
+    and the other parts whose URLs were rejected use the new ones.
+    """
+
+    def __init__(self, client, asset_id, file_id, upload_id, part_count):
+        self.client = client
+        self.asset_id = asset_id
+        self.file_id = file_id
+        self.upload_id = upload_id
+        self.part_count = part_count
+        self.urls = {}
+        self.lock = threading.Lock()
+
+    def fetch(self):
+        response = self.client.get_multipart_part_upload_presigned_url(self.asset_id, self.file_id, self.upload_id,
+                                                                        self.part_count)
+        urls = {part['number']: part['url'] for part in response.get('objects') or []}
+        missing_part_numbers = [part_number for part_number in range(1, self.part_count + 1)
+                                if part_number not in urls]
+        if missing_part_numbers:
+            raise ValueError(f"The multipart upload response doesn't have the URLs of parts {missing_part_numbers}.")
+        self.urls = urls
+
+    def get(self, part_number):
+        with self.lock:
+            if not self.urls:
+                self.fetch()
+            return self.urls[part_number]
+
+    def refresh(self, part_number, rejected_url):
+        """
+        Get a new URL for a part whose URL was rejected, fetching the URLs again unless another part already did.
+        """
+        with self.lock:
+            if self.urls.get(part_number) == rejected_url:
+                self.fetch()
+            return self.urls[part_number]
+
+
+class IconikMultipartUploader:
+    """
+    Uploads the contents of a file to Iconik in parts, using the presigned part URLs of a multipart upload.
+
+    The source is any object with a size and a read(offset, size) method. Each part is read by the worker that uploads
+    it, so no more than max_workers parts are held in memory at once. The part URLs are fetched with one request. A
+    part that fails with a server or connection error is retried on its own, and one that is rejected with a 403 is
+    retried with a new URL. Once every part is uploaded, the upload is completed with the parts' ETags and the file is
+    closed.
+    """
+    DEFAULT_PART_SIZE = 8 * 1024 * 1024
+    MIN_PART_SIZE = 5 * 1024 * 1024
+    MAX_PARTS = 10000
+    DEFAULT_MAX_WORKERS = 4
+    DEFAULT_MAX_PART_ATTEMPTS = 5
+
+    def __init__(self, client, part_size=DEFAULT_PART_SIZE, max_workers=DEFAULT_MAX_WORKERS,
+                 max_part_attempts=DEFAULT_MAX_PART_ATTEMPTS):
+        self.client = client
+        self.part_size = max(part_size, self.MIN_PART_SIZE)
+        self.max_workers = max_workers
+        self.max_part_attempts = max_part_attempts
+
+    def get_part_size(self, size):
+        return max(self.part_size, math.ceil(size / self.MAX_PARTS))
+
+    @classmethod
+    def get_upload_id(cls, multipart_upload):
+        upload_id = multipart_upload.get('upload_id')
+        if upload_id is None and multipart_upload.get('url'):
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(multipart_upload['url']).query)
+            upload_id = query.get('uploadId', [None])[0]
+        if upload_id is None:
+            raise ValueError("The multipart upload response doesn't have an upload id.")
+        return upload_id
+
+    @classmethod
+    def is_retryable_error(cls, error):
+        if isinstance(error, urllib.error.HTTPError):
+            return error.code >= 500 or error.code == 403
+        return isinstance(error, (urllib.error.URLError, ConnectionError, TimeoutError))
+
+    def upload_part(self, source, part_number, part_urls, part_size):
+        offset = (part_number - 1) * part_size
+        data = source.read(offset, min(part_size, source.size - offset))
+        part_url = part_urls.get(part_number)
+
+        attempt = 0
+        while True:
+            try:
+                with urllib.request.urlopen(urllib.request.Request(part_url, data=data, method='PUT')) as response:
+                    return {"part_number": part_number, "etag": response.headers.get('ETag')}
+            except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+                attempt += 1
+                if not self.is_retryable_error(e) or attempt >= self.max_part_attempts:
+                    raise
+                logger.debug("Upload of part %s failed, retrying: %s", part_number, e)
+                if isinstance(e, urllib.error.HTTPError) and e.code == 403:
+                    # The presigned URL has probably expired
+                    part_url = part_urls.refresh(part_number, part_url)
+                time.sleep(random.uniform(0, min(30, 0.5 * (2 ** attempt))))
+
+    def upload(self, asset_id, file_id, source):
+        """
+        Upload the source to the file of an asset, complete the upload and close the file.
+
+        :return: The list of uploaded parts, with their part_number and etag.
+        """
+        part_size = self.get_part_size(source.size)
+        part_count = max(1, math.ceil(source.size / part_size))
+        upload_id = self.get_upload_id(self.client.get_multipart_upload_presigned_url(asset_id, file_id))
+        part_urls = IconikMultipartPartUrls(self.client, asset_id, file_id, upload_id, part_count)
+        part_urls.fetch()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            parts = list(executor.map(lambda part_number: self.upload_part(source, part_number, part_urls, part_size),
+                                      range(1, part_count + 1)))
+
+        self.client.complete_multipart_upload(asset_id, file_id, upload_id, parts)
+        self.client.update_file(asset_id, file_id, {"status": "CLOSED", "size": source.size})
+        return parts
 
 
 class IconikHelper(IconikApiClient):
+    DEFAULT_MAX_WORKERS = 8
+
+    def get_storage_cache(self, ttl=IconikStorageCache.DEFAULT_TTL, snapshot_file_path=None):
+        """
+        Get the storage cache shared by every helper of the process that uses the same base URL and credentials, and
+        asks for the same TTL and snapshot file.
+        """
+        cache_key = (self.base_url, self.default_headers.get('App-ID'), self.default_headers.get('Auth-Token'),
+                     ttl, snapshot_file_path)
+        with storage_caches_lock:
+            storage_cache = storage_caches.get(cache_key)
+            if storage_cache is None:
+                storage_cache = IconikStorageCache(self, ttl=ttl, snapshot_file_path=snapshot_file_path)
+                storage_caches[cache_key] = storage_cache
+            return storage_cache
 
     def add_file_to_asset(self, asset_id, path_on_storage, storage_id, file_type, file_size=0, component_ids=None,
                           format_name='ORIGINAL', format_metadata=None):
@@ -71,9 +328,151 @@ class IconikHelper(IconikApiClient):
 
         return {"file_id": file_id, "format_id": format_id, "file_set_id": file_set_id}
 
+    @classmethod
+    def build_subtitle_format_metadata(cls, language, is_closed_captions=False):
+        return [{"subtitle_language": language, "subtitle_closed_captions": str(is_closed_captions).lower()}]
+
+    @classmethod
+    def get_subtitle_format_key(cls, asset_format):
+        """
+        Get the (language, closed captions) key of a SUBTITLES format, or None if it isn't a usable subtitles format.
+        """
+        if asset_format.get('name') != 'SUBTITLES' or asset_format.get('status') == 'DELETED':
+            return None
+        for metadata in asset_format.get('metadata') or []:
+            if 'subtitle_language' in metadata:
+                return (metadata['subtitle_language'],
+                        str(metadata.get('subtitle_closed_captions', 'false')).lower())
+        return None
+
+    def add_subtitle_files_to_asset(self, asset_id, subtitle_files, storage_id, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        Register many subtitle files on an asset.
+
+        The asset's formats, file sets and files are listed once. A SUBTITLES format is reused for each
+        (language, closed captions) pair and file sets and files that are already registered are not created again, so
+        running this again with the same files doesn't create duplicates. The missing formats, file sets and files are
+        then created concurrently, in three waves.
+
+        :param asset_id: The id of the asset.
+        :param subtitle_files: A list of dicts with a path_on_storage, a language and optionally is_closed_captions and
+                               file_size.
+        :param storage_id: The id of the storage where the subtitle files are stored.
+        :param max_workers: The maximum number of requests to send at the same time.
+        :return: A list with the file_id, format_id and file_set_id of each subtitle file, in the same order.
+        """
+        formats_by_key = {}
+        for asset_format in self.iter_asset_formats(asset_id):
+            format_key = self.get_subtitle_format_key(asset_format)
+            if format_key is not None:
+                formats_by_key.setdefault(format_key, asset_format['id'])
+
+        file_sets_by_key = {}
+        for file_set in self.iter_asset_file_sets(asset_id):
+            if file_set.get('status') == 'DELETED':
+                continue
+            file_set_key = (file_set.get('format_id'), file_set.get('storage_id'), file_set.get('base_dir'),
+                            file_set.get('name'))
+            file_sets_by_key.setdefault(file_set_key, file_set['id'])
+
+        files_by_file_set_id = {}
+        for asset_file in self.iter_asset_files(asset_id):
+            if asset_file.get('status') == 'DELETED':
+                continue
+            files_by_file_set_id.setdefault(asset_file.get('file_set_id'), asset_file['id'])
+
+        registrations = []
+        for subtitle_file in subtitle_files:
+            path_on_storage = subtitle_file['path_on_storage']
+            is_closed_captions = subtitle_file.get('is_closed_captions', False)
+            registrations.append({
+                "format_key": (subtitle_file['language'], str(is_closed_captions).lower()),
+                "language": subtitle_file['language'],
+                "is_closed_captions": is_closed_captions,
+                "file_name": path_on_storage.split("/")[-1],
+                "base_dir": "/".join(path_on_storage.split("/")[:-1]),
+                "file_size": subtitle_file.get('file_size', 0)
+            })
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Create the missing formats, one per (language, closed captions) pair
+            missing_formats = {}
+            for registration in registrations:
+                if registration['format_key'] not in formats_by_key:
+                    missing_formats.setdefault(registration['format_key'], registration)
+
+            def create_subtitle_format(registration):
+                return self.create_format(asset_id=asset_id,
+                                          name="SUBTITLES",
+                                          metadata=self.build_subtitle_format_metadata(
+                                              registration['language'], registration['is_closed_captions']),
+                                          storage_methods=["S3"])['id']
+
+            for format_key, format_id in zip(missing_formats,
+                                             executor.map(create_subtitle_format, missing_formats.values())):
+                formats_by_key[format_key] = format_id
+
+            # Create the missing file sets
+            for registration in registrations:
+                registration['format_id'] = formats_by_key[registration['format_key']]
+                registration['file_set_key'] = (registration['format_id'], storage_id, registration['base_dir'],
+                                                registration['file_name'])
+            missing_file_sets = {}
+            for registration in registrations:
+                if registration['file_set_key'] not in file_sets_by_key:
+                    missing_file_sets.setdefault(registration['file_set_key'], registration)
+
+            def create_subtitle_file_set(registration):
+                return self.create_file_set(asset_id,
+                                            format_id=registration['format_id'],
+                                            storage_id=storage_id,
+                                            base_dir=registration['base_dir'],
+                                            name=registration['file_name'],
+                                            component_ids=[])['id']
+
+            for file_set_key, file_set_id in zip(missing_file_sets,
+                                                 executor.map(create_subtitle_file_set, missing_file_sets.values())):
+                file_sets_by_key[file_set_key] = file_set_id
+
+            # Create the missing files
+            for registration in registrations:
+                registration['file_set_id'] = file_sets_by_key[registration['file_set_key']]
+            missing_files = {}
+            for registration in registrations:
+                if registration['file_set_id'] not in files_by_file_set_id:
+                    missing_files.setdefault(registration['file_set_id'], registration)
+
+            def create_subtitle_file(registration):
+                return self.create_file(asset_id,
+                                        original_name=registration['file_name'],
+                                        directory_path=registration['base_dir'],
+                                        size=registration['file_size'],
+                                        file_type="FILE",
+                                        storage_id=storage_id,
+                                        file_set_id=registration['file_set_id'],
+                                        format_id=registration['format_id'])['id']
+
+            for file_set_id, file_id in zip(missing_files, executor.map(create_subtitle_file, missing_files.values())):
+                files_by_file_set_id[file_set_id] = file_id
+
+        return [{"file_id": files_by_file_set_id[registration['file_set_id']],
+                 "format_id": registration['format_id'],
+                 "file_set_id": registration['file_set_id']}
+                for registration in registrations]
+
     @classmethod
     def derive_data_from_file(cls, file, file_storages):
-        file_storage = next((storage for storage in file_storages if storage['id'] == file['storage_id']), {})
+        """
+        Derive the path and name of a file from the file and its storage.
+
+        :param file: The file.
+        :param file_storages: The storages indexed by id, as a dict or an IconikStorageCache. A list of storages is
+                              also accepted but has to be scanned for every file.
+        """
+        if isinstance(file_storages, list):
+            file_storage = next((storage for storage in file_storages if storage['id'] == file['storage_id']), {})
+        else:
+            file_storage = file_storages.get(file.get('storage_id')) or {}
         file_storage_settings = file_storage.get('settings', {})
         file_storage_path = file_storage_settings.get('path', '')
 
@@ -98,6 +497,23 @@ class IconikHelper(IconikApiClient):
             'asset_file_directory_path': asset_file_directory_path
         }
 
+    def derive_data_from_asset_file(self, file):
+        """
+        Derive the path and name of a file, using the shared storage cache to find its storage.
+        """
+        return self.derive_data_from_file(file, self.get_storage_cache())
+
+    def upload_file(self, asset_id, file_id, source, **kwargs):
+        """
+        Upload a file's contents with a parallel multipart upload, see IconikMultipartUploader.
+
+        :param source: A local file path, or an object with a size and a read(offset, size) method.
+        :param kwargs: The options of IconikMultipartUploader.
+        """
+        if isinstance(source, str):
+            source = LocalFileSource(source)
+        return IconikMultipartUploader(self, **kwargs).upload(asset_id, file_id, source)
+
     def get_asset_file_url(self, asset_id, file_id):
         get_multipart_upload_presigned_url_response = self.get_multipart_upload_presigned_url(asset_id, file_id)
         return get_multipart_upload_presigned_url_response['url']
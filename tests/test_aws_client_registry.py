@@ -0,0 +1,61 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from envoi_transcribe_translate import AwsClientRegistry  # noqa: E402
+
+AWS_ENVIRON = {"AWS_ACCESS_KEY_ID": 'test', "AWS_SECRET_ACCESS_KEY": 'test', "AWS_DEFAULT_REGION": 'us-east-1'}
+
+
+@mock.patch.dict(os.environ, AWS_ENVIRON)
+class AwsClientRegistryTest(unittest.TestCase):
+
+    def test_clients_are_shared_by_service_region_and_profile(self):
+        registry = AwsClientRegistry()
+
+        s3 = registry.get_client('s3')
+
+        self.assertIs(registry.get_client('s3'), s3)
+        self.assertIsNot(registry.get_client('s3', region_name='eu-west-1'), s3)
+        self.assertIsNot(registry.get_client('stepfunctions'), s3)
+
+    def test_clients_use_the_configured_pool_and_retries(self):
+        registry = AwsClientRegistry(max_pool_connections=7, retry_mode='adaptive', max_attempts=3)
+
+        config = registry.get_client('s3').meta.config
+
+        self.assertEqual(config.max_pool_connections, 7)
+        self.assertEqual(config.retries, {"mode": 'adaptive', "total_max_attempts": 3})
+
+    @mock.patch.dict(os.environ, {"AWS_MAX_POOL_CONNECTIONS": '12', "AWS_RETRY_MODE": 'legacy',
+                                  "AWS_MAX_ATTEMPTS": '2'})
+    def test_defaults_are_read_from_the_environment(self):
+        registry = AwsClientRegistry()
+
+        self.assertEqual((registry.max_pool_connections, registry.retry_mode, registry.max_attempts),
+                         (12, 'legacy', 2))
+
+    def test_configure_discards_existing_clients(self):
+        registry = AwsClientRegistry()
+        s3 = registry.get_client('s3')
+
+        registry.configure(max_pool_connections=3)
+
+        self.assertIsNot(registry.get_client('s3'), s3)
+        self.assertEqual(registry.get_client('s3').meta.config.max_pool_connections, 3)
+
+    def test_concurrent_callers_get_the_same_client(self):
+        registry = AwsClientRegistry()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            clients = list(executor.map(lambda _: registry.get_client('translate'), range(16)))
+
+        self.assertEqual(len({id(client) for client in clients}), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from envoi_transcribe_translate import (  # noqa: E402
+    build_batch_row_key, parse_batch_manifest_csv_value, read_batch_journal, read_batch_manifest
+)
+
+
+class BatchManifestTest(unittest.TestCase):
+
+    def write_file(self, name, contents):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        file_path = os.path.join(temp_dir.name, name)
+        with open(file_path, 'w') as f:
+            f.write(contents)
+        return file_path
+
+    def test_csv_values_get_the_type_of_their_option(self):
+        file_path = self.write_file('manifest.csv', (
+            "media_file_uri,translation_language_codes,translation_language_group_size,use_content_identity\n"
+            "s3://media/episode1.mp4,\"es, fr\",3,false\n"
+            "s3://media/episode2.mp4,,,\n"
+        ))
+
+        rows = list(read_batch_manifest(file_path))
+
+        self.assertEqual(rows, [
+            (1, {"media_file_uri": "s3://media/episode1.mp4", "translation_language_codes": ["es", "fr"],
+                 "translation_language_group_size": 3, "use_content_identity": False}),
+            (2, {"media_file_uri": "s3://media/episode2.mp4"})
+        ])
+
+    def test_csv_value_that_does_not_match_its_option_type(self):
+        with self.assertRaisesRegex(ValueError, 'translation_language_group_size'):
+            parse_batch_manifest_csv_value('translation_language_group_size', 'three')
+
+    def test_jsonl_rows_must_have_a_media_file_uri(self):
+        file_path = self.write_file('manifest.jsonl', '{"media_file_uri": "s3://media/episode1.mp4"}\n\n{"a": 1}\n')
+
+        rows = read_batch_manifest(file_path)
+
+        self.assertEqual(next(rows), (1, {"media_file_uri": "s3://media/episode1.mp4"}))
+        with self.assertRaisesRegex(ValueError, 'Row 2'):
+            next(rows)
+
+
+class BatchJournalTest(unittest.TestCase):
+
+    def test_row_key_depends_on_the_options_it_is_submitted_with(self):
+        row_options = {"media_file_uri": "s3://media/episode1.mp4", "translation_language_codes": ["es"],
+                       "max_workers": 8, "dry_run": False}
+
+        self.assertEqual(build_batch_row_key(row_options), build_batch_row_key({**row_options, "max_workers": 2}))
+        self.assertNotEqual(build_batch_row_key(row_options),
+                            build_batch_row_key({**row_options, "translation_language_codes": ["fr"]}))
+
+    def test_journal_keeps_the_successful_rows_and_skips_an_incomplete_last_line(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'journal.jsonl')
+            with open(file_path, 'w') as f:
+                f.write(json.dumps({"row": 1, "row_key": "a", "success": True}) + "\n")
+                f.write(json.dumps({"row": 2, "row_key": "b", "success": False}) + "\n")
+                f.write('{"row": 3, "row_key": "c", "succ')
+
+            self.assertEqual(read_batch_journal(file_path), {"a"})
+            self.assertEqual(read_batch_journal(os.path.join(temp_dir, 'missing.jsonl')), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
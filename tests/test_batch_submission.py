@@ -0,0 +1,103 @@
+import os
+import sys
+from types import SimpleNamespace
+import unittest
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from envoi_transcribe_translate import (  # noqa: E402
+    RateLimiter, compute_backoff_delay, is_throttling_error, submit_batch_row
+)
+
+EXECUTION_ARN = 'arn:aws:states:us-east-1:123456789012:execution:envoi:1'
+
+
+def build_client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, 'StartExecution')
+
+
+class BackoffTest(unittest.TestCase):
+
+    def test_backoff_delay_doubles_up_to_the_max_delay(self):
+        with mock.patch('envoi_transcribe_translate.random.uniform', lambda low, high: high):
+            self.assertEqual([compute_backoff_delay(attempt, base_delay=0.5, max_delay=3) for attempt in range(5)],
+                             [0.5, 1, 2, 3, 3])
+
+    def test_backoff_delay_has_full_jitter(self):
+        delays = [compute_backoff_delay(3, base_delay=1) for _ in range(100)]
+
+        self.assertTrue(all(0 <= delay <= 8 for delay in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+    def test_throttling_errors(self):
+        self.assertTrue(is_throttling_error(build_client_error('ThrottlingException')))
+        self.assertFalse(is_throttling_error(build_client_error('ValidationException')))
+        self.assertFalse(is_throttling_error(ValueError('ThrottlingException')))
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_rate_limiter_waits_once_the_burst_is_used(self):
+        now = [100.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        with mock.patch('envoi_transcribe_translate.time.monotonic', lambda: now[0]), \
+                mock.patch('envoi_transcribe_translate.time.sleep', sleep):
+            rate_limiter = RateLimiter(4, burst=2)
+            for _ in range(3):
+                rate_limiter.acquire()
+
+        self.assertEqual(sleeps, [0.25])
+
+    def test_rate_of_zero_is_unlimited(self):
+        with mock.patch('envoi_transcribe_translate.time.sleep') as sleep:
+            rate_limiter = RateLimiter(0)
+            for _ in range(100):
+                rate_limiter.acquire()
+
+        sleep.assert_not_called()
+
+
+@mock.patch('envoi_transcribe_translate.time.sleep', lambda seconds: None)
+@mock.patch('envoi_transcribe_translate.build_run_input', lambda opts: {"Transcribe": {}})
+class SubmitBatchRowTest(unittest.TestCase):
+
+    def setUp(self):
+        self.opts = SimpleNamespace(media_file_uri='s3://media/episode1.mp4', state_machine_arn='state-machine')
+        self.rate_limiter = RateLimiter(0)
+
+    def submit(self, side_effect, max_retries=3):
+        with mock.patch('envoi_transcribe_translate.run_step_function', side_effect=side_effect) as run_step_function:
+            result = submit_batch_row(1, 'row-key', self.opts, self.rate_limiter, max_retries=max_retries)
+        return result, run_step_function.call_count
+
+    def test_throttled_submission_is_retried(self):
+        result, call_count = self.submit([build_client_error('ThrottlingException'), EXECUTION_ARN])
+
+        self.assertEqual(result, {"row": 1, "row_key": 'row-key', "media_file_uri": 's3://media/episode1.mp4',
+                                  "success": True, "execution_arn": EXECUTION_ARN})
+        self.assertEqual(call_count, 2)
+
+    def test_submission_gives_up_after_max_retries(self):
+        result, call_count = self.submit([build_client_error('ThrottlingException')] * 3, max_retries=2)
+
+        self.assertFalse(result['success'])
+        self.assertIn('ThrottlingException', result['error'])
+        self.assertEqual(call_count, 3)
+
+    def test_other_errors_are_not_retried(self):
+        result, call_count = self.submit([build_client_error('ValidationException')])
+
+        self.assertFalse(result['success'])
+        self.assertEqual(call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
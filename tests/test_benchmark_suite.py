@@ -0,0 +1,46 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from benchmark_suite import compare_results  # noqa: E402
+
+
+class CompareResultsTest(unittest.TestCase):
+
+    def test_changes_are_added_to_the_results(self):
+        results = {"build_run_input": {"inputs_per_second": 1100.0, "runs": 5}}
+
+        regressions = compare_results(results, {"results": {"build_run_input": {"inputs_per_second": 1000.0}}}, 0.1)
+
+        self.assertEqual(regressions, [])
+        self.assertEqual(results['build_run_input']['change'], {"inputs_per_second": 0.1})
+
+    def test_lower_throughput_is_a_regression(self):
+        results = {"lambda_handler": {"events_per_second": 800.0}}
+
+        regressions = compare_results(results, {"results": {"lambda_handler": {"events_per_second": 1000.0}}}, 0.1)
+
+        self.assertEqual(regressions, ["lambda_handler.events_per_second: 1000.0 -> 800.0 (-20.0%)"])
+
+    def test_higher_latency_and_memory_are_regressions(self):
+        results = {"transcript_parse": {"read_seconds": 1.5, "peak_mib": 90.0, "p50_ms": 9.0}}
+        baseline = {"results": {"transcript_parse": {"read_seconds": 1.0, "peak_mib": 100.0, "p50_ms": 10.0}}}
+
+        regressions = compare_results(results, baseline, 0.1)
+
+        self.assertEqual(regressions, ["transcript_parse.read_seconds: 1.0 -> 1.5 (+50.0%)"])
+
+    def test_missing_and_zero_baselines_are_skipped(self):
+        results = {"new_benchmark": {"p50_ms": 5.0}, "iconik": {"p50_ms": 5.0, "failures_ms": 1.0}}
+
+        regressions = compare_results(results, {"results": {"iconik": {"p50_ms": 5.0, "failures_ms": 0}}}, 0.1)
+
+        self.assertEqual(regressions, [])
+        self.assertNotIn('change', results['new_benchmark'])
+        self.assertEqual(results['iconik']['change'], {"p50_ms": 0.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
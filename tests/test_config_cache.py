@@ -0,0 +1,72 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from envoi_transcribe_translate import ConfigCache  # noqa: E402
+
+CONFIG_FILE_URI = 's3://bucket/config.json'
+
+
+class ConfigCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('envoi_transcribe_translate.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('envoi_transcribe_translate.StorageHelper.read_file_if_modified')
+        self.read_file_if_modified = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_config_is_read_once_until_the_ttl_expires(self):
+        self.read_file_if_modified.return_value = {"contents": '{"input": {"a": 1}}', "etag": '"1"',
+                                                   "last_modified": None}
+        cache = ConfigCache(ttl=60)
+
+        self.assertEqual(cache.get(CONFIG_FILE_URI), {"input": {"a": 1}})
+        self.now += 59
+        self.assertEqual(cache.get(CONFIG_FILE_URI), {"input": {"a": 1}})
+
+        self.read_file_if_modified.assert_called_once_with(CONFIG_FILE_URI)
+
+    def test_expired_config_is_revalidated_with_its_etag(self):
+        self.read_file_if_modified.return_value = {"contents": '{"input": {"a": 1}}', "etag": '"1"',
+                                                   "last_modified": 'yesterday'}
+        cache = ConfigCache(ttl=60)
+        config = cache.get(CONFIG_FILE_URI)
+
+        self.read_file_if_modified.return_value = None
+        self.now += 60
+        self.assertIs(cache.get(CONFIG_FILE_URI), config)
+        self.read_file_if_modified.assert_called_with(CONFIG_FILE_URI, etag='"1"', last_modified='yesterday')
+
+        # The revalidation restarts the TTL
+        self.now += 30
+        cache.get(CONFIG_FILE_URI)
+        self.assertEqual(self.read_file_if_modified.call_count, 2)
+
+    def test_modified_config_replaces_the_cached_one(self):
+        self.read_file_if_modified.return_value = {"contents": '{"input": {"a": 1}}', "etag": '"1"',
+                                                   "last_modified": None}
+        cache = ConfigCache(ttl=60)
+        cache.get(CONFIG_FILE_URI)
+
+        self.read_file_if_modified.return_value = {"contents": '{"input": {"a": 2}}', "etag": '"2"',
+                                                   "last_modified": None}
+        self.now += 60
+        self.assertEqual(cache.get(CONFIG_FILE_URI), {"input": {"a": 2}})
+
+    def test_missing_config_is_not_cached(self):
+        self.read_file_if_modified.return_value = {"contents": None, "etag": None, "last_modified": None}
+        cache = ConfigCache(ttl=60)
+
+        self.assertIsNone(cache.get(CONFIG_FILE_URI))
+        self.assertIsNone(cache.get(CONFIG_FILE_URI))
+        self.assertEqual(self.read_file_if_modified.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import sys
+from types import SimpleNamespace
+import unittest
+from unittest import mock
+
+import boto3.session
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import envoi_transcribe_translate  # noqa: E402
+from envoi_transcribe_translate import S3Helper, build_run_input, get_media_content_identity  # noqa: E402
+
+RUN_OPTIONS = {
+    "media_file_uri": "s3://media-bucket/media/episode1.mp4",
+    "output_s3_uri": "s3://output-bucket/output/",
+    "translation_language_codes": ["de", "es", "fr"],
+    "translation_language_group_size": 2,
+    "media_file_etag": '"0123456789abcdef"',
+    "media_file_size": 1024
+}
+
+
+def build_s3_helper():
+    session = boto3.session.Session(aws_access_key_id='test', aws_secret_access_key='test', region_name='us-east-1')
+    client = session.client('s3')
+    stubber = Stubber(client)
+    stubber.activate()
+    return S3Helper(client), stubber
+
+
+class ContentIdentityTest(unittest.TestCase):
+
+    def test_dry_runs_read_the_content_identity(self):
+        s3_helper, stubber = build_s3_helper()
+        stubber.add_response('head_object', {"ETag": '"abc"', "ContentLength": 10},
+                             expected_params={"Bucket": "media-bucket", "Key": "media/episode1.mp4"})
+        opts = SimpleNamespace(media_file_uri='s3://media-bucket/media/episode1.mp4', dry_run=True)
+
+        self.assertEqual(get_media_content_identity(opts, s3_helper=s3_helper),
+                         {"etag": "abc", "size": 10, "version_id": None})
+        stubber.assert_no_pending_responses()
+
+    def test_unreadable_media_file_fails(self):
+        s3_helper, stubber = build_s3_helper()
+        stubber.add_client_error('head_object', service_error_code='403', http_status_code=403)
+        opts = SimpleNamespace(media_file_uri='s3://media-bucket/media/episode1.mp4')
+
+        with mock.patch.object(envoi_transcribe_translate.logger, 'error') as log_error, \
+                self.assertRaises(ClientError):
+            get_media_content_identity(opts, s3_helper=s3_helper)
+        log_error.assert_called_once()
+
+    def test_client_tokens_are_stable_and_change_with_the_translation_attempt(self):
+        def client_tokens(**options):
+            run_input = build_run_input(SimpleNamespace(**{**RUN_OPTIONS, **options}))
+            return [translate_input['ClientToken'] for translate_input in run_input['Translate']['Inputs']]
+
+        first_tokens = client_tokens()
+        self.assertEqual(len(first_tokens), 2)
+        self.assertEqual(client_tokens(), first_tokens)
+        self.assertNotEqual(client_tokens(media_file_etag='"fedcba9876543210"'), first_tokens)
+
+        retry_tokens = client_tokens(translation_attempt=2)
+        self.assertTrue(set(retry_tokens).isdisjoint(first_tokens))
+        self.assertEqual(client_tokens(translation_attempt=2), retry_tokens)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import contextlib
+import io
+import json
+import os
+import sys
+from types import SimpleNamespace
+import unittest
+from unittest import mock
+
+import boto3.session
+from botocore.stub import Stubber
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import envoi_transcribe_translate  # noqa: E402
+from envoi_transcribe_translate import (  # noqa: E402
+    EnvoiTranscribeTranslateDescribeCommand, ExecutionDescriber, build_execution_output_uris
+)
+
+TRANSCRIBE_INPUT = {
+    "TranscriptionJobName": "episode1-auto-0123",
+    "OutputBucketName": "output-bucket",
+    "OutputKey": "transcriptions/episode1-auto-0123/episode1.json",
+    "Subtitles": {"Formats": ["srt", "vtt"]}
+}
+TRANSLATE_INPUTS = [
+    {"OutputDataConfig": {"S3Uri": "s3://output-bucket/transcriptions/episode1-auto-0123/translated/"},
+     "TargetLanguageCodes": ["es", "fr"]},
+    {"OutputDataConfig": {"S3Uri": "s3://output-bucket/transcriptions/episode1-auto-0123/translated/"},
+     "TargetLanguageCodes": ["de"]}
+]
+
+
+def build_stepfunctions_client():
+    session = boto3.session.Session(aws_access_key_id='test', aws_secret_access_key='test', region_name='us-east-1')
+    client = session.client('stepfunctions')
+    stubber = Stubber(client)
+    stubber.activate()
+    return client, stubber
+
+
+class BuildExecutionOutputUrisTest(unittest.TestCase):
+
+    def test_transcribe_output(self):
+        description = {"input": {"Transcribe": TRANSCRIBE_INPUT},
+                       "output": {"TranscriptionJob": {
+                           "Transcript": {"TranscriptFileUri": "s3://output-bucket/episode1.json"},
+                           "Subtitles": {"SubtitleFileUris": ["s3://output-bucket/episode1.srt"]}}}}
+
+        self.assertEqual(build_execution_output_uris(description), {
+            "Transcription": {"TranscriptFileUri": "s3://output-bucket/episode1.json",
+                              "SubtitleFileUris": ["s3://output-bucket/episode1.srt"]}
+        })
+
+    def test_transcribe_translate_map_output(self):
+        description = {"input": {"Transcribe": TRANSCRIBE_INPUT, "Translate": {"Inputs": TRANSLATE_INPUTS}},
+                       "output": [{"JobId": "1"}, {"JobId": "2"}]}
+
+        output_uris = build_execution_output_uris(description)
+
+        transcript_file_uri = envoi_transcribe_translate.build_transcribe_output_s3_uri_from_transcribe_input(
+            TRANSCRIBE_INPUT)
+        self.assertEqual(output_uris['Transcription']['TranscriptFileUri'], transcript_file_uri)
+        self.assertEqual(len(output_uris['Transcription']['SubtitleFileUris']), 2)
+        self.assertEqual(output_uris['Translation'],
+                         {"OutputS3Uris": ["s3://output-bucket/transcriptions/episode1-auto-0123/translated/"]})
+
+
+class ExecutionDescriberTest(unittest.TestCase):
+
+    def test_errors_are_reported_per_execution(self):
+        client, stubber = build_stepfunctions_client()
+        stubber.add_client_error('describe_execution', service_error_code='AccessDeniedException',
+                                 http_status_code=400, expected_params={"executionArn": "arn:1"})
+        stubber.add_client_error('describe_execution', service_error_code='ExecutionDoesNotExist',
+                                 http_status_code=400, expected_params={"executionArn": "arn:2"})
+
+        describer = ExecutionDescriber(client, max_workers=1)
+        descriptions = list(describer.describe_executions([{"executionArn": "arn:1"}, {"executionArn": "arn:2"}]))
+
+        self.assertEqual([(description['executionArn'], description['status']) for description in descriptions],
+                         [("arn:1", "ERROR"), ("arn:2", "NOT_FOUND")])
+        self.assertIn('AccessDeniedException', descriptions[0]['error'])
+
+
+class DescribeBulkTest(unittest.TestCase):
+
+    def test_a_row_that_fails_is_reported_and_the_stream_goes_on(self):
+        descriptions = [
+            {"executionArn": "arn:1", "status": "SUCCEEDED", "input": "{not json", "output": "[]"},
+            {"executionArn": "arn:2", "status": "SUCCEEDED",
+             "input": json.dumps({"Transcribe": TRANSCRIBE_INPUT, "Translate": {"Inputs": TRANSLATE_INPUTS}}),
+             "output": json.dumps([{"JobId": "1"}])},
+        ]
+        describer = mock.Mock()
+        describer.describe_executions.return_value = iter(descriptions)
+        opts = SimpleNamespace(state_machine_arn='arn:sm', execution_arn=None, status_filter=None, started_after=None,
+                               started_before=None, max_workers=1, uris_only=True)
+
+        stdout = io.StringIO()
+        with mock.patch.object(envoi_transcribe_translate, 'ExecutionDescriber', return_value=describer), \
+                contextlib.redirect_stdout(stdout):
+            EnvoiTranscribeTranslateDescribeCommand(opts).run()
+
+        lines = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([(line['executionArn'], line['status']) for line in lines],
+                         [("arn:1", "ERROR"), ("arn:2", "SUCCEEDED")])
+        self.assertIn('JSONDecodeError', lines[0]['error'])
+        self.assertIn('Translation', lines[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
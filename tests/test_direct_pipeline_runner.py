@@ -0,0 +1,141 @@
+import os
+import sys
+import unittest
+
+import boto3.session
+from botocore.stub import Stubber
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from envoi_transcribe_translate import DirectPipelineRunner, poll, remove_none_values  # noqa: E402
+
+TRANSCRIBE_INPUT = {
+    "TranscriptionJobName": "episode1",
+    "Media": {"MediaFileUri": "s3://media-bucket/media/episode1.mp4"},
+    "OutputBucketName": "output-bucket",
+    "OutputKey": "output/episode1/",
+    "LanguageCode": "en-US",
+    "IdentifyLanguage": None
+}
+
+TRANSLATE_INPUT = {
+    "ClientToken": "episode1-de",
+    "DataAccessRoleArn": "arn:aws:iam::123456789012:role/translate",
+    "InputDataConfig": {"ContentType": "text/plain", "S3Uri": "s3://output-bucket/output/episode1/"},
+    "OutputDataConfig": {"S3Uri": "s3://output-bucket/output/episode1/translations/"},
+    "SourceLanguageCode": "en",
+    "TargetLanguageCodes": ["de"]
+}
+
+
+def build_stubbed_client(service_name):
+    session = boto3.session.Session(aws_access_key_id='test', aws_secret_access_key='test', region_name='us-east-1')
+    client = session.client(service_name)
+    stubber = Stubber(client)
+    stubber.activate()
+    return client, stubber
+
+
+class PollTest(unittest.TestCase):
+
+    def test_poll_backs_off_until_a_result(self):
+        results = iter([None, None, None, 'done'])
+        sleeps = []
+
+        result = poll(lambda: next(results), initial_interval=1, max_interval=3, backoff_factor=2, jitter=0,
+                      sleep=sleeps.append)
+
+        self.assertEqual(result, 'done')
+        self.assertEqual(sleeps, [1, 2, 3])
+
+    def test_remove_none_values(self):
+        self.assertEqual(remove_none_values({"a": 1, "b": None, "c": False}), {"a": 1, "c": False})
+
+
+class DirectPipelineRunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.transcribe_client, self.transcribe_stubber = build_stubbed_client('transcribe')
+        self.translate_client, self.translate_stubber = build_stubbed_client('translate')
+        self.sleeps = []
+        self.runner = DirectPipelineRunner(transcribe_client=self.transcribe_client,
+                                           translate_client=self.translate_client,
+                                           initial_interval=1, max_interval=1, jitter=0, sleep=self.sleeps.append,
+                                           translation_mode='batch')
+
+    def add_transcription_job_responses(self, *statuses):
+        self.transcribe_stubber.add_response(
+            'start_transcription_job', {"TranscriptionJob": {"TranscriptionJobName": "episode1"}},
+            expected_params=remove_none_values(TRANSCRIBE_INPUT))
+        for status in statuses:
+            self.transcribe_stubber.add_response(
+                'get_transcription_job',
+                {"TranscriptionJob": {"TranscriptionJobName": "episode1", "TranscriptionJobStatus": status}},
+                expected_params={"TranscriptionJobName": "episode1"})
+
+    def test_run_polls_the_transcription_and_then_the_translations(self):
+        self.add_transcription_job_responses('QUEUED', 'IN_PROGRESS', 'COMPLETED')
+        self.translate_stubber.add_response('start_text_translation_job', {"JobId": "job-1", "JobStatus": "SUBMITTED"},
+                                            expected_params=TRANSLATE_INPUT)
+        for status in ('IN_PROGRESS', 'COMPLETED'):
+            self.translate_stubber.add_response('describe_text_translation_job',
+                                                {"TextTranslationJobProperties": {"JobId": "job-1",
+                                                                                  "JobStatus": status}},
+                                                expected_params={"JobId": "job-1"})
+
+        result = self.runner.run({"Transcribe": TRANSCRIBE_INPUT, "Translate": {"Inputs": [TRANSLATE_INPUT]}})
+
+        self.assertEqual(result['Status'], 'SUCCEEDED')
+        self.assertEqual(result['TranslationMode'], 'batch')
+        self.assertEqual(result['TranscriptionJob']['TranscriptionJobStatus'], 'COMPLETED')
+        self.assertEqual([(job['JobId'], job['JobStatus'], job['TargetLanguageCodes'])
+                          for job in result['TranslationJobs']], [('job-1', 'COMPLETED', ['de'])])
+        self.assertEqual(self.sleeps, [1, 1, 1])
+        self.assertTrue({'transcribe', 'translate', 'total'} <= set(result['Timings']))
+        self.transcribe_stubber.assert_no_pending_responses()
+        self.translate_stubber.assert_no_pending_responses()
+
+    def test_failed_transcription_skips_the_translations(self):
+        self.add_transcription_job_responses('FAILED')
+
+        result = self.runner.run({"Transcribe": TRANSCRIBE_INPUT, "Translate": {"Inputs": [TRANSLATE_INPUT]}})
+
+        self.assertEqual(result['Status'], 'FAILED')
+        self.assertEqual(result['TranslationJobs'], [])
+        self.translate_stubber.assert_no_pending_responses()
+
+    def test_failed_translation_fails_the_run(self):
+        self.add_transcription_job_responses('COMPLETED')
+        self.translate_stubber.add_response('start_text_translation_job', {"JobId": "job-1", "JobStatus": "SUBMITTED"})
+        self.translate_stubber.add_response('describe_text_translation_job',
+                                            {"TextTranslationJobProperties": {"JobId": "job-1", "JobStatus": "FAILED"}})
+
+        result = self.runner.run({"Transcribe": TRANSCRIBE_INPUT, "Translate": {"Inputs": [TRANSLATE_INPUT]}})
+
+        self.assertEqual(result['Status'], 'FAILED')
+        self.assertEqual(result['TranslationJobs'][0]['JobStatus'], 'FAILED')
+
+    def test_throttled_polls_are_retried(self):
+        self.transcribe_stubber.add_response('start_transcription_job', {"TranscriptionJob": {}})
+        self.transcribe_stubber.add_client_error('get_transcription_job', service_error_code='ThrottlingException',
+                                                 http_status_code=400)
+        self.transcribe_stubber.add_response(
+            'get_transcription_job',
+            {"TranscriptionJob": {"TranscriptionJobName": "episode1", "TranscriptionJobStatus": "COMPLETED"}})
+
+        result = self.runner.run({"Transcribe": TRANSCRIBE_INPUT, "Translate": {"Inputs": []}})
+
+        self.assertEqual(result['Status'], 'SUCCEEDED')
+        self.assertEqual(self.sleeps, [1])
+
+    def test_planned_skip_does_not_start_a_transcription(self):
+        result = self.runner.run({"Transcribe": TRANSCRIBE_INPUT, "SkipTranscription": True,
+                                  "Translate": {"Inputs": []}})
+
+        self.assertEqual(result['Status'], 'SUCCEEDED')
+        self.assertTrue(result['TranscriptionJob']['Reused'])
+        self.transcribe_stubber.assert_no_pending_responses()
+
+
+if __name__ == '__main__':
+    unittest.main()
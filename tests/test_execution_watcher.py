@@ -0,0 +1,131 @@
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from envoi_transcribe_translate import ExecutionWatcher  # noqa: E402
+
+STATE_MACHINE_EXECUTION_ARN_PREFIX = 'arn:aws:states:us-east-1:123456789012:execution:envoi:'
+
+
+def build_execution_arn(name):
+    return f"{STATE_MACHINE_EXECUTION_ARN_PREFIX}{name}"
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeStepFunctionsClient:
+    """
+    Executions finish at the time given in finished_at, describing an execution that doesn't exist fails.
+    """
+
+    def __init__(self, clock, finished_at):
+        self.clock = clock
+        self.finished_at = finished_at
+        self.describe_calls = []
+        self.list_calls = 0
+        self.throttled_execution_arns = set()
+        self.lock = threading.Lock()
+
+    def get_status(self, execution_arn):
+        return 'SUCCEEDED' if self.clock.now >= self.finished_at[execution_arn] else 'RUNNING'
+
+    def describe_execution(self, executionArn):
+        with self.lock:
+            self.describe_calls.append((self.clock.now, executionArn))
+            if executionArn in self.throttled_execution_arns:
+                self.throttled_execution_arns.discard(executionArn)
+                raise ClientError({"Error": {"Code": 'ThrottlingException'}}, 'DescribeExecution')
+        if executionArn not in self.finished_at:
+            raise ClientError({"Error": {"Code": 'ExecutionDoesNotExist'}}, 'DescribeExecution')
+        return {"executionArn": executionArn, "status": self.get_status(executionArn)}
+
+    def get_paginator(self, operation_name):
+        client = self
+
+        class Paginator:
+            def paginate(self, stateMachineArn, statusFilter):
+                client.list_calls += 1
+                yield {"executions": [{"executionArn": execution_arn} for execution_arn in client.finished_at
+                                      if client.get_status(execution_arn) == statusFilter]}
+
+        return Paginator()
+
+
+class ExecutionWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        for name in ('monotonic', 'sleep'):
+            patcher = mock.patch(f"envoi_transcribe_translate.time.{name}", getattr(self.clock, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def build_watcher(self, client, execution_arns, **kwargs):
+        return ExecutionWatcher(execution_arns, stepfunctions_client=client, initial_interval=1, max_interval=8,
+                                backoff_factor=2, jitter=0, max_workers=1, **kwargs)
+
+    def test_executions_are_checked_with_backoff_and_yielded_as_they_finish(self):
+        client = FakeStepFunctionsClient(self.clock, {build_execution_arn('slow'): 20,
+                                                      build_execution_arn('fast'): 2})
+        watcher = self.build_watcher(client, list(client.finished_at))
+
+        finished = [(self.clock.now, description['executionArn']) for description in watcher.watch()]
+
+        self.assertEqual(finished, [(3, build_execution_arn('fast')), (23, build_execution_arn('slow'))])
+        self.assertEqual([checked_at for checked_at, execution_arn in client.describe_calls
+                          if execution_arn == build_execution_arn('slow')], [0, 1, 3, 7, 15, 23])
+
+    def test_many_executions_are_checked_with_a_single_listing(self):
+        client = FakeStepFunctionsClient(self.clock, {build_execution_arn(index): 5 if index else 0
+                                                      for index in range(4)})
+        watcher = self.build_watcher(client, list(client.finished_at), list_executions_threshold=2)
+
+        descriptions = list(watcher.watch())
+
+        self.assertEqual(len(descriptions), 4)
+        # Only the executions that are no longer running are described
+        self.assertEqual(len(client.describe_calls), 4)
+        self.assertGreater(client.list_calls, 1)
+
+    def test_missing_execution_is_reported_as_not_found(self):
+        client = FakeStepFunctionsClient(self.clock, {})
+
+        descriptions = list(self.build_watcher(client, [build_execution_arn('missing')]).watch())
+
+        self.assertEqual(descriptions, [{"executionArn": build_execution_arn('missing'), "status": 'NOT_FOUND'}])
+
+    def test_throttled_description_is_checked_again_later(self):
+        client = FakeStepFunctionsClient(self.clock, {build_execution_arn('done'): 0})
+        client.throttled_execution_arns.add(build_execution_arn('done'))
+
+        descriptions = list(self.build_watcher(client, [build_execution_arn('done')]).watch())
+
+        self.assertEqual([description['status'] for description in descriptions], ['SUCCEEDED'])
+        self.assertEqual([checked_at for checked_at, _execution_arn in client.describe_calls], [0, 1])
+
+    def test_watch_stops_at_the_timeout(self):
+        client = FakeStepFunctionsClient(self.clock, {build_execution_arn('slow'): 100})
+        watcher = self.build_watcher(client, list(client.finished_at))
+
+        self.assertEqual(list(watcher.watch(timeout=10)), [])
+        self.assertEqual(list(watcher.pending), [build_execution_arn('slow')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,219 @@
+import email.utils
+import http.client
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from iconik_api_client import HttpConnectionPool, IconikApiClient, TokenBucket, parse_retry_after  # noqa: E402
+
+
+class FakeResponse:
+    will_close = False
+
+    def read(self):
+        return b'{}'
+
+
+class FakeConnection:
+    """
+    A connection that fails with the exception set in its failures, by step, once the step is reached.
+    """
+
+    def __init__(self, connections):
+        self.connections = connections
+        self.connections.append(self)
+        self.failures = {}
+        self.requests = []
+
+    def fail(self, step):
+        exception = self.failures.pop(step, None)
+        if exception is not None:
+            raise exception
+
+    def request(self, method, url, body=None, headers=None):
+        self.fail('request')
+        self.requests.append((method, url))
+
+    def getresponse(self):
+        self.fail('getresponse')
+        return FakeResponse()
+
+    def close(self):
+        pass
+
+
+class HttpConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connections = []
+        self.pool = HttpConnectionPool('example.com',
+                                       connection_class=lambda host, port: FakeConnection(self.connections))
+        # Leave an idle connection in the pool
+        self.pool.request('GET', '/')
+
+    def test_idempotent_request_is_retried_when_a_reused_connection_was_closed(self):
+        self.connections[0].failures['getresponse'] = http.client.RemoteDisconnected()
+
+        self.pool.request('GET', '/retried')
+
+        self.assertEqual(len(self.connections), 2)
+        self.assertEqual(self.connections[1].requests, [('GET', '/retried')])
+
+    def test_sent_post_is_not_retried_when_a_reused_connection_was_closed(self):
+        self.connections[0].failures['getresponse'] = http.client.RemoteDisconnected()
+
+        with self.assertRaises(http.client.RemoteDisconnected):
+            self.pool.request('POST', '/not-retried')
+
+        self.assertEqual(len(self.connections), 1)
+
+    def test_unsent_post_is_retried_when_a_reused_connection_was_closed(self):
+        self.connections[0].failures['request'] = BrokenPipeError()
+
+        self.pool.request('POST', '/retried')
+
+        self.assertEqual(len(self.connections), 2)
+        self.assertEqual(self.connections[1].requests, [('POST', '/retried')])
+
+    def test_new_connection_is_not_retried(self):
+        self.pool.close()
+        original_connection_class = self.pool.connection_class
+
+        def failing_connection_class(host, port):
+            connection = original_connection_class(host, port)
+            connection.failures['getresponse'] = http.client.RemoteDisconnected()
+            return connection
+
+        self.pool.connection_class = failing_connection_class
+
+        with self.assertRaises(http.client.RemoteDisconnected):
+            self.pool.request('GET', '/')
+        self.assertEqual(len(self.connections), 2)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        for name in ('monotonic', 'sleep'):
+            patcher = mock.patch(f"iconik_api_client.time.{name}", getattr(self.clock, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_acquire_waits_once_the_capacity_is_used(self):
+        bucket = TokenBucket(2)
+
+        for _ in range(3):
+            bucket.acquire()
+
+        self.assertEqual(self.clock.sleeps, [0.5])
+
+    def test_acquire_waits_for_a_pause(self):
+        bucket = TokenBucket(2)
+        bucket.pause(5)
+
+        bucket.acquire()
+
+        self.assertEqual(self.clock.sleeps, [5])
+
+    def test_rate_of_zero_does_not_limit_requests(self):
+        bucket = TokenBucket(0)
+
+        for _ in range(100):
+            bucket.acquire()
+        self.assertEqual(self.clock.sleeps, [])
+
+        bucket.pause(3)
+        bucket.acquire()
+        self.assertEqual(self.clock.sleeps, [3])
+
+    def test_negative_rate_is_rejected(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(-1)
+
+
+class ParseRetryAfterTest(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after('5'), 5.0)
+        self.assertEqual(parse_retry_after('1.5'), 1.5)
+        self.assertEqual(parse_retry_after('-3'), 0.0)
+
+    @mock.patch('iconik_api_client.time.time', lambda: 1_000_000_000)
+    def test_http_date(self):
+        self.assertEqual(parse_retry_after(email.utils.formatdate(1_000_000_030, usegmt=True)), 30.0)
+        self.assertEqual(parse_retry_after(email.utils.formatdate(999_999_970, usegmt=True)), 0.0)
+
+    def test_missing_or_invalid(self):
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after(''))
+        self.assertIsNone(parse_retry_after('soon'))
+
+
+
+class IconikPaginationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = IconikApiClient('test-app-id', 'test-auth-token', rate_limiter=None)
+        self.addCleanup(self.client.pool.close)
+        self.requests = []
+
+    def serve_pages(self, pages):
+        def request(method, url, body=None, headers=None):
+            self.requests.append(url)
+            return pages[len(self.requests) - 1]
+        self.client.request = request
+
+    def test_objects_are_fetched_one_page_at_a_time(self):
+        self.serve_pages([{"objects": [{"id": 1}, {"id": 2}], "page": 1, "pages": 2},
+                          {"objects": [{"id": 3}], "page": 2, "pages": 2}])
+
+        objects = self.client.iter_storages(per_page=2)
+        self.assertEqual(next(objects), {"id": 1})
+        self.assertEqual(next(objects), {"id": 2})
+        self.assertEqual(len(self.requests), 1)
+
+        self.assertEqual(list(objects), [{"id": 3}])
+        self.assertEqual(len(self.requests), 2)
+        self.assertIn('page=2', self.requests[1])
+        self.assertIn('per_page=2', self.requests[1])
+
+    def test_next_url_is_followed(self):
+        self.serve_pages([{"objects": [{"id": 1}], "next_url": "/API/files/v1/storages/?per_page=1&scroll_id=abc"},
+                          {"objects": [{"id": 2}]}])
+
+        self.assertEqual([storage['id'] for storage in self.client.iter_storages(per_page=1)], [1, 2])
+        self.assertIn('scroll_id=abc', self.requests[1])
+
+    def test_empty_page_ends_the_listing(self):
+        self.serve_pages([{"objects": [], "page": 1, "pages": 3}])
+
+        self.assertEqual(list(self.client.iter_asset_files('asset-id')), [])
+        self.assertEqual(len(self.requests), 1)
+
+    def test_read_ahead_yields_the_same_objects(self):
+        self.serve_pages([{"objects": [{"id": number}], "page": number, "pages": 3} for number in range(1, 4)])
+
+        self.assertEqual([storage['id'] for storage in self.client.iter_storages(per_page=1, read_ahead=True)],
+                         [1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
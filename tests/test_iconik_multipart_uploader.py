@@ -0,0 +1,180 @@
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import sys
+import threading
+import unittest
+import urllib.error
+import urllib.parse
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from iconik_helper import IconikHelper, IconikMultipartUploader  # noqa: E402
+
+PART_SIZE = IconikMultipartUploader.MIN_PART_SIZE
+UPLOAD_ID = 'test-upload'
+
+
+class BytesSource:
+
+    def __init__(self, data):
+        self.data = data
+        self.size = len(data)
+
+    def read(self, offset, size):
+        return self.data[offset:offset + size]
+
+
+class FakeIconikMultipartRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers the Iconik multipart URL endpoints, the part uploads to their presigned URLs, and the completion and closing
+    of the upload.
+
+    The server's part_statuses maps a part number to the statuses of its first uploads, the uploads after those
+    succeed. Each fetch of the part URLs returns new URLs, like new presigned URLs would be.
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def send_body(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        if url.path.endswith('/multipart_url/part/'):
+            parts_num = int(query['parts_num'][0])
+            self.server.part_url_requests.append(parts_num)
+            base_url = f"http://127.0.0.1:{self.server.server_port}"
+            data = {"objects": [{"number": number,
+                                 "url": f"{base_url}/s3/part/{number}?version={len(self.server.part_url_requests)}"}
+                                for number in range(1, parts_num + 1)]}
+        else:
+            data = {"upload_id": UPLOAD_ID}
+        self.send_body(200, json.dumps(data).encode('utf-8'), {"Content-Type": "application/json"})
+
+    def get_api_path(self):
+        # The client joins its base path and the endpoints with a slash, the endpoints also start with one
+        return urllib.parse.urlparse(self.path).path.replace('//', '/')
+
+    def read_json(self):
+        return json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+
+    def do_POST(self):
+        self.server.api_requests.append(('POST', self.get_api_path(), self.read_json()))
+        self.send_body(201, b'{}', {"Content-Type": "application/json"})
+
+    def do_PATCH(self):
+        self.server.api_requests.append(('PATCH', self.get_api_path(), self.read_json()))
+        self.send_body(200, b'{}', {"Content-Type": "application/json"})
+
+    def do_PUT(self):
+        part_number = int(urllib.parse.urlparse(self.path).path.rsplit('/', 1)[-1])
+        data = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        with self.server.lock:
+            self.server.part_uploads.append(part_number)
+            statuses = self.server.part_statuses.get(part_number)
+            status = statuses.pop(0) if statuses else 200
+        if status != 200:
+            self.send_body(status)
+            return
+        self.server.parts[part_number] = data
+        self.send_body(200, headers={"ETag": f'"etag-{part_number}"'})
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def run_fake_iconik_server(part_statuses=None):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeIconikMultipartRequestHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.part_statuses = part_statuses or {}
+    server.part_url_requests = []
+    server.part_uploads = []
+    server.api_requests = []
+    server.parts = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server, f"http://127.0.0.1:{server.server_port}/API"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@mock.patch('iconik_helper.time.sleep', lambda seconds: None)
+class IconikMultipartUploaderTest(unittest.TestCase):
+
+    def upload(self, base_url, data, **kwargs):
+        iconik = IconikHelper('test-app-id', 'test-auth-token', base_url=base_url, rate_limiter=None)
+        try:
+            return iconik.upload_file('asset-id', 'file-id', BytesSource(data), part_size=PART_SIZE, **kwargs)
+        finally:
+            iconik.pool.close()
+
+    def test_upload_fetches_part_urls_once(self):
+        data = os.urandom(PART_SIZE * 4 + 10)
+        with run_fake_iconik_server() as (server, base_url):
+            parts = self.upload(base_url, data)
+
+        self.assertEqual(parts, [{"part_number": number, "etag": f'"etag-{number}"'} for number in range(1, 6)])
+        self.assertEqual(server.part_url_requests, [5])
+        self.assertEqual(b''.join(server.parts[number] for number in range(1, 6)), data)
+
+    def test_upload_completes_the_upload_and_closes_the_file(self):
+        data = os.urandom(PART_SIZE + 10)
+        with run_fake_iconik_server() as (server, base_url):
+            parts = self.upload(base_url, data)
+
+        self.assertEqual(server.api_requests, [
+            ('POST', '/API/files/v1/assets/asset-id/files/file-id/multipart_url/complete/',
+             {"upload_id": UPLOAD_ID, "parts": parts}),
+            ('PATCH', '/API/files/v1/assets/asset-id/files/file-id/', {"status": "CLOSED", "size": len(data)})
+        ])
+
+    def test_upload_retries_server_errors_and_refreshes_rejected_urls(self):
+        data = os.urandom(PART_SIZE * 2)
+        with run_fake_iconik_server(part_statuses={1: [500, 503], 2: [403]}) as (server, base_url):
+            parts = self.upload(base_url, data)
+
+        self.assertEqual([part['part_number'] for part in parts], [1, 2])
+        self.assertEqual(sorted(server.part_uploads), [1, 1, 1, 2, 2])
+        # The URLs of every part, then new URLs once the URL of part 2 is rejected
+        self.assertEqual(server.part_url_requests, [2, 2])
+
+    def test_rejected_urls_are_refreshed_once_for_all_parts(self):
+        data = os.urandom(PART_SIZE * 3)
+        with run_fake_iconik_server(part_statuses={1: [403], 2: [403], 3: [403]}) as (server, base_url):
+            self.upload(base_url, data, max_workers=3)
+
+        self.assertEqual(server.part_url_requests, [3, 3])
+        self.assertEqual(sorted(server.part_uploads), [1, 1, 2, 2, 3, 3])
+
+    def test_upload_does_not_retry_client_errors(self):
+        with run_fake_iconik_server(part_statuses={1: [400]}) as (server, base_url):
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                self.upload(base_url, os.urandom(10))
+
+        self.assertEqual(context.exception.code, 400)
+        self.assertEqual(server.part_uploads, [1])
+        self.assertEqual(server.api_requests, [])
+
+    def test_upload_gives_up_after_max_part_attempts(self):
+        with run_fake_iconik_server(part_statuses={1: [500] * 3}) as (server, base_url):
+            with self.assertRaises(urllib.error.HTTPError):
+                self.upload(base_url, os.urandom(10), max_part_attempts=3)
+
+        self.assertEqual(server.part_uploads, [1, 1, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
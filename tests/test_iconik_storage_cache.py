@@ -0,0 +1,125 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import iconik_helper  # noqa: E402
+from iconik_helper import IconikHelper, IconikStorageCache  # noqa: E402
+
+STORAGES = [{"id": 'storage-1', "settings": {"path": '/one'}}, {"id": 'storage-2', "settings": {"path": '/two'}}]
+
+
+class FakeStorageClient:
+
+    def __init__(self, storages=STORAGES):
+        self.storages = storages
+        self.list_count = 0
+        self.get_storage_ids = []
+
+    def iter_storages(self):
+        self.list_count += 1
+        return iter(self.storages)
+
+    def get_storage(self, storage_id):
+        self.get_storage_ids.append(storage_id)
+        return {"id": storage_id, "settings": {}}
+
+
+class IconikStorageCacheTest(unittest.TestCase):
+
+    def test_storages_are_listed_once_until_the_ttl_expires(self):
+        client = FakeStorageClient()
+        cache = IconikStorageCache(client, ttl=60)
+
+        self.assertEqual(cache['storage-1'], STORAGES[0])
+        self.assertEqual(cache.get('storage-2'), STORAGES[1])
+        self.assertEqual(client.list_count, 1)
+
+        with mock.patch('iconik_helper.time.monotonic', return_value=cache.loaded_at + 60):
+            cache.get('storage-1')
+        self.assertEqual(client.list_count, 2)
+
+    def test_unknown_storages_are_fetched_on_their_own(self):
+        client = FakeStorageClient()
+        cache = IconikStorageCache(client)
+
+        self.assertEqual(cache.get('storage-3'), {"id": 'storage-3', "settings": {}})
+        cache.get('storage-3')
+        self.assertEqual(client.get_storage_ids, ['storage-3'])
+
+    def test_no_lock_is_held_while_a_storage_is_fetched(self):
+        fetch_started = threading.Event()
+        release_fetch = threading.Event()
+
+        class BlockingStorageClient(FakeStorageClient):
+            def get_storage(self, storage_id):
+                fetch_started.set()
+                release_fetch.wait(5)
+                return super().get_storage(storage_id)
+
+        cache = IconikStorageCache(BlockingStorageClient())
+        cache.get('storage-1')
+        fetch_thread = threading.Thread(target=cache.get, args=('storage-3',))
+        fetch_thread.start()
+        try:
+            self.assertTrue(fetch_started.wait(5))
+            self.assertFalse(cache.refresh_lock.locked())
+            self.assertEqual(cache.get('storage-2'), STORAGES[1])
+        finally:
+            release_fetch.set()
+            fetch_thread.join()
+
+    def test_expired_storages_are_used_while_another_thread_lists_them(self):
+        client = FakeStorageClient()
+        cache = IconikStorageCache(client, ttl=60)
+        cache.get('storage-1')
+
+        with cache.refresh_lock, mock.patch('iconik_helper.time.monotonic', return_value=cache.loaded_at + 60):
+            self.assertEqual(cache.get('storage-2'), STORAGES[1])
+        self.assertEqual(client.list_count, 1)
+
+    def test_snapshot_is_used_instead_of_listing_the_storages(self):
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot_file_path = os.path.join(directory, 'storages.json')
+            IconikStorageCache(FakeStorageClient(), snapshot_file_path=snapshot_file_path).refresh()
+
+            client = FakeStorageClient()
+            self.assertEqual(IconikStorageCache(client, snapshot_file_path=snapshot_file_path)['storage-2'],
+                             STORAGES[1])
+            self.assertEqual(client.list_count, 0)
+
+
+class GetStorageCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.iconik = IconikHelper('test-app-id', 'test-auth-token', base_url='http://127.0.0.1:1/API',
+                                   rate_limiter=None)
+        self.addCleanup(self.iconik.pool.close)
+        patcher = mock.patch.object(iconik_helper, 'storage_caches', {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cache_is_shared_by_helpers_with_the_same_options(self):
+        other_iconik = IconikHelper('test-app-id', 'test-auth-token', base_url='http://127.0.0.1:1/API',
+                                    rate_limiter=None)
+        self.addCleanup(other_iconik.pool.close)
+
+        self.assertIs(self.iconik.get_storage_cache(), other_iconik.get_storage_cache())
+
+    def test_cache_is_keyed_on_the_ttl_and_snapshot_file(self):
+        storage_cache = self.iconik.get_storage_cache(ttl=60)
+
+        self.assertEqual(storage_cache.ttl, 60)
+        self.assertIsNot(self.iconik.get_storage_cache(ttl=120), storage_cache)
+        self.assertEqual(self.iconik.get_storage_cache(ttl=120).ttl, 120)
+        self.assertEqual(self.iconik.get_storage_cache(ttl=60, snapshot_file_path='/tmp/storages.json')
+                         .snapshot_file_path, '/tmp/storages.json')
+        self.assertIs(self.iconik.get_storage_cache(ttl=60), storage_cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
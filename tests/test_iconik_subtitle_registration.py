@@ -0,0 +1,101 @@
+import itertools
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from iconik_helper import IconikHelper  # noqa: E402
+
+SUBTITLE_FILES = [
+    {"path_on_storage": "subtitles/episode1/de.vtt", "language": "de", "file_size": 10},
+    {"path_on_storage": "subtitles/episode1/de.srt", "language": "de", "file_size": 20},
+    {"path_on_storage": "subtitles/episode1/fr.vtt", "language": "fr", "is_closed_captions": True}
+]
+
+
+class FakeIconikAsset:
+    """
+    Keeps the formats, file sets and files of one asset in memory, in place of the Iconik API methods of IconikHelper.
+    """
+
+    def __init__(self, iconik):
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.formats = []
+        self.file_sets = []
+        self.files = []
+        iconik.iter_asset_formats = lambda asset_id: iter(list(self.formats))
+        iconik.iter_asset_file_sets = lambda asset_id: iter(list(self.file_sets))
+        iconik.iter_asset_files = lambda asset_id: iter(list(self.files))
+        iconik.create_format = self.create_format
+        iconik.create_file_set = self.create_file_set
+        iconik.create_file = self.create_file
+
+    def add(self, objects, prefix, **fields):
+        with self.lock:
+            obj = {"id": f"{prefix}-{next(self.ids)}", **fields}
+            objects.append(obj)
+        return obj
+
+    def create_format(self, asset_id, name=None, metadata=None, storage_methods=None):
+        return self.add(self.formats, 'format', name=name, metadata=metadata)
+
+    def create_file_set(self, asset_id, format_id, storage_id, base_dir, name, component_ids):
+        return self.add(self.file_sets, 'file-set', format_id=format_id, storage_id=storage_id, base_dir=base_dir,
+                        name=name)
+
+    def create_file(self, asset_id, original_name, directory_path, size, file_type, storage_id, file_set_id,
+                    format_id):
+        return self.add(self.files, 'file', file_set_id=file_set_id, format_id=format_id, name=original_name,
+                        size=size)
+
+
+class IconikSubtitleRegistrationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.iconik = IconikHelper('test-app-id', 'test-auth-token', rate_limiter=None)
+        self.addCleanup(self.iconik.pool.close)
+        self.asset = FakeIconikAsset(self.iconik)
+
+    def test_one_format_per_language_and_closed_captions(self):
+        registrations = self.iconik.add_subtitle_files_to_asset('asset-id', SUBTITLE_FILES, 'storage-id')
+
+        self.assertEqual(len(self.asset.formats), 2)
+        self.assertEqual(registrations[0]['format_id'], registrations[1]['format_id'])
+        self.assertNotEqual(registrations[0]['format_id'], registrations[2]['format_id'])
+        formats_by_id = {asset_format['id']: asset_format for asset_format in self.asset.formats}
+        self.assertEqual(formats_by_id[registrations[2]['format_id']]['metadata'],
+                         [{"subtitle_language": "fr", "subtitle_closed_captions": "true"}])
+
+    def test_every_file_gets_its_own_file_set_and_file(self):
+        registrations = self.iconik.add_subtitle_files_to_asset('asset-id', SUBTITLE_FILES, 'storage-id')
+
+        self.assertEqual(len({registration['file_set_id'] for registration in registrations}), 3)
+        files_by_id = {asset_file['id']: asset_file for asset_file in self.asset.files}
+        self.assertEqual([(files_by_id[registration['file_id']]['name'], files_by_id[registration['file_id']]['size'])
+                          for registration in registrations], [('de.vtt', 10), ('de.srt', 20), ('fr.vtt', 0)])
+        self.assertEqual({file_set['base_dir'] for file_set in self.asset.file_sets}, {'subtitles/episode1'})
+
+    def test_registering_again_creates_nothing(self):
+        registrations = self.iconik.add_subtitle_files_to_asset('asset-id', SUBTITLE_FILES, 'storage-id')
+        counts = (len(self.asset.formats), len(self.asset.file_sets), len(self.asset.files))
+
+        self.assertEqual(self.iconik.add_subtitle_files_to_asset('asset-id', SUBTITLE_FILES, 'storage-id'),
+                         registrations)
+        self.assertEqual((len(self.asset.formats), len(self.asset.file_sets), len(self.asset.files)), counts)
+
+    def test_deleted_objects_are_not_reused(self):
+        self.iconik.add_subtitle_files_to_asset('asset-id', SUBTITLE_FILES[:1], 'storage-id')
+        for obj in self.asset.formats + self.asset.file_sets + self.asset.files:
+            obj['status'] = 'DELETED'
+
+        registration, = self.iconik.add_subtitle_files_to_asset('asset-id', SUBTITLE_FILES[:1], 'storage-id')
+
+        self.assertEqual((len(self.asset.formats), len(self.asset.file_sets), len(self.asset.files)), (2, 2, 2))
+        self.assertEqual(registration['file_id'], self.asset.files[-1]['id'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import io
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from envoi_transcribe_translate import JsonStreamReader, load_json_stream  # noqa: E402
+
+
+def read_array(data, chunk_size):
+    reader = JsonStreamReader(io.BytesIO(data), chunk_size=chunk_size)
+    return [reader.read_value() for _ in reader.iter_array()]
+
+
+def read_results_items(data, chunk_size):
+    """
+    Read the results.items of a Transcribe output document, skipping the rest of it.
+    """
+    reader = JsonStreamReader(io.BytesIO(data), chunk_size=chunk_size)
+    items = None
+    for key in reader.iter_object_keys():
+        if key != 'results':
+            reader.skip_value()
+            continue
+        for results_key in reader.iter_object_keys():
+            if results_key != 'items':
+                reader.skip_value()
+                continue
+            items = [reader.read_value() for _ in reader.iter_array()]
+    return items
+
+
+class JsonStreamReaderTest(unittest.TestCase):
+
+    def test_read_numbers_split_at_every_chunk_size(self):
+        data = b'[12.5, 3e2, 7, -0.25, 1.5E-3, 6e+1, 42]'
+        for chunk_size in range(1, 9):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(read_array(data, chunk_size), json.loads(data))
+
+    def test_read_number_at_end_of_stream(self):
+        for chunk_size in range(1, 9):
+            with self.subTest(chunk_size=chunk_size):
+                reader = JsonStreamReader(io.BytesIO(b'1.25e3'), chunk_size=chunk_size)
+                self.assertEqual(reader.read_value(), 1250.0)
+
+    def test_skip_values_split_at_every_chunk_size(self):
+        document = {"jobName": "job", "results": {"transcripts": [{"transcript": 'a "b" \\ c'}],
+                                                  "items": [{"start_time": "0.0", "confidence": 0.99, "n": 1e-2},
+                                                            {"type": "punctuation", "alternatives": []}]},
+                    "status": "COMPLETED"}
+        data = json.dumps(document).encode('utf-8')
+        for chunk_size in range(1, 9):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(read_results_items(data, chunk_size), document['results']['items'])
+
+    def test_load_json_stream_split_at_every_chunk_size(self):
+        document = {"a": [1, 2.5, {"b": None, "c": [True, False]}], "d": "\u00e9\\\"", "e": {}, "f": []}
+        data = json.dumps(document, ensure_ascii=False).encode('utf-8')
+        for chunk_size in range(1, 9):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(load_json_stream(io.BytesIO(data), chunk_size=chunk_size), document)
+
+    def test_load_json_stream_rejects_extra_data(self):
+        with self.assertRaises(ValueError):
+            load_json_stream(io.BytesIO(b'{"a": 1} {"b": 2}'), chunk_size=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
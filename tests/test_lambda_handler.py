@@ -0,0 +1,94 @@
+import contextlib
+import io
+import os
+import sys
+import unittest
+from unittest import mock
+
+import boto3
+from botocore.stub import ANY, Stubber
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import envoi_transcribe_translate  # noqa: E402
+from envoi_transcribe_translate import EventRecordsError, handle_event_records, lambda_handler  # noqa: E402
+
+STATE_MACHINE_ARN = 'arn:aws:states:us-east-1:123456789012:stateMachine:envoi-transcribe-translate'
+CONFIG = {"input": {"output_s3_uri": 's3://bucket/output/', "translation_language_codes": ['de', 'fr'],
+                    "state_machine_arn": STATE_MACHINE_ARN}}
+
+
+def build_s3_record(object_key, event_name='ObjectCreated:Put'):
+    return {"eventSource": 'aws:s3', "eventName": event_name,
+            "s3": {"bucket": {"name": 'bucket'}, "object": {"key": object_key, "eTag": 'etag', "size": 1024}}}
+
+
+class LambdaHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        session = boto3.session.Session(aws_access_key_id='test', aws_secret_access_key='test',
+                                        region_name='us-east-1')
+        self.stepfunctions = session.client('stepfunctions')
+        self.stubber = Stubber(self.stepfunctions)
+        self.stubber.activate()
+        self.addCleanup(self.stubber.deactivate)
+        self.load_config = mock.Mock(return_value=CONFIG)
+        for target, name, value in ((envoi_transcribe_translate, 'load_config', self.load_config),
+                                    (envoi_transcribe_translate, 'get_aws_client',
+                                     mock.Mock(return_value=self.stepfunctions)),
+                                    (envoi_transcribe_translate.logger, 'exception', mock.Mock())):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        stdout_redirect = contextlib.redirect_stdout(io.StringIO())
+        stdout_redirect.__enter__()
+        self.addCleanup(stdout_redirect.__exit__, None, None, None)
+
+    def stub_start_execution(self, count):
+        for index in range(count):
+            self.stubber.add_response('start_execution', {"executionArn": f"{STATE_MACHINE_ARN}:{index}",
+                                                          "startDate": 0},
+                                      {"stateMachineArn": STATE_MACHINE_ARN, "input": ANY})
+
+    def test_every_record_is_submitted_and_reported_in_order(self):
+        self.stub_start_execution(3)
+
+        records = handle_event_records([build_s3_record(f"media/{index}.mp4") for index in range(3)],
+                                       max_workers=2)
+
+        self.assertEqual([record['index'] for record in records], [0, 1, 2])
+        self.assertTrue(all(record['success'] for record in records))
+        self.assertEqual([record['media_file_uri'] for record in records],
+                         [f"s3://bucket/media/{index}.mp4" for index in range(3)])
+        self.stubber.assert_no_pending_responses()
+
+    def test_lambda_handler_returns_the_report_when_every_record_succeeds(self):
+        self.stub_start_execution(1)
+
+        response = lambda_handler({"Records": [build_s3_record('media/0.mp4')]}, None)
+
+        self.assertTrue(response['success'])
+        self.assertEqual(response['records'][0]['execution_arn'], f"{STATE_MACHINE_ARN}:0")
+
+    def test_lambda_handler_raises_when_a_record_fails(self):
+        self.stub_start_execution(1)
+        event = {"Records": [build_s3_record('media/0.mp4'), build_s3_record('media/1.mp4', 'ObjectRemoved:Delete')]}
+
+        with self.assertRaises(EventRecordsError) as context:
+            lambda_handler(event, None)
+
+        self.assertEqual([record['success'] for record in context.exception.records], [True, False])
+        self.assertIn('record 1: NotImplementedError', str(context.exception))
+
+    def test_config_error_fails_every_s3_record(self):
+        self.load_config.side_effect = ValueError("CONFIG_FILE_URI environment variable must be set.")
+
+        with self.assertRaises(EventRecordsError) as context:
+            lambda_handler({"Records": [build_s3_record('media/0.mp4'), build_s3_record('media/1.mp4')]}, None)
+
+        self.assertEqual([record['error'] for record in context.exception.records],
+                         ['ValueError: CONFIG_FILE_URI environment variable must be set.'] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
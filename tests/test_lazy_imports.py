@@ -0,0 +1,51 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_PATH)
+
+from envoi_transcribe_translate import (  # noqa: E402
+    EnvoiTranscribeTranslateCreateCommand, EnvoiTranscribeTranslateDescribeCommand, find_sub_command_name,
+    parse_command_line
+)
+
+LAZY_MODULES = ['boto3', 'botocore.config', 'iconik_helper', 'iconik_api_client', 'sqlite3', 'urllib.request']
+SUB_COMMANDS = {
+    'create': EnvoiTranscribeTranslateCreateCommand,
+    'describe': EnvoiTranscribeTranslateDescribeCommand
+}
+
+
+class LazyImportsTest(unittest.TestCase):
+
+    def test_importing_the_module_does_not_load_the_lazy_modules(self):
+        code = ("import json, sys\n"
+                "import envoi_transcribe_translate\n"
+                f"print(json.dumps([name for name in {LAZY_MODULES!r} if name in sys.modules]))\n")
+
+        output = subprocess.run([sys.executable, '-c', code], cwd=REPO_PATH, capture_output=True, text=True,
+                                check=True).stdout
+
+        self.assertEqual(json.loads(output), [])
+
+    def test_find_sub_command_name(self):
+        self.assertEqual(find_sub_command_name(['describe', '--execution-arn', 'arn'], SUB_COMMANDS), 'describe')
+        self.assertEqual(find_sub_command_name(['--log-level', 'DEBUG', 'create'], SUB_COMMANDS), 'create')
+        self.assertIsNone(find_sub_command_name(['--log-level', 'DEBUG', 'unknown'], SUB_COMMANDS))
+        self.assertIsNone(find_sub_command_name(['--help'], SUB_COMMANDS))
+
+    def test_only_the_parser_of_the_chosen_sub_command_is_built(self):
+        with mock.patch.object(EnvoiTranscribeTranslateCreateCommand, 'init_parser',
+                               wraps=EnvoiTranscribeTranslateCreateCommand.init_parser) as init_create_parser:
+            opts, _, _, _ = parse_command_line(['describe', '--execution-arn', 'arn'], {}, SUB_COMMANDS)
+
+        self.assertEqual(opts.command, 'describe')
+        init_create_parser.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
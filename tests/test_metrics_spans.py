@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+import sys
+import unittest
+from unittest import mock
+
+import boto3.session
+from botocore.stub import Stubber
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import envoi_transcribe_translate  # noqa: E402
+from envoi_transcribe_translate import (  # noqa: E402
+    METRICS_LOGGER_NAME, MetricsFormatter, configure_metrics_logger, instrument_aws_client
+)
+from iconik_api_client import IconikApiClient  # noqa: E402
+
+SPAN = {"service": "s3", "operation": "GetObject", "latency_ms": 12.5, "status": 200, "bytes_received": 1024,
+        "retries": 0}
+ASSET_ID = '0f8fad5b-d9cb-469f-a165-70867728950e'
+
+
+class FakeResponse:
+    status = 200
+    reason = 'OK'
+
+    def getheader(self, name, default=None):
+        return 'application/json' if name == 'Content-Type' else default
+
+
+def build_span_record(span):
+    record = logging.LogRecord(METRICS_LOGGER_NAME, logging.INFO, __file__, 0, 'span', None, None)
+    record.span = span
+    record.created = 1700000000.0
+    return record
+
+
+class MetricsFormatterTest(unittest.TestCase):
+
+    def test_json_span(self):
+        document = json.loads(MetricsFormatter('json').format(build_span_record(SPAN)))
+
+        self.assertEqual(document, {"timestamp": 1700000000000, **SPAN})
+
+    def test_emf_span(self):
+        document = json.loads(MetricsFormatter('emf', namespace='Test').format(build_span_record(SPAN)))
+
+        self.assertEqual(document['_aws']['CloudWatchMetrics'], [{
+            "Namespace": "Test",
+            "Dimensions": [["Service", "Operation"]],
+            "Metrics": [{"Name": "Latency", "Unit": "Milliseconds"}, {"Name": "BytesReceived", "Unit": "Bytes"},
+                        {"Name": "Retries", "Unit": "Count"}]
+        }])
+        self.assertEqual((document['Service'], document['Operation'], document['Latency'], document['Status']),
+                         ('s3', 'GetObject', 12.5, 200))
+        self.assertNotIn('BytesSent', document)
+
+    def test_spans_stay_disabled_without_a_supported_format(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertFalse(configure_metrics_logger())
+        with mock.patch.object(envoi_transcribe_translate.logger, 'warning') as log_warning:
+            self.assertFalse(configure_metrics_logger('xml'))
+        log_warning.assert_called_once()
+
+
+class CallSpanTest(unittest.TestCase):
+
+    def test_aws_calls_log_a_span(self):
+        session = boto3.session.Session(aws_access_key_id='test', aws_secret_access_key='test', region_name='us-east-1')
+        client = session.client('s3')
+        instrument_aws_client(client)
+        stubber = Stubber(client)
+        stubber.add_response('head_object', {"ContentLength": 10})
+        stubber.activate()
+
+        with self.assertLogs(METRICS_LOGGER_NAME, logging.INFO) as logs:
+            client.head_object(Bucket='bucket', Key='key')
+
+        span = logs.records[0].span
+        self.assertEqual((span['service'], span['operation'], span['status']), ('s3', 'HeadObject', 200))
+        self.assertGreaterEqual(span['latency_ms'], 0)
+
+    def test_iconik_requests_log_a_span_with_the_ids_replaced(self):
+        client = IconikApiClient('test-app-id', 'test-auth-token', rate_limiter=None)
+        self.addCleanup(client.pool.close)
+        client.pool.request = mock.Mock(return_value=(FakeResponse(), b'{"id": "format-id"}'))
+
+        with self.assertLogs(METRICS_LOGGER_NAME, logging.INFO) as logs:
+            client.create_format(ASSET_ID, name='SUBTITLES')
+
+        span = logs.records[0].span
+        self.assertEqual(span['operation'], 'POST /API/files/v1/assets/{id}/formats/')
+        self.assertEqual((span['service'], span['status'], span['retries'], span['bytes_received']),
+                         ('iconik', 200, 0, 19))
+
+    def test_iconik_spans_are_skipped_while_the_logger_is_disabled(self):
+        client = IconikApiClient('test-app-id', 'test-auth-token', rate_limiter=None)
+        self.addCleanup(client.pool.close)
+        client.pool.request = mock.Mock(return_value=(FakeResponse(), b'{}'))
+
+        with mock.patch('iconik_api_client.metrics_logger') as metrics_logger:
+            metrics_logger.isEnabledFor.return_value = False
+            client.create_format(ASSET_ID, name='SUBTITLES')
+
+        metrics_logger.info.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
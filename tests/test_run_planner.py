@@ -0,0 +1,102 @@
+import os
+import sys
+from types import SimpleNamespace
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from envoi_transcribe_translate import RunPlanner, build_run_input, parse_s3_uri  # noqa: E402
+
+RUN_OPTIONS = {
+    "media_file_uri": "s3://media-bucket/media/episode1.mp4",
+    "output_s3_uri": "s3://output-bucket/output/",
+    "translation_language_codes": ["de", "es", "fr"],
+    "translation_language_group_size": 2,
+    "subtitle_formats": ["vtt", "srt"],
+    "media_file_etag": '"0123456789abcdef"',
+    "media_file_size": 1024
+}
+JOB_FOLDER = 's3://output-bucket/output/episode1-auto-141ef657b54c882e'
+TRANSCRIPTION_FILE_URIS = [f"{JOB_FOLDER}/transcribed/episode1.{extension}" for extension in ('json', 'vtt', 'srt')]
+
+
+def build_translation_file_uris(language_code, extensions=('vtt', 'srt')):
+    # Batch translation jobs write their output to a folder of their own within the output folder
+    return [f"{JOB_FOLDER}/translated/123456789012-TranslateText-job/{language_code}.episode1.{extension}"
+            for extension in extensions]
+
+
+class FakeS3Helper:
+
+    def __init__(self, file_uris):
+        self.objects = {parse_s3_uri(file_uri) for file_uri in file_uris}
+        self.listed_prefixes = []
+
+    def object_exists(self, bucket_name, object_key):
+        return (bucket_name, object_key) in self.objects
+
+    def iter_object_keys(self, bucket_name, prefix):
+        self.listed_prefixes.append(prefix)
+        return iter(sorted(object_key for object_bucket_name, object_key in self.objects
+                           if object_bucket_name == bucket_name and object_key.startswith(prefix)))
+
+
+def plan(file_uris, **options):
+    s3_helper = FakeS3Helper(file_uris)
+    return RunPlanner(s3_helper=s3_helper).plan(SimpleNamespace(**{**RUN_OPTIONS, **options})), s3_helper
+
+
+def get_target_language_codes(run_plan):
+    return [translate_input['TargetLanguageCodes'] for translate_input in run_plan['RunInput']['Translate']['Inputs']]
+
+
+class RunPlannerTest(unittest.TestCase):
+
+    def test_nothing_exists(self):
+        run_plan, _ = plan([])
+
+        self.assertFalse(run_plan['UpToDate'])
+        self.assertFalse(run_plan['Transcription']['Exists'])
+        self.assertNotIn('SkipTranscription', run_plan['RunInput'])
+        self.assertEqual(run_plan['Translation']['MissingLanguageCodes'], ['de', 'es', 'fr'])
+        self.assertEqual(run_plan['RunInput'], build_run_input(SimpleNamespace(**RUN_OPTIONS)))
+
+    def test_existing_transcription_is_skipped(self):
+        run_plan, _ = plan(TRANSCRIPTION_FILE_URIS)
+
+        self.assertTrue(run_plan['Transcription']['Exists'])
+        self.assertTrue(run_plan['RunInput']['SkipTranscription'])
+        self.assertEqual(get_target_language_codes(run_plan), [['de', 'es'], ['fr']])
+
+    def test_transcription_missing_a_subtitle_file_runs_again_with_every_language(self):
+        run_plan, _ = plan(TRANSCRIPTION_FILE_URIS[:2] + build_translation_file_uris('de'))
+
+        self.assertFalse(run_plan['Transcription']['Exists'])
+        self.assertEqual(run_plan['Translation']['MissingLanguageCodes'], ['de', 'es', 'fr'])
+
+    def test_only_missing_languages_are_translated(self):
+        run_plan, s3_helper = plan(TRANSCRIPTION_FILE_URIS + build_translation_file_uris('de')
+                                   + build_translation_file_uris('es', extensions=('vtt',)))
+
+        self.assertEqual(run_plan['Translation']['ExistingLanguageCodes'], ['de'])
+        self.assertEqual(run_plan['Translation']['MissingLanguageCodes'], ['es', 'fr'])
+        self.assertEqual(get_target_language_codes(run_plan), [['es', 'fr']])
+        # One listing covers every language
+        self.assertEqual(len(s3_helper.listed_prefixes), 1)
+
+    def test_everything_exists(self):
+        run_plan, _ = plan(TRANSCRIPTION_FILE_URIS + [file_uri for language_code in ('de', 'es', 'fr')
+                                                      for file_uri in build_translation_file_uris(language_code)])
+
+        self.assertTrue(run_plan['UpToDate'])
+        self.assertEqual(run_plan['Translation']['MissingLanguageCodes'], [])
+
+    def test_output_is_not_trusted_when_the_job_name_is_given(self):
+        run_plan, s3_helper = plan(TRANSCRIPTION_FILE_URIS, transcription_job_name='episode1-auto-141ef657b54c882e')
+
+        self.assertFalse(run_plan['Transcription']['Exists'])
+        self.assertEqual(s3_helper.listed_prefixes, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
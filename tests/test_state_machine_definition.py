@@ -0,0 +1,150 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'deploy'))
+
+from envoi_transcribe_translate import EnvoiTranscribeTranslatePlanCommand, parse_command_line  # noqa: E402
+from generate_state_machine_definition import (  # noqa: E402
+    DEFAULT_RETRY_MAX_ATTEMPTS,
+    build_definition,
+    build_wait_schedule,
+    validate_definition,
+)
+
+DEFINITION_FILE_NAMES = {
+    'transcribe': 'envoi-transcribe-step-function.json',
+    'transcribe-translate': 'envoi-transcribe-translate-step-function.json',
+}
+
+
+def build_default_definition(pipeline):
+    return build_definition(pipeline=pipeline, retry_options={"max_attempts": DEFAULT_RETRY_MAX_ATTEMPTS})
+
+
+class StateMachineDefinitionTest(unittest.TestCase):
+
+    def test_definitions_are_valid(self):
+        for pipeline in DEFINITION_FILE_NAMES:
+            with self.subTest(pipeline=pipeline):
+                self.assertEqual(validate_definition(build_default_definition(pipeline)), [])
+
+    def test_deployed_definitions_are_up_to_date(self):
+        for pipeline, file_name in DEFINITION_FILE_NAMES.items():
+            with self.subTest(pipeline=pipeline):
+                with open(os.path.join(REPO_DIR, 'deploy', file_name)) as f:
+                    self.assertEqual(json.load(f), build_default_definition(pipeline))
+
+    def test_skipped_transcription_goes_to_the_next_stage(self):
+        next_state_names = {'transcribe': 'Use Existing Transcription Output',
+                            'transcribe-translate': 'Translate Transcription Files'}
+        for pipeline, next_state_name in next_state_names.items():
+            with self.subTest(pipeline=pipeline):
+                definition = build_default_definition(pipeline)
+                transcribe_choice = definition['States'][definition['StartAt']]
+
+                self.assertEqual(definition['StartAt'], 'Transcribe?')
+                self.assertEqual(transcribe_choice['Choices'][0]['Next'], next_state_name)
+                self.assertEqual(transcribe_choice['Default'], 'StartTranscriptionJob')
+
+    def test_skipped_transcription_outputs_its_job_in_the_transcribe_pipeline(self):
+        states = build_default_definition('transcribe')['States']
+
+        self.assertEqual(states['Use Existing Transcription Output']['ResultPath'], '$.Result')
+        self.assertEqual(states['Use Existing Transcription Output']['Next'], 'Success')
+        self.assertEqual(states['Success']['OutputPath'], '$.Result')
+
+    def test_polling_waits_follow_the_schedule(self):
+        states = build_definition(pipeline='transcribe', initial_wait_seconds=5, max_wait_seconds=30)['States']
+
+        self.assertEqual(states['Initialize Transcription Polling']['Result']['Schedule'], [5, 10, 20, 30])
+        self.assertEqual(states['Is Running?']['Choices'][1]['And'][1]['NumericLessThan'], 3)
+
+
+    def test_map_concurrency_and_retries_are_tunable(self):
+        states = build_definition(max_concurrency=7, retry_options={"max_attempts": 3})['States']
+
+        self.assertEqual(states['Translate Transcription Files']['MaxConcurrency'], 7)
+        self.assertEqual(states['StartTranscriptionJob']['Retry'][0]['MaxAttempts'], 3)
+        self.assertNotIn('Retry', build_definition()['States']['StartTranscriptionJob'])
+
+    def test_unknown_pipeline_is_rejected(self):
+        with self.assertRaises(ValueError):
+            build_definition(pipeline='translate')
+
+
+class WaitScheduleTest(unittest.TestCase):
+
+    def test_waits_grow_until_the_maximum(self):
+        self.assertEqual(build_wait_schedule(5, 120, 2.0), [5, 10, 20, 40, 80, 120])
+        self.assertEqual(build_wait_schedule(2, 10, 1.5), [2, 3, 5, 8, 10])
+
+    def test_backoff_rate_of_one_waits_the_same_time(self):
+        self.assertEqual(build_wait_schedule(5, 120, 1), [5])
+
+    def test_invalid_schedules_are_rejected(self):
+        for args in ((0, 10, 2), (10, 5, 2), (5, 10, 0.5)):
+            with self.subTest(args=args), self.assertRaises(ValueError):
+                build_wait_schedule(*args)
+
+
+class ValidateDefinitionTest(unittest.TestCase):
+
+    def test_broken_definitions_are_reported(self):
+        definition = {
+            "StartAt": "Wait",
+            "States": {
+                "Wait": {"Type": "Wait", "Next": "Missing"},
+                "Orphan": {"Type": "Succeed"},
+                "Task": {"Type": "Task", "End": True, "Retry": [{"ErrorEquals": [], "BackoffRate": 0.5}]}
+            }
+        }
+
+        self.assertEqual(validate_definition(definition), [
+            "$.States['Wait']: transition to unknown state 'Missing'",
+            "$.States['Wait']: Wait states must have exactly one of Seconds, SecondsPath, Timestamp or TimestampPath",
+            "$.States['Task']: Task states must have a Resource",
+            "$.States['Task']: every retrier must have ErrorEquals",
+            "$.States['Task']: retriers must have MaxAttempts >= 0 and BackoffRate >= 1",
+            "$.States['Orphan']: state is not reachable from StartAt",
+            "$.States['Task']: state is not reachable from StartAt"
+        ])
+
+    def test_map_item_processors_are_validated(self):
+        definition = {
+            "StartAt": "Map",
+            "States": {"Map": {"Type": "Map", "End": True, "ItemProcessor": {"StartAt": "Missing", "States": {
+                "Done": {"Type": "Succeed"}}}}}
+        }
+
+        self.assertEqual(validate_definition(definition), [
+            "$.States['Map'].ItemProcessor: StartAt 'Missing' is not a state",
+            "$.States['Map'].ItemProcessor.States['Done']: state is not reachable from StartAt"
+        ])
+
+
+class PlanOptionsTest(unittest.TestCase):
+    SUB_COMMANDS = {'plan': EnvoiTranscribeTranslatePlanCommand}
+
+    def test_start_requires_a_state_machine_arn(self):
+        with contextlib.redirect_stderr(io.StringIO()) as stderr, self.assertRaises(SystemExit):
+            parse_command_line(['plan', '--media-file-uri', 's3://bucket/media.mp4', '--start'], {},
+                               self.SUB_COMMANDS)
+
+        self.assertIn('--start requires --state-machine-arn', stderr.getvalue())
+
+    def test_start_with_a_state_machine_arn(self):
+        opts, _args, _env_vars, _parser = parse_command_line(
+            ['plan', '--media-file-uri', 's3://bucket/media.mp4', '--start', '--state-machine-arn',
+             'arn:aws:states:us-east-1:123456789012:stateMachine:envoi'], {}, self.SUB_COMMANDS)
+
+        self.assertTrue(opts.start)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+import boto3
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from envoi_transcribe_translate import S3Helper, StorageHelper  # noqa: E402
+
+DATA = b'0123456789'
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves DATA, honoring Range headers only when the server supports ranges.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        range_header = self.headers.get('Range')
+        if range_header and self.server.supports_ranges:
+            start, end = (int(value) for value in range_header[len('bytes='):].split('-'))
+            body = DATA[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{len(DATA)}")
+        else:
+            body = DATA
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def run_http_server(supports_ranges):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RangeRequestHandler)
+    server.daemon_threads = True
+    server.supports_ranges = supports_ranges
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/file"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def make_s3_client():
+    session = boto3.session.Session(aws_access_key_id='test', aws_secret_access_key='test', region_name='us-east-1')
+    return session.client('s3')
+
+
+class HttpRangeTest(unittest.TestCase):
+
+    def test_read_file_range(self):
+        with run_http_server(supports_ranges=True) as url:
+            self.assertEqual(StorageHelper.read_file_range(url, 2, 3), b'234')
+
+    def test_read_file_range_rejects_a_whole_file_response(self):
+        with run_http_server(supports_ranges=False) as url:
+            with self.assertRaises(ValueError):
+                StorageHelper.read_file_range(url, 2, 3)
+
+
+class S3RangeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.s3 = make_s3_client()
+        self.stubber = Stubber(self.s3)
+        self.stubber.activate()
+        self.addCleanup(self.stubber.deactivate)
+
+    def stub_get_object(self, body, content_range=None, **expected_params):
+        response = {"Body": self.make_body(body)}
+        if content_range is not None:
+            response['ContentRange'] = content_range
+        self.stubber.add_response('get_object', response, {"Bucket": 'bucket', "Key": 'key', **expected_params})
+
+    @staticmethod
+    def make_body(body):
+        return StreamingBody(io.BytesIO(body), len(body))
+
+    def test_read_object_range(self):
+        self.stub_get_object(b'234', content_range='bytes 2-4/10', Range='bytes=2-4')
+
+        self.assertEqual(S3Helper(client=self.s3).read_object_range('bucket', 'key', 2, 3), b'234')
+
+    def test_read_object_range_rejects_a_whole_object_response(self):
+        self.stub_get_object(DATA, Range='bytes=2-4')
+
+        with self.assertRaises(ValueError):
+            S3Helper(client=self.s3).read_object_range('bucket', 'key', 2, 3)
+
+    def test_download_object_fails_if_the_object_is_deleted(self):
+        self.stubber.add_response('head_object', {"ContentLength": len(DATA), "ETag": '"etag"'},
+                                  {"Bucket": 'bucket', "Key": 'key'})
+        self.stubber.add_client_error('get_object', service_error_code='NoSuchKey', http_status_code=404)
+
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(FileNotFoundError):
+                S3Helper(client=self.s3).download_object('bucket', 'key', os.path.join(directory, 'file'),
+                                                         max_workers=1)
+
+    def test_download_object(self):
+        self.stubber.add_response('head_object', {"ContentLength": len(DATA), "ETag": '"etag"'},
+                                  {"Bucket": 'bucket', "Key": 'key'})
+        self.stub_get_object(DATA[:6], content_range='bytes 0-5/10', Range='bytes=0-5', IfMatch='"etag"')
+        self.stub_get_object(DATA[6:], content_range='bytes 6-9/10', Range='bytes=6-9', IfMatch='"etag"')
+
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = S3Helper(client=self.s3).download_object('bucket', 'key', os.path.join(directory, 'file'),
+                                                                 part_size=6, max_workers=1)
+            with open(file_path, 'rb') as f:
+                self.assertEqual(f.read(), DATA)
+
+
+class ReadFileJsonTest(unittest.TestCase):
+
+    def test_read_file_json(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'file.json')
+            with open(file_path, 'wb') as f:
+                f.write(b'{"results": [1, 2, {"a": "b"}]}')
+
+            self.assertEqual(StorageHelper.read_file_json(file_path), {"results": [1, 2, {"a": "b"}]})
+
+
+if __name__ == '__main__':
+    unittest.main()
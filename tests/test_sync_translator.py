@@ -0,0 +1,146 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from envoi_transcribe_translate import (  # noqa: E402
+    SyncTranslator,
+    build_sync_translation_output_s3_uri,
+    pack_translate_text_batches,
+    parse_subtitle_cues,
+    render_subtitle_cues,
+    split_translate_text,
+    wrap_subtitle_text,
+)
+
+SRT = """1
+00:00:00,000 --> 00:00:02,000
+The quick brown fox
+jumps over the lazy dog.
+
+2
+00:00:02,000 --> 00:00:04,000
+Hello.
+"""
+
+ROLE_ARN = 'arn:aws:iam::123456789012:role/translate'
+
+
+class FakeTranslateClient:
+
+    def __init__(self):
+        self.texts = []
+
+    def translate_text(self, Text, SourceLanguageCode, TargetLanguageCode):
+        self.texts.append(Text)
+        return {"TranslatedText": '\n'.join(line.upper() for line in Text.split('\n'))}
+
+
+class FakeS3Helper:
+
+    def __init__(self, objects):
+        self.objects = objects
+
+    def read_object(self, bucket_name, object_key):
+        return self.objects[f"s3://{bucket_name}/{object_key}"]
+
+    def write_object(self, bucket_name, object_key, body, content_type=None):
+        self.objects[f"s3://{bucket_name}/{object_key}"] = body
+
+
+class SubtitleCuesTest(unittest.TestCase):
+
+    def test_parse_subtitle_cues_keeps_the_text_lines_of_each_cue(self):
+        cues = parse_subtitle_cues("WEBVTT\n\n00:00.000 --> 00:01.000\n First line \nSecond line\n")
+
+        self.assertEqual(cues, [{"lines": ["WEBVTT"], "text_lines": []},
+                                {"lines": ["00:00.000 --> 00:01.000"], "text_lines": ["First line", "Second line"]}])
+
+    def test_render_subtitle_cues_breaks_translations_into_the_lines_of_the_cue(self):
+        cues = parse_subtitle_cues(SRT)
+        translations = {
+            "The quick brown fox jumps over the lazy dog.": "Le renard brun rapide saute par-dessus le chien"
+        }
+
+        self.assertEqual(render_subtitle_cues(cues, translations), """1
+00:00:00,000 --> 00:00:02,000
+Le renard brun rapide
+saute par-dessus le chien
+
+2
+00:00:02,000 --> 00:00:04,000
+Hello.
+""")
+
+    def test_wrap_subtitle_text_breaks_text_without_spaces_between_characters(self):
+        self.assertEqual(wrap_subtitle_text('素早い茶色の狐', 2), ['素早い', '茶色の狐'])
+
+    def test_wrap_subtitle_text_does_not_make_empty_lines(self):
+        self.assertEqual(wrap_subtitle_text('Oui', 3), ['O', 'u', 'i'])
+        self.assertEqual(wrap_subtitle_text('Oui merci', 2), ['Oui', 'merci'])
+
+
+class TranslateTextSizeTest(unittest.TestCase):
+
+    def test_pack_translate_text_batches_stays_under_the_limit(self):
+        batches = pack_translate_text_batches(['a' * 4, 'b' * 4, 'c' * 20, 'd'], max_bytes=10)
+
+        self.assertEqual(batches, [['aaaa', 'bbbb'], ['c' * 20], ['d']])
+
+    def test_split_translate_text_prefers_sentence_ends(self):
+        text = 'One two three. Four five six seven eight.'
+
+        chunks = split_translate_text(text, max_bytes=24)
+
+        self.assertEqual(chunks, ['One two three.', 'Four five six seven', 'eight.'])
+        self.assertTrue(all(len(chunk.encode('utf-8')) <= 24 for chunk in chunks))
+
+    def test_split_translate_text_does_not_split_characters(self):
+        chunks = split_translate_text('éééé', max_bytes=5)
+
+        self.assertEqual(chunks, ['éé', 'éé'])
+
+
+class SyncTranslatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.translate_client = FakeTranslateClient()
+        self.s3_helper = FakeS3Helper({"s3://bucket/media.srt": SRT})
+        self.translate_input = {"ClientToken": 'token',
+                                "DataAccessRoleArn": ROLE_ARN,
+                                "OutputDataConfig": {"S3Uri": 's3://bucket/translations'},
+                                "SourceLanguageCode": 'en',
+                                "TargetLanguageCodes": ['fr']}
+
+    def test_output_folder_is_named_like_the_folder_of_a_batch_job(self):
+        self.assertEqual(build_sync_translation_output_s3_uri(self.translate_input),
+                         's3://bucket/translations/123456789012-TranslateText-token/')
+
+    def test_run_translates_whole_cues_and_writes_the_batch_layout(self):
+        translator = SyncTranslator(translate_client=self.translate_client, s3_helper=self.s3_helper)
+
+        results = translator.run([self.translate_input], ['s3://bucket/media.srt'])
+
+        self.assertEqual(self.translate_client.texts, ['The quick brown fox jumps over the lazy dog.\nHello.'])
+        output_file_uri = 's3://bucket/translations/123456789012-TranslateText-token/fr.media.srt'
+        self.assertEqual(results[0]['JobStatus'], 'COMPLETED')
+        self.assertEqual(results[0]['OutputFileUris'], [output_file_uri])
+        self.assertEqual(self.s3_helper.objects[output_file_uri], SRT.replace(
+            'The quick brown fox\njumps over the lazy dog.', 'THE QUICK BROWN FOX\nJUMPS OVER THE LAZY DOG.').replace(
+            'Hello.', 'HELLO.'))
+
+    def test_run_splits_cues_over_the_size_limit(self):
+        translator = SyncTranslator(translate_client=self.translate_client, s3_helper=self.s3_helper,
+                                    max_text_bytes=30)
+
+        results = translator.run([self.translate_input], ['s3://bucket/media.srt'])
+
+        self.assertEqual(results[0]['JobStatus'], 'COMPLETED')
+        self.assertEqual(sorted(self.translate_client.texts),
+                         ['Hello.', 'The quick brown fox jumps', 'over the lazy dog.'])
+        self.assertTrue(all(len(text.encode('utf-8')) <= 30 for text in self.translate_client.texts))
+
+
+if __name__ == '__main__':
+    unittest.main()
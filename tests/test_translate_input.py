@@ -0,0 +1,58 @@
+import os
+import sys
+from types import SimpleNamespace
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from envoi_transcribe_translate import (  # noqa: E402
+    MAX_TRANSLATION_LANGUAGE_GROUP_SIZE, build_run_input, group_language_codes
+)
+
+RUN_OPTIONS = {
+    "media_file_uri": "s3://media-bucket/media/episode1.mp4",
+    "output_s3_uri": "s3://output-bucket/output/",
+    "media_file_etag": '"0123456789abcdef"',
+    "media_file_size": 1024
+}
+
+
+def build_translate_inputs(**options):
+    return build_run_input(SimpleNamespace(**{**RUN_OPTIONS, **options}))['Translate']['Inputs']
+
+
+def build_target_language_codes(**options):
+    return [translate_input['TargetLanguageCodes'] for translate_input in build_translate_inputs(**options)]
+
+
+class TranslateInputTest(unittest.TestCase):
+
+    def test_group_language_codes_keeps_their_order(self):
+        self.assertEqual(group_language_codes(['de', 'es', 'fr', 'it', 'ja'], 2), [['de', 'es'], ['fr', 'it'], ['ja']])
+        self.assertEqual(group_language_codes([], 2), [])
+
+    def test_one_job_per_language_by_default(self):
+        self.assertEqual(build_target_language_codes(translation_language_codes=['de', 'es', 'fr']),
+                         [['de'], ['es'], ['fr']])
+
+    def test_languages_are_grouped_into_multi_target_jobs(self):
+        self.assertEqual(build_target_language_codes(translation_language_codes=['de', 'es', 'fr'],
+                                                     translation_language_group_size=2),
+                         [['de', 'es'], ['fr']])
+
+    def test_group_size_is_capped_at_the_translate_limit(self):
+        language_codes = build_target_language_codes(translation_language_codes=['all'],
+                                                     translation_language_group_size=100)
+
+        self.assertEqual(max(len(group) for group in language_codes), MAX_TRANSLATION_LANGUAGE_GROUP_SIZE)
+
+    def test_every_group_has_its_own_client_token(self):
+        translate_inputs = build_translate_inputs(translation_language_codes=['de', 'es', 'fr'],
+                                                  translation_language_group_size=2)
+
+        self.assertEqual(len({translate_input['ClientToken'] for translate_input in translate_inputs}), 2)
+        self.assertEqual(len({translate_input['InputDataConfig']['S3Uri'] for translate_input in translate_inputs}), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
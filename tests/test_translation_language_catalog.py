@@ -0,0 +1,73 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from envoi_transcribe_translate import TranslationLanguageCatalog  # noqa: E402
+
+LIST_LANGUAGES_CATALOG = TranslationLanguageCatalog({"auto": 'Auto', "en": 'English', "fr": 'French'})
+
+
+class TranslationLanguageCatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.cache_file_path = os.path.join(temp_dir.name, 'languages.json')
+        patcher = mock.patch.object(TranslationLanguageCatalog, 'from_list_languages',
+                                    return_value=LIST_LANGUAGES_CATALOG)
+        self.from_list_languages = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_cache_file(self, languages, age):
+        with open(self.cache_file_path, 'w') as f:
+            json.dump(languages, f)
+        modified_at = time.time() - age
+        os.utime(self.cache_file_path, (modified_at, modified_at))
+
+    def test_bundled_catalog_is_used_without_a_cache_file(self):
+        catalog = TranslationLanguageCatalog.load()
+
+        self.assertIn('en', catalog)
+        self.assertNotIn('auto', catalog.get_target_language_codes())
+        self.assertNotIn('en', catalog.get_target_language_codes(exclude=['en']))
+        self.assertEqual(catalog.get_unsupported_language_codes(['fr', 'xx']), ['xx'])
+        self.from_list_languages.assert_not_called()
+
+    def test_fresh_cache_file_is_used_without_calling_translate(self):
+        self.write_cache_file({"en": 'English', "de": 'German'}, age=60)
+
+        catalog = TranslationLanguageCatalog.load(cache_file_path=self.cache_file_path, refresh_interval=3600)
+
+        self.assertEqual(catalog.get_target_language_codes(), ['en', 'de'])
+        self.from_list_languages.assert_not_called()
+
+    def test_stale_cache_file_is_refreshed(self):
+        self.write_cache_file({"en": 'English'}, age=7200)
+
+        catalog = TranslationLanguageCatalog.load(cache_file_path=self.cache_file_path, refresh_interval=3600)
+
+        self.assertEqual(catalog.get_target_language_codes(), ['en', 'fr'])
+        with open(self.cache_file_path) as f:
+            self.assertEqual(json.load(f), LIST_LANGUAGES_CATALOG.languages)
+
+    def test_stale_cache_file_is_used_when_the_refresh_fails(self):
+        self.write_cache_file({"en": 'English'}, age=7200)
+        self.from_list_languages.side_effect = ClientError({"Error": {"Code": 'AccessDeniedException'}},
+                                                           'ListLanguages')
+
+        with mock.patch('envoi_transcribe_translate.logger.warning'):
+            catalog = TranslationLanguageCatalog.load(cache_file_path=self.cache_file_path, refresh_interval=3600)
+
+        self.assertEqual(catalog.get_target_language_codes(), ['en'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import envoi_transcribe_translate  # noqa: E402
+from envoi_transcribe_translate import TranslationMemory  # noqa: E402
+
+
+class FakeS3Helper:
+
+    def __init__(self):
+        self.objects = {}
+        self.reads = []
+        self.writes = []
+
+    def read_object_json(self, bucket_name, object_key):
+        self.reads.append(object_key)
+        contents = self.objects.get((bucket_name, object_key))
+        return json.loads(contents) if contents is not None else None
+
+    def write_object(self, bucket_name, object_key, contents, content_type=None):
+        self.writes.append(object_key)
+        self.objects[(bucket_name, object_key)] = contents
+
+
+class TranslationMemoryTestMixin:
+
+    def create_memory(self, max_entries=100):
+        raise NotImplementedError
+
+    def test_lookup_normalizes_segments(self):
+        memory = self.create_memory()
+        memory.store('en', 'es', {"Hello  world": "Hola mundo"})
+        memory.flush()
+
+        self.assertEqual(memory.lookup('en', 'es', ["Hello world", "Goodbye"]),
+                         {"Hello world": "Hola mundo"})
+        self.assertEqual(memory.lookup('en', 'fr', ["Hello world"]), {})
+
+    def test_least_recently_used_entries_are_evicted(self):
+        memory = self.create_memory(max_entries=2)
+        with mock.patch.object(envoi_transcribe_translate.time, 'time', return_value=1000):
+            memory.store('en', 'es', {"one": "uno"})
+        with mock.patch.object(envoi_transcribe_translate.time, 'time', return_value=2000):
+            memory.store('en', 'es', {"two": "dos"})
+        # Used again a day later, so "two" is now the least recently used
+        with mock.patch.object(envoi_transcribe_translate.time, 'time',
+                               return_value=1000 + envoi_transcribe_translate.TRANSLATION_MEMORY_RECENCY_INTERVAL):
+            memory.lookup('en', 'es', ["one"])
+            memory.store('en', 'es', {"three": "tres"})
+        memory.flush()
+
+        self.assertEqual(memory.lookup('en', 'es', ["one", "two", "three"]), {"one": "uno", "three": "tres"})
+
+
+class SqliteTranslationMemoryTest(TranslationMemoryTestMixin, unittest.TestCase):
+
+    def create_memory(self, max_entries=100):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        memory = TranslationMemory.from_uri(os.path.join(temp_dir.name, 'memory.db'), max_entries=max_entries)
+        self.addCleanup(memory.backend.connection.close)
+        return memory
+
+
+class S3TranslationMemoryTest(TranslationMemoryTestMixin, unittest.TestCase):
+
+    def create_memory(self, max_entries=100):
+        self.s3_helper = FakeS3Helper()
+        return TranslationMemory.from_uri('s3://memory-bucket/memory', max_entries=max_entries,
+                                          s3_helper=self.s3_helper)
+
+    def test_language_pair_is_read_once_and_reads_are_not_written_back(self):
+        memory = self.create_memory()
+        memory.store('en', 'es', {"one": "uno"})
+        memory.flush()
+        self.assertEqual(self.s3_helper.writes, ['memory/en/es.json'])
+
+        memory = TranslationMemory.from_uri('s3://memory-bucket/memory', s3_helper=self.s3_helper)
+        self.assertEqual(memory.lookup('en', 'es', ["one"]), {"one": "uno"})
+        self.assertEqual(memory.lookup('en', 'es', ["one", "two"]), {"one": "uno"})
+        memory.flush()
+
+        self.assertEqual(self.s3_helper.reads, ['memory/en/es.json', 'memory/en/es.json'])
+        self.assertEqual(self.s3_helper.writes, ['memory/en/es.json'])
+
+    def test_reads_after_the_recency_interval_are_written_back(self):
+        memory = self.create_memory()
+        memory.store('en', 'es', {"one": "uno"})
+        memory.flush()
+
+        a_day_later = time.time() + envoi_transcribe_translate.TRANSLATION_MEMORY_RECENCY_INTERVAL
+        with mock.patch.object(envoi_transcribe_translate.time, 'time', return_value=a_day_later):
+            memory.lookup('en', 'es', ["one"])
+        memory.flush()
+
+        self.assertEqual(len(self.s3_helper.writes), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()